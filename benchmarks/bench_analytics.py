@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rapport_analytics import QUERIES, ReportAnalytics, export_parquet
+from rapport_generator import RapportError, RapportGenerator
+from synthetic import ensure_workbooks
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, "data")
+
+# Dashboards poll the same few queries: each one is timed straight from SQLite
+# (cache dropped before every call) and answered from the memoized results.
+
+
+def per_call(calls, fn):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time analytics queries cold and memoized, and the Parquet export")
+    parser.add_argument("--rows", type=int, default=10000, help="Bordereaux rows per period")
+    parser.add_argument("--periods", type=int, default=12)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated workbooks are kept")
+    args = parser.parse_args(argv)
+
+    paths = ensure_workbooks(args.data_dir, args.rows)
+    scratch = tempfile.mkdtemp(prefix="rapport-analytics-")
+    try:
+        # One generator per period, since its year and month are parsed from the period it is created with
+        for n in range(args.periods):
+            period = f"{2000 + n // 12}-{n % 12 + 1:02d}"
+            with RapportGenerator(work_dir=scratch, cache_dir=None, period=period) as generator:
+                for file_type, path in paths.items():
+                    generator.process_file(file_type, path)
+
+        with RapportGenerator(work_dir=scratch, cache_dir=None) as generator:
+            analytics = ReportAnalytics(generator.storage)
+            print(f"{'query':<22} {'rows':>6} {'cold ms':>9} {'cached ms':>10}")
+            for name in QUERIES:
+                rows = len(analytics.query(name))
+
+                def cold(name=name):
+                    analytics.cache.clear()
+                    analytics.query(name)
+
+                cold_ms = per_call(args.calls, cold) * 1000
+                cached_ms = per_call(args.calls, lambda name=name: analytics.query(name)) * 1000
+                print(f"{name:<22} {rows:>6} {cold_ms:>9.3f} {cached_ms:>10.4f}")
+            analytics.close()
+
+            try:
+                start = time.perf_counter()
+                counts = export_parquet(generator.storage, os.path.join(scratch, "export"))
+                seconds = time.perf_counter() - start
+                print(f"export: {sum(rows for _, rows in counts.values())} rows in {seconds:.2f}s")
+            except RapportError as e:
+                print(f"export skipped: {e}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from synthetic import ensure_workbooks
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, "data")
+FILE_TYPES = ("chiffre", "productivity", "bordereaux")
+
+# Reports rendered back to back, each for its own period so none is a PDF cache hit:
+#   per report   one `batch` run per report, i.e. a fresh process (imports, toolchain
+#                probes, format lookup) for every report
+#   warm pool    one `batch` run for all of them, served by long-lived build workers
+# Each mode starts from an empty cache directory.
+
+
+def write_manifest(path, paths, periods, output_root):
+    jobs = [{**paths, "period": period, "output_dir": os.path.join(output_root, period)} for period in periods]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(jobs, f)
+
+
+def run_batch(manifest, workers, cache_dir):
+    env = {**os.environ, "RAPPORT_CACHE_DIR": cache_dir}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, os.path.join(REPO_DIR, "rapport_generator.py"), "batch", manifest, "-j", str(workers)],
+        capture_output=True, text=True, env=env
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError((result.stderr.strip().splitlines() or ["batch failed"])[-1])
+    return seconds, result.stdout.strip().splitlines()[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time reports built back to back: a process each vs a warm pool")
+    parser.add_argument("--reports", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=1, help="Build workers of the warm pool")
+    parser.add_argument("--rows", type=int, default=1000, help="Bordereaux rows of the workbook")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated workbooks are kept")
+    args = parser.parse_args(argv)
+
+    paths = ensure_workbooks(args.data_dir, args.rows)
+    periods = [f"{2000 + n // 12}-{n % 12 + 1:02d}" for n in range(args.reports)]
+    scratch = tempfile.mkdtemp(prefix="rapport-compile-")
+    try:
+        per_report = 0.0
+        cache_dir = os.path.join(scratch, "cache-per-report")
+        for n, period in enumerate(periods):
+            manifest = os.path.join(scratch, f"one-{n}.json")
+            write_manifest(manifest, paths, [period], os.path.join(scratch, "per-report"))
+            per_report += run_batch(manifest, 1, cache_dir)[0]
+
+        manifest = os.path.join(scratch, "all.json")
+        write_manifest(manifest, paths, periods, os.path.join(scratch, "pool"))
+        pooled, summary = run_batch(manifest, args.workers, os.path.join(scratch, "cache-pool"))
+    except RuntimeError as e:
+        print(f"Batch failed: {e}")
+        return 1
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{'mode':<12} {'reports':>8} {'seconds':>9} {'s/report':>9}")
+    print(f"{'per report':<12} {args.reports:>8} {per_report:>9.2f} {per_report / args.reports:>9.2f}")
+    print(f"{'warm pool':<12} {args.reports:>8} {pooled:>9.2f} {pooled / args.reports:>9.2f}")
+    print(f"pool: {summary}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
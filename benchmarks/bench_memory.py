@@ -0,0 +1,80 @@
+import os
+import sys
+import argparse
+import subprocess
+
+from synthetic import ensure_workbooks
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, "data")
+
+# Each case runs in a fresh interpreter; peak RSS is read before and after the work,
+# so the difference is what reading the workbook cost on top of the imports. Each size
+# is read with inline strings (as openpyxl writes them) and with a shared strings table
+# (as Excel saves them), since only the latter goes through the shared strings lookup.
+SHAPES = {"inline": False, "shared": True}
+PEAK_RSS = (
+    "import resource, sys\n"
+    "def peak_mb():\n"
+    "    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024\n"
+)
+CASES = {
+    # What a plain pandas read of the whole sheet costs, for reference
+    "read_excel whole sheet": "import pandas as pd\nbefore = peak_mb()\n"
+                              "rows = len(pd.read_excel(PATH, sheet_name='Feuil1', header=None))",
+    "iter_bordereaux_chunks": "import rapport_generator as rg\nbefore = peak_mb()\n"
+                              "rows = sum(len(chunk) for chunk in rg.iter_bordereaux_chunks(PATH))",
+    "read + normalize": "import pandas, rapport_generator as rg\nbefore = peak_mb()\n"
+                        "rows = sum(len(rg.normalize_bordereaux_chunk(chunk)) for chunk in rg.iter_bordereaux_chunks(PATH))",
+    "ingest bordereaux": "import pandas, tempfile, rapport_generator as rg\nbefore = peak_mb()\n"
+                         "with rg.RapportGenerator(work_dir=tempfile.mkdtemp(), cache_dir=None) as generator:\n"
+                         "    generator.process_file('bordereaux', PATH)\n"
+                         "    rows = generator.conn.execute('SELECT COUNT(*) FROM bordereaux').fetchone()[0]",
+}
+
+
+def run_case(code, path):
+    script = f"{PEAK_RSS}PATH = {path!r}\n{code}\nprint(f'rss:{{before:.1f}} {{peak_mb():.1f}} {{rows}}')"
+    result = subprocess.run([sys.executable, "-c", script], cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    line = [line for line in result.stdout.splitlines() if line.startswith("rss:")][-1]
+    before, peak, rows = line[len("rss:"):].split()
+    return float(before), float(peak), int(rows)
+
+
+def parse_sizes(text):
+    return [int(size) for size in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure peak RSS of reading bordereaux workbooks")
+    parser.add_argument("--rows", type=parse_sizes, default=[20000, 100000],
+                        help="Comma separated bordereaux row counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated workbooks are kept")
+    args = parser.parse_args(argv)
+    try:
+        import resource  # noqa: F401
+    except ImportError:
+        print("Peak RSS needs the resource module (Linux or macOS)")
+        return 1
+
+    print(f"{'case':<26} {'strings':<8} {'rows':>8} {'imports MB':>11} {'peak MB':>9} {'added MB':>9}")
+    for rows in args.rows:
+        for shape, shared_strings in SHAPES.items():
+            path = ensure_workbooks(args.data_dir, rows, args.seed, shared_strings)["bordereaux"]
+            for name, code in CASES.items():
+                try:
+                    before, peak, count = run_case(code, path)
+                except RuntimeError as e:
+                    print(f"{name:<26} {shape:<8} {rows:>8} {'failed':>11}  {e}")
+                    continue
+                print(f"{name:<26} {shape:<8} {count:>8} {before:>11.1f} {peak:>9.1f} {peak - before:>9.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
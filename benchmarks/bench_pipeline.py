@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from rapport_generator import RapportGenerator
+from synthetic import agent_names, ensure_workbooks
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines", "pipeline.json")
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, "data")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def best_of(repeat, setup, fn):
+    # setup() runs untimed before each attempt and returns the callable's argument
+    return min(timed(lambda: fn(setup())) for _ in range(repeat))
+
+
+def fresh_generator(work_dir, cache_dir=None):
+    # Always starts from an empty database and, by default, without the ingestion and PDF caches
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    return RapportGenerator(work_dir=work_dir, cache_dir=cache_dir)
+
+
+def add_agents(generator, count):
+    # The productivity layout reads a fixed 15 agents; larger teams are inserted directly
+    extra = count - len(generator.fetch_rows("agent_productivity"))
+    if extra <= 0:
+        return
+    frame = pd.DataFrame({
+        "agent_name": agent_names(extra, random.Random(count)),
+        "auth_conform_files": range(extra),
+        "tech_control_files": 0,
+    })
+    with generator.storage.transaction() as cursor:
+        generator.insert_period_rows(cursor, "agent_productivity", frame)
+
+
+def run_benchmarks(args, scratch):
+    results = {}
+    # Ingestion of openpyxl's inline strings and of Excel's shared strings table; the
+    # inline names are kept as they were so existing baselines still compare
+    for rows, shape in [(rows, shape) for rows in args.rows for shape in ("", ".shared")]:
+        paths = ensure_workbooks(args.data_dir, rows, args.seed, shared_strings=bool(shape))
+        work_dir = os.path.join(scratch, "work")
+        for file_type in ("chiffre", "productivity", "bordereaux"):
+            if file_type != "bordereaux" and f"ingest.{file_type}{shape}" in results:
+                continue
+            name = f"ingest.{file_type}{shape}"
+            if file_type == "bordereaux":
+                name = f"{name}.rows={rows}"
+
+            def ingest(generator, file_type=file_type):
+                generator.process_file(file_type, paths[file_type])
+                generator.close()
+
+            results[name] = best_of(args.repeat, lambda: fresh_generator(work_dir), ingest)
+            print(f"{name:<40} {results[name]:>10.4f}s", flush=True)
+
+    generator = fresh_generator(os.path.join(scratch, "report"), os.path.join(scratch, "cache"))
+    paths = ensure_workbooks(args.data_dir, args.rows[0], args.seed)
+    for file_type, path in paths.items():
+        generator.process_file(file_type, path)
+    for agents in args.agents:
+        add_agents(generator, agents)
+        name = f"generate_latex.agents={agents}"
+        results[name] = best_of(
+            args.repeat, lambda: None, lambda _: generator.generate_latex(generator.fetch_report_data())
+        )
+        print(f"{name:<40} {results[name]:>10.4f}s", flush=True)
+
+        if args.compile:
+            # Each attempt compiles; the PDF cache would otherwise answer every repeat
+            generator.render_cache = None
+            name = f"compile.agents={agents}"
+            results[name] = best_of(args.repeat, lambda: None, lambda _: generator.build_pdf())
+            print(f"{name:<40} {results[name]:>10.4f}s", flush=True)
+    generator.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'benchmark':<40} {'seconds':>10} {'baseline':>10} {'change':>8}")
+    for name, seconds in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<40} {seconds:>10.4f} {'-':>10} {'new':>8}")
+            continue
+        change = seconds / previous - 1 if previous else 0.0
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<40} {seconds:>10.4f} {previous:>10.4f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def parse_sizes(text):
+    return [int(size) for size in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, LaTeX generation and compilation")
+    parser.add_argument("--rows", type=parse_sizes, default=[1000, 10000, 100000],
+                        help="Comma separated bordereaux row counts, e.g. 1000,100000,1000000")
+    parser.add_argument("--agents", type=parse_sizes, default=[10, 1000, 10000],
+                        help="Comma separated agent counts for generate_latex")
+    parser.add_argument("--compile", action="store_true", help="Also time latexmk (requires a TeX installation)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated workbooks are kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Record this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="rapport-bench-")
+    try:
+        results = run_benchmarks(args, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                            "processor": platform.processor(), "cpus": os.cpu_count()},
+                "results": results,
+            }, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rapport_render import Objective, ReportData, Totals, render_report
+
+
+def synthetic_report(rows):
+    categories = ["ملفات عمليات المصادقة", "المصادقة لفائدة الحرفاء الأجانب", "عمليات المطابقة",
+                  "المراقبة الفنية", "المراقبة الفنية تحت الديوانة"]
+    return ReportData(
+        total_revenue=Totals(5000, 15000),
+        total_files=Totals(50, 150),
+        revenue_target=Objective("total moi", 15000, 31.2, 4400000),
+        dashboard_current=[(f"فئة_{i} & co", i * 10, 12.5) for i in range(rows)],
+        dashboard_year=[(f"فئة_{i}, سنة", i * 100, 12.5) for i in range(rows)],
+        operations_current=[(categories[i % 5], i, 20.0) for i in range(rows)],
+        operations_year=[(categories[i % 5], i * 4, 20.0) for i in range(rows)],
+        processing_times=[(f"نشاط {i}", 30.0, 35.0, 35.0) for i in range(rows)],
+        completion_stats=[],
+        intervention_reasons=[],
+        agent_productivity=[(f"عون_{i} #{i}", i, i * 2) for i in range(rows)],
+        revenue_rows=[Objective(f"CAT {i}, X", 78000, 33.0, 250000) for i in range(rows)],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LaTeX rendering against row count")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma separated row counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = []
+    for rows in (int(size) for size in args.sizes.split(",")):
+        data = synthetic_report(rows)
+        best = min(timed_render(data) for _ in range(args.repeat))
+        results.append((rows, best))
+
+    base_rows, base_time = results[0]
+    print(f"{'rows':>10} {'seconds':>10} {'us/row':>10} {'scaling':>8}")
+    for rows, seconds in results:
+        per_row = seconds / rows
+        scaling = per_row / (base_time / base_rows)
+        print(f"{rows:>10} {seconds:>10.4f} {per_row * 1e6:>10.3f} {scaling:>8.2f}")
+
+    # Linear rendering keeps the per-row cost flat as the report grows
+    worst_scaling = max(seconds / rows for rows, seconds in results) / (base_time / base_rows)
+    return 0 if worst_scaling < 3 else 1
+
+
+def timed_render(data):
+    start = time.perf_counter()
+    render_report(data, 2025, 5)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sys.exit(main())
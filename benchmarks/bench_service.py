@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic import ensure_workbooks
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_DATA_DIR = os.path.join(BENCH_DIR, "data")
+FILE_TYPES = ("chiffre", "productivity", "bordereaux")
+
+
+def request(method, url, body=None, content_type="application/json"):
+    # (status, headers, body); HTTP errors are returned, not raised
+    req = urllib.request.Request(url, data=body, method=method, headers={"Content-Type": content_type})
+    try:
+        with urllib.request.urlopen(req, timeout=600) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(state_dir, workers, max_queue):
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(REPO_DIR, "rapport_generator.py"), "serve", "--port", str(port),
+        "--state-dir", state_dir, "-j", str(workers), "--max-queue", str(max_queue),
+    ], stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            request("GET", f"{url}/status")
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Service did not start")
+
+
+def upload(url, path):
+    with open(path, "rb") as f:
+        status, _, body = request("PUT", f"{url}/uploads", f.read(), "application/octet-stream")
+    if status != 201:
+        raise RuntimeError(f"Upload of {path} failed: {status} {body!r}")
+    return json.loads(body)["upload"]
+
+
+def periods(count):
+    # Distinct periods give distinct jobs for the same workbooks
+    return [f"{2025 - n // 12}-{n % 12 + 1:02d}" for n in range(count)]
+
+
+def run_client(url, job, poll):
+    # Submit, wait for the job and download the PDF; returns the outcome and latency
+    start = time.perf_counter()
+    rejected = 0
+    payload = json.dumps(job).encode("utf-8")
+    while True:
+        status, headers, body = request("POST", f"{url}/jobs", payload)
+        if status != 503:
+            break
+        rejected += 1
+        time.sleep(float(headers.get("Retry-After", 1)))
+    if status not in (200, 202):
+        return {"status": "error", "error": body.decode("utf-8", "replace"), "rejected": rejected}
+    info = json.loads(body)
+    deduplicated = info.get("deduplicated", False)
+    while info["status"] in ("queued", "running"):
+        time.sleep(poll)
+        info = json.loads(request("GET", f"{url}/jobs/{info['job']}")[2])
+    if info["status"] != "done":
+        return {"status": "error", "error": info.get("error"), "rejected": rejected}
+    status, _, pdf = request("GET", f"{url}/jobs/{info['job']}/pdf")
+    if status != 200 or not pdf:
+        return {"status": "error", "error": f"PDF download returned {status}", "rejected": rejected}
+    return {"status": "ok", "seconds": time.perf_counter() - start, "bytes": len(pdf),
+            "deduplicated": deduplicated, "rejected": rejected}
+
+
+def percentile(values, fraction):
+    # Nearest rank
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the report service: throughput and latency percentiles")
+    parser.add_argument("--url", help="Running service to test; by default one is started on a free port")
+    parser.add_argument("--jobs", type=int, default=24, help="Reports requested in total")
+    parser.add_argument("--unique", type=int, default=6,
+                        help="Distinct reports among them; the rest repeat earlier inputs and are deduplicated")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients submitting at the same time")
+    parser.add_argument("--workers", type=int, default=2, help="Workers of the started service")
+    parser.add_argument("--max-queue", type=int, default=4, help="Queue bound of the started service")
+    parser.add_argument("--rows", type=int, default=1000, help="Bordereaux rows of the uploaded workbook")
+    parser.add_argument("--poll", type=float, default=0.2, help="Seconds between status requests")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Where generated workbooks are kept")
+    args = parser.parse_args(argv)
+
+    paths = ensure_workbooks(args.data_dir, args.rows)
+    process = state_dir = None
+    url = args.url
+    if url is None:
+        state_dir = tempfile.mkdtemp(prefix="rapport-service-")
+        process, url = start_service(state_dir, args.workers, args.max_queue)
+    try:
+        uploads = {file_type: upload(url, paths[file_type]) for file_type in FILE_TYPES}
+        jobs = [{"period": period, **uploads} for period in periods(max(1, args.unique))]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(
+                lambda n: run_client(url, jobs[n % len(jobs)], args.poll), range(args.jobs)
+            ))
+        wall = time.perf_counter() - start
+        # Queue wait and build time as measured by the service's build workers
+        builds = json.loads(request("GET", f"{url}/status")[2]).get("builds", {})
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    ok = [result for result in results if result["status"] == "ok"]
+    latencies = [result["seconds"] for result in ok]
+    print(f"{'jobs':<16} {len(results)} ({len(ok)} ok, {len(results) - len(ok)} failed)")
+    print(f"{'deduplicated':<16} {sum(result['deduplicated'] for result in ok)}")
+    print(f"{'rejected (503)':<16} {sum(result['rejected'] for result in results)}")
+    print(f"{'wall seconds':<16} {wall:.2f}")
+    print(f"{'throughput':<16} {len(ok) / wall:.2f} reports/s")
+    if latencies:
+        print(f"{'latency p50':<16} {percentile(latencies, 0.5):.2f}s")
+        print(f"{'latency p95':<16} {percentile(latencies, 0.95):.2f}s")
+        print(f"{'latency max':<16} {max(latencies):.2f}s")
+    for name in ("wait_p50", "wait_p95", "build_p50", "build_p95"):
+        if builds.get(name) is not None:
+            print(f"{name.replace('_', ' '):<16} {builds[name]:.2f}s")
+    if builds:
+        print(f"{'worker restarts':<16} {builds['restarts']} ({builds['timeouts']} timeouts)")
+    for result in results:
+        if result["status"] != "ok":
+            print(f"[error] {result['error']}", file=sys.stderr)
+    return 0 if len(ok) == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each case runs in a fresh interpreter and finally reports which heavy modules it loaded
+HEAVY_MODULES = ["pandas", "openpyxl", "tkinter", "numpy"]
+REPORT_LOADED = f"import sys; print('loaded:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+CASES = {
+    "import rapport_generator": "import rapport_generator",
+    "cli --help": "import sys, rapport_generator; sys.argv = ['rapport_generator', '--help']\n"
+                  "try:\n    rapport_generator.main()\nexcept SystemExit:\n    pass",
+    "open generator": "import tempfile, rapport_generator\n"
+                      "rapport_generator.RapportGenerator(work_dir=tempfile.mkdtemp(), cache_dir=None).close()",
+    "gui window": "import tkinter, rapport_gui\nroot = tkinter.Tk()\napp = rapport_gui.RapportGeneratorApp(root)\n"
+                  "root.update()\nroot.destroy()",
+}
+# Headless entry points must not pay for these
+HEADLESS_FORBIDDEN = {"pandas", "openpyxl", "tkinter"}
+
+
+def run_case(code):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\n{REPORT_LOADED}"],
+        cwd=REPO_DIR, capture_output=True, text=True
+    )
+    seconds = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    loaded = [line[len("loaded:"):] for line in result.stdout.splitlines() if line.startswith("loaded:")]
+    return seconds, set(filter(None, loaded[-1].split(",")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold start time of the entry points")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'case':<26} {'median s':>10} {'min s':>10}  loaded")
+    for name, code in CASES.items():
+        try:
+            runs = [run_case(code) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            # e.g. no display for the Tk window
+            print(f"{name:<26} {'skipped':>10}  {e}")
+            continue
+        times = [seconds for seconds, _ in runs]
+        loaded = runs[-1][1]
+        print(f"{name:<26} {statistics.median(times):>10.3f} {min(times):>10.3f}  {', '.join(sorted(loaded)) or '-'}")
+        if name != "gui window" and loaded & HEADLESS_FORBIDDEN:
+            failures.append(name)
+
+    if failures:
+        print(f"Heavy modules loaded at startup by: {', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
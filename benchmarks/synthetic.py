@@ -0,0 +1,145 @@
+import os
+import re
+import random
+import zipfile
+
+from openpyxl import Workbook
+
+# Workbooks shaped like the real uploads (see CHIFFRE_LAYOUT, PRODUCTIVITY_LAYOUT and
+# BORDEREAUX_COLUMNS in rapport_generator); the same seed always gives the same files
+REVENUE_CATEGORIES = ["HOMOLOG", "EXPORT", "CONFORMITE", "CON, TECH"]
+DASHBOARD_CATEGORIES = ["المصادقة", "المصادقة لفائدة الحرفاء الأجانب", "المطابقة", "المراقبة الفنية"]
+AGENT_FIRST_NAMES = ["محمد", "هيفاء", "كريم", "لبنى", "مهدي", "ياسين", "يسرى", "لسعد"]
+AGENT_LAST_NAMES = ["العليوي", "الميلادي", "الهاشمي", "الماجري", "معمر", "بوليلة", "العكروت", "عياري"]
+INTERVENANTS = ["Hayfa", "Mehdi", "Karim", "Mohamed", "lassad", "lobna", "yosra", "Yassine"]
+# openpyxl's write-only mode stores every string inline in the sheet; Excel keeps them
+# once in xl/sharedStrings.xml and refers to them by index, which is what most uploads look like
+INLINE_STRING = re.compile(r'<c ([^>]*?)t="inlineStr"([^>]*)><is><t(?: [^>]*)?>(.*?)</t></is></c>', re.S)
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+SHARED_STRINGS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings"
+
+
+def agent_names(count, rng):
+    return [f"{rng.choice(AGENT_FIRST_NAMES)} {rng.choice(AGENT_LAST_NAMES)} {i}" for i in range(count)]
+
+
+def write_chiffre(path, seed=0):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Feuil1")
+    ws.append(["Chiffre d'affaire"])
+    ws.append([])
+    ws.append(["Catégorie", *range(1, 13), "Total 2024", "Taux", "Réalisé", "Objectif"])
+
+    revenues = []
+    for category in REVENUE_CATEGORIES:
+        months = [rng.randint(10000, 160000) for _ in range(5)] + [0] * 7
+        revenues.append([category, *months, sum(months), rng.random(), sum(months), 1950000])
+    revenues.append(["total moi", *(sum(row[i] for row in revenues) for i in range(1, 14)), 0.31, 0, 4400000])
+    for row in revenues:
+        ws.append(row)
+
+    ws.append([])
+    ws.append(["Dossiers"])
+    dossiers = []
+    for category in REVENUE_CATEGORIES:
+        months = [rng.randint(0, 250) for _ in range(5)] + [0] * 7
+        dossiers.append([category, *months, sum(months)])
+    dossiers.append(["total moi", *(sum(row[i] for row in dossiers) for i in range(1, 14))])
+    for row in dossiers:
+        ws.append(row)
+
+    for title in ("Tableau de bord du mois", "Tableau de bord de l'année"):
+        ws.append([])
+        ws.append([title])
+        for category in DASHBOARD_CATEGORIES:
+            ws.append([category, rng.randint(1000, 200000), f"{rng.uniform(0, 60):.1f}%"])
+        ws.append(["المجموع", rng.randint(200000, 800000), "100%"])
+    wb.save(path)
+
+
+def write_productivity(path, seed=0):
+    # The layout reads 11 authentication/conformity agents and 4 technical control agents
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Feuil1")
+    ws.append(["Productivité des agents"])
+    ws.append(["Agent", "Nombre de dossiers"])
+    for name in agent_names(11, rng):
+        ws.append([name, rng.randint(0, 120)])
+    for _ in range(16):
+        ws.append([])
+    for name in agent_names(4, rng):
+        ws.append([name, rng.randint(0, 120)])
+    wb.save(path)
+
+
+def write_bordereaux(path, rows, seed=0):
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Feuil1")
+    ws.append(["Liste des bordereaux"])
+    ws.append([])
+    ws.append(["N° Bordereaux", "N° dossier", "Type de dossier H/C", "Resultat R/FI",
+               "Intervenant", "Cause FI", "Délai d'exécution"])
+    for i in range(rows):
+        result = "FI" if rng.random() < 0.45 else "R"
+        cause = rng.choice(["DOC", "DOC", "MS", "AUTRE", "DOC+MS"]) if result == "FI" else None
+        ws.append([
+            97 + i // 50, f"AHO-{i:07d}-25", "C" if rng.random() < 0.12 else "H", result,
+            rng.choice(INTERVENANTS), cause, rng.choice(["< 5", "5", "> 5"]),
+        ])
+    wb.save(path)
+
+
+def use_shared_strings(src, dest):
+    # Copies src with its inline strings moved to a shared strings table, as Excel saves them
+    strings = {}
+
+    def shared(match):
+        index = strings.setdefault(match.group(3), len(strings))
+        return f'<c {match.group(1)}t="s"{match.group(2)}><v>{index}</v></c>'
+
+    with zipfile.ZipFile(src) as zin, zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as zout:
+        for item in zin.infolist():
+            data = zin.read(item.filename)
+            if item.filename.startswith("xl/worksheets/"):
+                data = INLINE_STRING.sub(shared, data.decode("utf-8")).encode("utf-8")
+            elif item.filename == "[Content_Types].xml":
+                override = f'<Override PartName="/xl/sharedStrings.xml" ContentType="{SHARED_STRINGS_TYPE}" />'
+                data = data.replace(b"</Types>", f"{override}</Types>".encode("utf-8"))
+            elif item.filename == "xl/_rels/workbook.xml.rels":
+                rel = f'<Relationship Type="{SHARED_STRINGS_REL}" Target="sharedStrings.xml" Id="rIdShared" />'
+                data = data.replace(b"</Relationships>", f"{rel}</Relationships>".encode("utf-8"))
+            zout.writestr(item, data)
+        items = "".join(f'<si><t xml:space="preserve">{text}</t></si>' for text in strings)
+        zout.writestr("xl/sharedStrings.xml", (
+            f'<sst xmlns="{MAIN_NS}" count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>'
+        ))
+
+
+def ensure_workbooks(data_dir, rows, seed=0, shared_strings=False):
+    # Generated once per size and reused, since large bordereaux sheets take a while to write.
+    # shared_strings gives the Excel shape (xl/sharedStrings.xml) instead of inline strings.
+    os.makedirs(data_dir, exist_ok=True)
+    suffix = "-shared" if shared_strings else ""
+    paths = {
+        "chiffre": os.path.join(data_dir, f"chiffre-{seed}{suffix}.xlsx"),
+        "productivity": os.path.join(data_dir, f"productivity-{seed}{suffix}.xlsx"),
+        "bordereaux": os.path.join(data_dir, f"bordereaux-{rows}-{seed}{suffix}.xlsx"),
+    }
+    writers = {
+        "chiffre": lambda path: write_chiffre(path, seed),
+        "productivity": lambda path: write_productivity(path, seed),
+        "bordereaux": lambda path: write_bordereaux(path, rows, seed),
+    }
+    for file_type, path in paths.items():
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp.xlsx"
+            writers[file_type](tmp_path)
+            if shared_strings:
+                use_shared_strings(tmp_path, f"{path}.tmp-shared.xlsx")
+                os.replace(f"{path}.tmp-shared.xlsx", tmp_path)
+            os.replace(tmp_path, path)
+    return paths
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import shutil
+import threading
+import collections
+from collections import namedtuple
+
+from rapport_generator import BORDEREAUX_CATEGORIES, REPORT_COLUMNS, RapportError, RapportGenerator, parse_period
+from rapport_labels import id_column
+from rapport_storage import connect
+from rapport_stats import DOSSIER_TYPE_CATEGORIES, cause_columns, is_incomplete
+
+# Stored report data for BI tools: a Parquet export partitioned by period, and
+# month-over-month aggregates that stay memoized until the database changes.
+
+# Hive-style layout, <output_dir>/<table>/period=YYYY-MM/part-0.parquet; the period
+# column comes from the directory name, as pyarrow.dataset and Spark read it
+PARTITION_FILE = "part-0.parquet"
+EXPORT_QUERIES = {
+    **{
+        table: f"SELECT {columns} FROM {table} WHERE period = ? ORDER BY rowid"
+        for table, columns in REPORT_COLUMNS.items() if table != "bordereaux"
+    },
+    # Label ids are written out as their text
+    "bordereaux": (
+        "SELECT b.bordereau_no, b.dossier_no, "
+        + ", ".join(f"{column}.label AS {column}" for column in BORDEREAUX_CATEGORIES)
+        + " FROM bordereaux b "
+        + " ".join(
+            f"LEFT JOIN labels {column} ON {column}.label_id = b.{id_column(column)}"
+            for column in BORDEREAUX_CATEGORIES
+        )
+        + " WHERE b.period = ? ORDER BY b.rowid"
+    ),
+    "monthly_facts": (
+        "SELECT measure, category, value, ytd FROM monthly_facts WHERE period = ? ORDER BY measure, category_key"
+    ),
+    "monthly_totals": "SELECT measure, value, ytd FROM monthly_totals WHERE period = ? ORDER BY measure",
+}
+# Memoized query results kept per ReportAnalytics
+QUERY_CACHE_SIZE = 128
+# Bounds used when a query is not limited to a period range
+FIRST_PERIOD = "0000-00"
+LAST_PERIOD = "9999-99"
+
+CategoryMonth = namedtuple("CategoryMonth", ["period", "category", "value", "year_to_date", "change"])
+TotalMonth = namedtuple("TotalMonth", ["period", "value", "year_to_date", "change"])
+AgentMonth = namedtuple("AgentMonth", ["period", "agent", "auth_conform_files", "tech_control_files", "total_files"])
+CauseMonth = namedtuple("CauseMonth", ["period", "category", "cause", "files"])
+
+# change is the difference with the previous stored month of the same category,
+# including a month just before the requested range
+CATEGORY_QUERY = """
+    SELECT period, category, value, ytd, change FROM (
+        SELECT period, category, value, ytd,
+               value - LAG(value) OVER (PARTITION BY category_key ORDER BY period) AS change
+        FROM monthly_facts WHERE measure = ?
+    ) WHERE period BETWEEN ? AND ? ORDER BY period, category
+"""
+TOTAL_QUERY = """
+    SELECT period, value, ytd, change FROM (
+        SELECT period, value, ytd, value - LAG(value) OVER (ORDER BY period) AS change
+        FROM monthly_totals WHERE measure = ?
+    ) WHERE period BETWEEN ? AND ? ORDER BY period
+"""
+AGENT_QUERY = """
+    SELECT period, agent_name, auth_conform_files, tech_control_files, auth_conform_files + tech_control_files
+    FROM agent_productivity WHERE period BETWEEN ? AND ? ORDER BY period, rowid
+"""
+# Grouped on label ids from the bordereaux statistics index, then folded like the report's
+# intervention reasons: a "DOC+MS" card counts towards both causes
+CAUSE_QUERY = """
+    SELECT g.period, t.label, r.label, c.label, g.count FROM (
+        SELECT period, dossier_type_id, result_id, cause_fi_id, COUNT(*) AS count
+        FROM bordereaux WHERE period BETWEEN ? AND ?
+        GROUP BY period, dossier_type_id, result_id, cause_fi_id
+    ) g
+    LEFT JOIN labels t ON t.label_id = g.dossier_type_id
+    LEFT JOIN labels r ON r.label_id = g.result_id
+    LEFT JOIN labels c ON c.label_id = g.cause_fi_id
+"""
+
+
+def category_months(conn, measure, start, end):
+    return [CategoryMonth(*row) for row in conn.execute(CATEGORY_QUERY, (measure, start, end))]
+
+
+def total_months(conn, measure, start, end):
+    return [TotalMonth(*row) for row in conn.execute(TOTAL_QUERY, (measure, start, end))]
+
+
+def agent_months(conn, start, end):
+    return [AgentMonth(*row) for row in conn.execute(AGENT_QUERY, (start, end))]
+
+
+def cause_months(conn, start, end):
+    files = {}
+    for period, dossier_type, result, cause_fi, count in conn.execute(CAUSE_QUERY, (start, end)):
+        if not is_incomplete(result):
+            continue
+        dossier_type = (dossier_type or "").strip().upper()
+        category = DOSSIER_TYPE_CATEGORIES.get(dossier_type, dossier_type)
+        for cause in cause_columns(cause_fi):
+            files[period, category, cause] = files.get((period, category, cause), 0) + count
+    return [CauseMonth(*key, count) for key, count in sorted(files.items())]
+
+
+QUERIES = {
+    "revenue_by_category": lambda conn, start, end: category_months(conn, "revenue", start, end),
+    "files_by_category": lambda conn, start, end: category_months(conn, "files", start, end),
+    "revenue_totals": lambda conn, start, end: total_months(conn, "revenue", start, end),
+    "files_totals": lambda conn, start, end: total_months(conn, "files", start, end),
+    "agent_productivity": agent_months,
+    "fi_causes": cause_months,
+}
+
+
+class ReportAnalytics:
+    # Results are memoized until the database changes. PRAGMA data_version moves when
+    # any other connection commits (every process_*_file ingest, or another process),
+    # but can only be compared on one connection, so the version is read and the
+    # queries run on a connection of its own, whichever thread calls. Any change drops
+    # the whole cache, since one upload can touch every aggregate.
+    def __init__(self, storage, cache_size=QUERY_CACHE_SIZE):
+        self.storage = storage
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.version = None
+        # Guards the cache and the connection
+        self.lock = threading.Lock()
+        self.conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def connection(self):
+        if self.conn is None:
+            self.conn = connect(self.storage.db_path)
+        return self.conn
+
+    def data_version(self):
+        return self.connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def query(self, name, start=None, end=None):
+        # Rows of one of QUERIES for the periods start..end (both included, YYYY-MM)
+        if name not in QUERIES:
+            raise RapportError(f"Unknown query {name!r}, expected one of: {', '.join(QUERIES)}")
+        for period in (start, end):
+            if period is not None:
+                parse_period(period)
+        key = (name, start, end)
+        with self.lock:
+            version = self.data_version()
+            if version != self.version:
+                self.cache.clear()
+                self.version = version
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+            # A commit after the version was read is caught by the next call, which sees
+            # data_version move; tuples, so callers cannot change a cached result
+            rows = tuple(QUERIES[name](self.connection(), start or FIRST_PERIOD, end or LAST_PERIOD))
+            self.cache[key] = rows
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return rows
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def export_parquet(storage, output_dir, periods=None):
+    # Writes every stored table, one file per period, and returns {table: (partitions, rows)}.
+    # Partitions of periods no longer stored are removed when exporting all periods.
+    import pandas as pd
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RapportError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    counts = {}
+    # One read transaction, so all tables come from the same state of the database
+    with storage.snapshot() as conn:
+        for table, query in EXPORT_QUERIES.items():
+            stored = [row[0] for row in conn.execute(f"SELECT DISTINCT period FROM {table} ORDER BY period")]
+            table_dir = os.path.join(output_dir, table)
+            os.makedirs(table_dir, exist_ok=True)
+            if periods is None:
+                for entry in os.scandir(table_dir):
+                    if entry.is_dir() and entry.name.startswith("period=") and entry.name[7:] not in stored:
+                        shutil.rmtree(entry.path)
+            rows = 0
+            selected = [period for period in stored if periods is None or period in periods]
+            for period in selected:
+                frame = pd.read_sql_query(query, conn, params=(period,))
+                partition_dir = os.path.join(table_dir, f"period={period}")
+                os.makedirs(partition_dir, exist_ok=True)
+                path = os.path.join(partition_dir, PARTITION_FILE)
+                frame.to_parquet(f"{path}.tmp", index=False)
+                os.replace(f"{path}.tmp", path)
+                rows += len(frame)
+            counts[table] = (len(selected), rows)
+    return counts
+
+
+def open_database(db_path):
+    # An existing report database, migrated if needed; a wrong path is an error rather
+    # than a new empty database
+    db_path = os.path.abspath(db_path)
+    if not os.path.isfile(db_path):
+        raise RapportError(f"No report database at {db_path}")
+    return RapportGenerator(work_dir=os.path.dirname(db_path), db_name=os.path.basename(db_path), cache_dir=None)
+
+
+def run_analytics(args):
+    try:
+        if args.command == "export":
+            for period in args.period or ():
+                parse_period(period)
+        with open_database(args.db) as generator:
+            if args.command == "export":
+                counts = export_parquet(generator.storage, args.output_dir, args.period)
+                for table, (partitions, rows) in counts.items():
+                    print(f"{table:<26} {partitions:>4} periods {rows:>9} rows")
+            else:
+                analytics = ReportAnalytics(generator.storage)
+                try:
+                    rows = analytics.query(args.query, args.start, args.end)
+                finally:
+                    analytics.close()
+                json.dump([row._asdict() for row in rows], sys.stdout, ensure_ascii=False, indent=2)
+                print()
+    except RapportError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    return 0
@@ -0,0 +1,182 @@
+import os
+import time
+import shutil
+import hashlib
+import functools
+import tempfile
+from contextlib import contextmanager
+
+DEFAULT_CACHE_ROOT = os.environ.get("RAPPORT_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "rapport_generator"
+)
+# Bump when the parsed block format changes
+INGESTION_CACHE_VERSION = 2
+
+
+class CacheEntryError(Exception):
+    # A cached entry could not be read back; it has been removed
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def pandas_version():
+    # Pickled frames are only read back by the pandas version that wrote them.
+    # Read from the package metadata, so computing a key does not import pandas.
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("pandas")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    # One directory per key; directory mtime doubles as the last access time
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024, max_age=30 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def lookup(self, key):
+        path = os.path.join(self.cache_dir, key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def discard(self, key):
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+
+    @contextmanager
+    def store(self, key):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            yield tmp_dir
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        try:
+            os.replace(tmp_dir, os.path.join(self.cache_dir, key))
+        except OSError:
+            # Another process stored the same key first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                mtime = os.path.getmtime(path)
+                if name.startswith(".tmp-"):
+                    # Leftovers of writers that crashed
+                    if now - mtime > 3600:
+                        shutil.rmtree(path, ignore_errors=True)
+                    continue
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+            except OSError:
+                continue
+            entries.append((mtime, size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            if total <= self.max_bytes and not expired:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+class IngestionCache(DiskCache):
+    # Parsed workbook blocks, stored as one pickled DataFrame per block
+    def key(self, file_path, layout):
+        layout_digest = hashlib.sha256(repr(layout).encode("utf-8")).hexdigest()
+        raw = f"{INGESTION_CACHE_VERSION}:{pandas_version()}:{file_digest(file_path)}:{layout_digest}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def load_blocks(self, key):
+        import pandas as pd
+
+        path = self.lookup(key)
+        if path is None:
+            return None
+        names = sorted(name[:-4] for name in os.listdir(path) if name.endswith(".pkl"))
+        try:
+            return {name: pd.read_pickle(os.path.join(path, f"{name}.pkl")) for name in names}
+        except Exception:
+            # Unreadable (truncated, or written by an incompatible pandas): a miss
+            self.discard(key)
+            return None
+
+    def iter_blocks(self, key):
+        path = self.lookup(key)
+        if path is None:
+            return None
+        names = sorted(name for name in os.listdir(path) if name.endswith(".pkl"))
+        return self.read_blocks(key, path, names)
+
+    def read_blocks(self, key, path, names):
+        # Blocks are read as they are consumed, so an unreadable one only shows up
+        # midway; the caller starts over from the workbook on CacheEntryError
+        import pandas as pd
+
+        for name in names:
+            try:
+                frame = pd.read_pickle(os.path.join(path, name))
+            except Exception as e:
+                self.discard(key)
+                raise CacheEntryError(f"Unreadable cache entry {key}: {e}") from e
+            yield frame
+
+    def save_blocks(self, key, blocks):
+        with self.store(key) as tmp_dir:
+            for name, frame in blocks.items():
+                frame.to_pickle(os.path.join(tmp_dir, f"{name}.pkl"))
+
+    @contextmanager
+    def block_writer(self, key):
+        # Streams blocks to disk as they are produced; committed only if the block finishes cleanly
+        with self.store(key) as tmp_dir:
+            def save(name, frame):
+                frame.to_pickle(os.path.join(tmp_dir, f"{name}.pkl"))
+            yield save
+
+
+class RenderCache(DiskCache):
+    # Compiled PDFs keyed by the exact LaTeX source and TeX toolchain
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, max_age=None):
+        super().__init__(cache_dir, max_bytes, max_age)
+
+    def key(self, latex_content, toolchain):
+        digest = hashlib.sha256(toolchain.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(latex_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def load_pdf(self, key, pdf_path):
+        path = self.lookup(key)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(os.path.join(path, "rapport.pdf"), pdf_path)
+        except OSError:
+            return False
+        return True
+
+    def save_pdf(self, key, pdf_path):
+        with self.store(key) as tmp_dir:
+            shutil.copyfile(pdf_path, os.path.join(tmp_dir, "rapport.pdf"))
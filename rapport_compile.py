@@ -0,0 +1,264 @@
+import os
+import time
+import signal
+import threading
+import collections
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+from rapport_generator import JOB_TIMEOUT, run_job
+
+# Long-lived report build workers for batch and service runs. Each worker process
+# imports the pipeline, probes the TeX toolchain and loads the dumped preamble
+# format once, then builds the jobs sent to it one at a time. The parent hands
+# queued jobs to idle workers, enforces each job's deadline and replaces workers
+# that crash or overrun it.
+#
+# A worker stops its own TeX runs at the job deadline; it is terminated if it has
+# not answered KILL_GRACE seconds later
+KILL_GRACE = 30
+# Seconds between SIGTERM and SIGKILL when a worker is stopped
+TERMINATE_WAIT = 5
+# Recent jobs kept for the latency percentiles
+LATENCY_SAMPLES = 256
+
+
+def percentile(values, fraction):
+    # Nearest rank; None without samples
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))]
+
+
+def stop_worker(signum, frame):
+    # Unwinds the running build, so its generator stops its TeX processes on close
+    raise SystemExit(1)
+
+
+def limit_memory(memory_limit):
+    # Address space limit of the worker, inherited by latexmk and xelatex
+    if not memory_limit:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows, where builds run without a limit
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def warm_up():
+    import pandas  # noqa: F401
+    from rapport_cache import DEFAULT_CACHE_ROOT, DiskCache
+    from rapport_generator import build_preamble_format
+
+    # Same format cache as RapportGenerator; the toolchain probes are cached per process
+    build_preamble_format(DiskCache(os.path.join(DEFAULT_CACHE_ROOT, "fmt"), max_age=None))
+
+
+def worker_main(conn, memory_limit):
+    signal.signal(signal.SIGTERM, stop_worker)
+    limit_memory(memory_limit)
+    try:
+        warm_up()
+    except Exception:
+        # Best effort: the first job pays for whatever could not be prepared
+        pass
+    conn.send(("ready", None))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        job, timeout = message
+        conn.send(("done", run_job(job, timeout)))
+
+
+def stop_process(process):
+    process.terminate()
+    process.join(TERMINATE_WAIT)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+def error_result(job, error, started, timed_out=False):
+    return {
+        "output_dir": job["output_dir"], "period": job["period"], "status": "error", "error": error,
+        "timed_out": timed_out, "seconds": round(time.monotonic() - started, 3),
+    }
+
+
+class Worker:
+    def __init__(self, context, memory_limit):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        # (future, job, submitted, started) while building
+        self.task = None
+        self.deadline = None
+
+
+class CompilePool:
+    # submit(job) takes a run_job spec and returns a Future of run_job's result dict;
+    # timeouts and crashed workers resolve it with an error result as well
+    def __init__(self, workers=1, timeout=JOB_TIMEOUT, memory_limit=None):
+        # Spawned rather than forked: the parent may be running threads or an event loop
+        self.context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.lock = threading.RLock()
+        self.pending = collections.deque()
+        self.closing = False
+        self.start_error = None
+        self.counts = dict.fromkeys(["completed", "failed", "timeouts", "restarts"], 0)
+        self.waits = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.runs = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.wakeup_reader, self.wakeup_writer = self.context.Pipe(duplex=False)
+        self.workers = [Worker(self.context, memory_limit) for _ in range(workers)]
+        self.thread = threading.Thread(target=self.dispatch_loop, name="compile-pool", daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        future = Future()
+        with self.lock:
+            if self.closing:
+                raise RuntimeError("Compile pool is shut down")
+            self.pending.append((future, job, time.monotonic()))
+            self.wakeup_writer.send(None)
+        return future
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": len(self.workers),
+                "busy": sum(worker.task is not None for worker in self.workers),
+                "queued": len(self.pending),
+                **self.counts,
+                "wait_p50": percentile(self.waits, 0.5),
+                "wait_p95": percentile(self.waits, 0.95),
+                "build_p50": percentile(self.runs, 0.5),
+                "build_p95": percentile(self.runs, 0.95),
+            }
+
+    def dispatch_loop(self):
+        while True:
+            with self.lock:
+                if self.closing and not self.pending and not any(worker.task for worker in self.workers):
+                    return
+                self.assign()
+                deadlines = [worker.deadline for worker in self.workers if worker.task]
+                handles = [self.wakeup_reader]
+                for worker in self.workers:
+                    handles += [worker.conn, worker.process.sentinel]
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait(handles, timeout)
+            if self.wakeup_reader in ready:
+                while self.wakeup_reader.poll():
+                    self.wakeup_reader.recv()
+            for worker in list(self.workers):
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    self.receive(worker)
+                elif worker.task and time.monotonic() > worker.deadline:
+                    self.replace(worker, f"Report build timed out after {self.timeout:.0f}s", timed_out=True)
+
+    def assign(self):
+        if not self.workers:
+            while self.pending:
+                future, job, submitted = self.pending.popleft()
+                if future.set_running_or_notify_cancel():
+                    error = f"No compile worker could start: {self.start_error}"
+                    future.set_result(error_result(job, error, submitted))
+            return
+        idle = [worker for worker in self.workers if worker.ready and worker.task is None]
+        while idle and self.pending:
+            future, job, submitted = self.pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            worker = idle.pop()
+            started = time.monotonic()
+            self.waits.append(started - submitted)
+            worker.task = (future, job, submitted, started)
+            worker.deadline = started + self.timeout + KILL_GRACE
+            try:
+                worker.conn.send((job, self.timeout))
+            except OSError:
+                # Exited meanwhile; its sentinel reports it
+                pass
+
+    def receive(self, worker):
+        try:
+            while worker.conn.poll():
+                kind, result = worker.conn.recv()
+                if kind == "ready":
+                    worker.ready = True
+                else:
+                    self.finish(worker, result)
+        except (EOFError, OSError):
+            pass
+        if worker.process.sentinel in wait([worker.process.sentinel], 0):
+            worker.process.join()
+            self.replace(worker, f"Compile worker exited with code {worker.process.exitcode}")
+
+    def finish(self, worker, result):
+        future, _, _, started = worker.task
+        with self.lock:
+            worker.task = worker.deadline = None
+            self.runs.append(time.monotonic() - started)
+            self.counts["completed" if result["status"] == "ok" else "failed"] += 1
+            self.counts["timeouts"] += result.get("timed_out", False)
+        future.set_result(result)
+
+    def replace(self, worker, error, timed_out=False):
+        stop_process(worker.process)
+        worker.conn.close()
+        with self.lock:
+            task = worker.task
+            if task:
+                self.runs.append(time.monotonic() - task[3])
+                self.counts["failed"] += 1
+                self.counts["timeouts"] += timed_out
+            index = self.workers.index(worker)
+            if worker.ready and not self.closing:
+                self.workers[index] = Worker(self.context, self.memory_limit)
+                self.counts["restarts"] += 1
+            else:
+                # Workers that die while starting (e.g. a memory limit too low to import
+                # the pipeline) are not restarted in a loop
+                del self.workers[index]
+                if not worker.ready:
+                    self.start_error = error
+        if task:
+            task[0].set_result(error_result(task[1], error, task[3], timed_out))
+
+    def shutdown(self, cancel_pending=False):
+        # Running jobs finish; queued ones are built first unless cancel_pending
+        with self.lock:
+            self.closing = True
+            if cancel_pending:
+                while self.pending:
+                    self.pending.popleft()[0].cancel()
+            self.wakeup_writer.send(None)
+        self.thread.join()
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(TERMINATE_WAIT)
+            if worker.process.is_alive():
+                stop_process(worker.process)
+            worker.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
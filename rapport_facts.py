@@ -0,0 +1,93 @@
+# Monthly figures as a long fact table, one row per (measure, category, month),
+# with running year-to-date sums kept next to each value and in monthly_totals
+# across categories. Loading a workbook only rewrites the rows whose value or
+# running sum changed, so adding a month costs one row per category plus one
+# total row; reports read both figures with primary key lookups.
+
+# Wide table -> measure stored in monthly_facts
+FACT_MEASURES = {"revenues": "revenue", "dossiers": "files"}
+# The sheet's own total row; totals are summed from the categories instead
+TOTAL_CATEGORY = "total moi"
+
+
+def month_periods(year):
+    return [f"{year}-{month:02d}" for month in range(1, 13)]
+
+
+def running_rows(values):
+    # {month: value} -> {month: (value, year to date)} for the months present
+    rows = {}
+    total = 0
+    for month in sorted(values):
+        total += values[month]
+        rows[month] = (values[month], total)
+    return rows
+
+
+def update_facts(cursor, measure, year, last_month, categories):
+    # categories: {category_key: (category, [twelve monthly values])}. Months after
+    # last_month (the upload's own month) are not known yet and are left as they are.
+    # Returns the number of fact and total rows written.
+    periods = month_periods(year)
+    existing = {}
+    for key, category, period, value, ytd in cursor.execute(
+        "SELECT category_key, category, period, value, ytd FROM monthly_facts "
+        "WHERE measure = ? AND period BETWEEN ? AND ?",
+        (measure, periods[0], periods[-1])
+    ):
+        existing.setdefault(key, (category, {}))[1][int(period[5:])] = (value, ytd)
+
+    written = 0
+    deltas = {}
+    for key in set(categories) | set(existing):
+        category, new_values = categories.get(key, (None, [0] * 12))
+        category = category or existing[key][0]
+        old_rows = existing.get(key, (category, {}))[1]
+        values = {month: value for month, (value, _) in old_rows.items()}
+        for month in range(1, last_month + 1):
+            values[month] = int(new_values[month - 1] or 0)
+        for month, row in running_rows(values).items():
+            if old_rows.get(month) == row:
+                continue
+            deltas[month] = deltas.get(month, 0) + row[0] - old_rows.get(month, (0, 0))[0]
+            cursor.execute(
+                "INSERT OR REPLACE INTO monthly_facts (measure, period, category_key, category, value, ytd) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (measure, periods[month - 1], key, category, *row)
+            )
+            written += 1
+    return written + update_totals(cursor, measure, periods, deltas)
+
+
+def update_totals(cursor, measure, periods, deltas):
+    # Applies per-month changes of the category sum and carries them into the running totals
+    if not deltas:
+        return 0
+    old_rows = {
+        int(period[5:]): (value, ytd) for period, value, ytd in cursor.execute(
+            "SELECT period, value, ytd FROM monthly_totals WHERE measure = ? AND period BETWEEN ? AND ?",
+            (measure, periods[0], periods[-1])
+        )
+    }
+    values = {month: value for month, (value, _) in old_rows.items()}
+    for month, delta in deltas.items():
+        values[month] = values.get(month, 0) + delta
+    written = 0
+    for month, row in running_rows(values).items():
+        if old_rows.get(month) != row:
+            cursor.execute(
+                "INSERT OR REPLACE INTO monthly_totals (measure, period, value, ytd) VALUES (?, ?, ?, ?)",
+                (measure, periods[month - 1], *row)
+            )
+            written += 1
+    return written
+
+
+def wide_categories(rows):
+    # (category, jan, ..., dec, ...) rows of revenues/dossiers -> update_facts input
+    categories = {}
+    for row in rows:
+        key = str(row[0]).strip().lower()
+        if key and key != TOTAL_CATEGORY:
+            categories[key] = (row[0], list(row[1:13]))
+    return categories
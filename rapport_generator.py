@@ -1,64 +1,510 @@
-
-import tkinter as tk
-from tkinter import filedialog, messagebox
-import pandas as pd
-import sqlite3
 import os
+import sys
+import json
+import time
+import argparse
+import hashlib
+import functools
+import shutil
+import signal
 import subprocess
-import unicodedata
-
-class RapportGeneratorApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Rapport Generator")
-        self.root.geometry("800x600")
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from rapport_cache import DEFAULT_CACHE_ROOT, CacheEntryError, DiskCache, IngestionCache, RenderCache
+from rapport_render import (
+    CHARTS_DIR, FRAGMENT_VERSION, LATEX_PREAMBLE, SECTIONS, SECTIONS_DIR, Objective, ReportData, Totals, render_main,
+    render_report, report_charts, sections_for_tables, table_fingerprints
+)
+from rapport_facts import FACT_MEASURES, TOTAL_CATEGORY, update_facts, wide_categories
+from rapport_labels import LabelIds, id_column, normalize_text
+from rapport_stats import bordereaux_statistics
+from rapport_storage import Storage
+from rapport_trace import Tracer, configure as configure_tracing
+from rapport_xlsx import XlsxReader
+
+# pandas is imported by the parsing functions that use it, so the GUI, batch runs
+# and report builds start without loading it
+
+DEFAULT_PERIOD = "2025-05"
+SCHEMA_VERSION = 4
+# Migrated databases have their columns in a different order, so report
+# tables are always read by name, in the order the renderer expects
+REVENUE_COLUMNS = (
+    "category, jan, feb, mar, apr, may, jun, jul, aug, sep, oct, nov, dec, "
+    "total_2024, target_percentage, target_value"
+)
+REPORT_COLUMNS = {
+    "revenues": REVENUE_COLUMNS,
+    "dossiers": "category, jan, feb, mar, apr, may, jun, jul, aug, sep, oct, nov, dec, total_2024",
+    "dashboard_current_month": "category, revenue, percentage",
+    "dashboard_year_to_date": "category, revenue, percentage",
+    "operations_current_month": "category, files, percentage",
+    "operations_year_to_date": "category, files, percentage",
+    "agent_productivity": "agent_name, auth_conform_files, tech_control_files",
+    "processing_times": "category, on_time, before_time, after_time",
+    "completion_stats": "category, complete, incomplete",
+    "intervention_reasons": "category, technical_docs, device_operation, other_reasons",
+    "bordereaux": "bordereau_no, dossier_no, dossier_type_id, result_id, intervenant_id, cause_fi_id, delai_execution_id",
+}
+CATEGORY_TABLES = [table for table, columns in REPORT_COLUMNS.items() if columns.startswith("category")]
+FILE_TYPES = {"chiffre": "Chiffre", "productivity": "Productivity", "bordereaux": "Bordereaux"}
+
+# Workbook layouts: each block maps a row range (after the header) and column
+# positions to a table, with the dtype used to convert the whole column at once.
+# Rows missing any "required" column are skipped. A block's "total" row (first
+# column, case-insensitive) must be present for the report to be built.
+MONTH_COLUMNS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+CHIFFRE_LAYOUT = {
+    "sheet_name": "Feuil1",
+    "skiprows": 2,
+    # Column positions are counted after dropping fully empty columns
+    "drop_empty_columns": True,
+    "blocks": [
+        {
+            "name": "revenues", "table": "revenues", "rows": (0, 5), "total": TOTAL_CATEGORY,
+            "columns": {
+                0: ("category", "text"),
+                **{i: (month, "int") for i, month in enumerate(MONTH_COLUMNS, 1)},
+                13: ("total_2024", "int"),
+                14: ("target_percentage", "percent"),
+                16: ("target_value", "int"),
+            },
+        },
+        {
+            "name": "dossiers", "table": "dossiers", "rows": (7, 12),
+            "columns": {
+                0: ("category", "text"),
+                **{i: (month, "int") for i, month in enumerate(MONTH_COLUMNS, 1)},
+                13: ("total_2024", "int"),
+            },
+            "required": ["category"],
+        },
+        {
+            "name": "dashboard_current_month", "table": "dashboard_current_month", "rows": (14, 19),
+            "columns": {0: ("category", "text"), 1: ("revenue", "int"), 2: ("percentage", "percent")},
+            "required": ["category"],
+        },
+        {
+            "name": "dashboard_year_to_date", "table": "dashboard_year_to_date", "rows": (21, 26),
+            "columns": {0: ("category", "text"), 1: ("revenue", "int"), 2: ("percentage", "percent")},
+            "required": ["category"],
+        },
+    ],
+}
+PRODUCTIVITY_LAYOUT = {
+    "sheet_name": "Feuil1",
+    "skiprows": 1,
+    "usecols": [0, 1],
+    "blocks": [
+        {
+            "name": "auth_conform_agents", "table": "agent_productivity", "rows": (0, 11),
+            "columns": {0: ("agent_name", "text"), 1: ("auth_conform_files", "int")},
+            "constants": {"tech_control_files": 0},
+            "required": ["agent_name", "auth_conform_files"],
+        },
+        {
+            "name": "tech_control_agents", "table": "agent_productivity", "rows": (27, 31),
+            "columns": {0: ("agent_name", "text"), 1: ("tech_control_files", "int")},
+            "constants": {"auth_conform_files": 0},
+            "required": ["agent_name", "tech_control_files"],
+        },
+    ],
+}
+PREAMBLE_FORMAT_NAME = "rapport-preamble"
+# Seconds a failed preamble format build is remembered before it is tried again
+FORMAT_RETRY_AFTER = 3600
+# Longest a single latexmk or xelatex run may take before it is killed
+TEX_TIMEOUT = 600
+# Longest a whole batch or service report job (ingestion and build) may take
+JOB_TIMEOUT = 900
+
+BORDEREAUX_HEADER = "N° Bordereaux"
+# Excel header -> bordereaux column, in table order
+BORDEREAUX_COLUMNS = {
+    "N° Bordereaux": "bordereau_no",
+    "N° dossier": "dossier_no",
+    "Type de dossier H/C": "dossier_type",
+    "Resultat R/FI": "result",
+    "Intervenant": "intervenant",
+    "Cause FI": "cause_fi",
+    "Délai d'exécution": "delai_execution",
+}
+BORDEREAUX_CHUNK_SIZE = 5000
+# Rows searched for the header; the sheet is only streamed past it once found
+HEADER_SAMPLE_ROWS = 100
+# Low-cardinality columns, kept as categoricals so each distinct value is normalized once,
+# and stored as ids into the labels table (schema 4)
+BORDEREAUX_CATEGORIES = ["dossier_type", "result", "intervenant", "cause_fi", "delai_execution"]
+LABELS_TABLE = """
+    CREATE TABLE IF NOT EXISTS labels (
+        label_id INTEGER PRIMARY KEY, label TEXT NOT NULL UNIQUE
+    )
+"""
+BORDEREAUX_TABLE = """
+    CREATE TABLE IF NOT EXISTS bordereaux (
+        bordereau_no INTEGER, dossier_no TEXT,
+        dossier_type_id INTEGER REFERENCES labels, result_id INTEGER REFERENCES labels,
+        intervenant_id INTEGER REFERENCES labels, cause_fi_id INTEGER REFERENCES labels,
+        delai_execution_id INTEGER REFERENCES labels,
+        period TEXT NOT NULL
+    )
+"""
+BORDEREAUX_LAYOUT = {"sheet_name": "Feuil1", "header": BORDEREAUX_HEADER, "columns": BORDEREAUX_COLUMNS}
+# Validation problems listed in an error message; the error keeps all of them
+MAX_SHOWN_ISSUES = 20
+
+
+class RapportError(Exception):
+    pass
+
+
+class RapportCancelled(RapportError):
+    pass
+
+
+class RapportTimeout(RapportError):
+    pass
+
+
+class RapportValidationError(RapportError):
+    # Raised by the pre-flight checks (rapport_validate) with every problem found
+    def __init__(self, issues):
+        self.issues = issues
+        shown = [str(issue) for issue in issues[:MAX_SHOWN_ISSUES]]
+        if len(issues) > MAX_SHOWN_ISSUES:
+            shown.append(f"... and {len(issues) - MAX_SHOWN_ISSUES} more")
+        problems = "problem" if len(issues) == 1 else "problems"
+        super().__init__(f"{len(issues)} {problems} found in the uploaded workbooks:\n" + "\n".join(shown))
+
+    def __reduce__(self):
+        # Rebuilt from the issues when it crosses a process boundary (upload and watch workers),
+        # not from the formatted message
+        return type(self), (self.issues,)
+
+
+def parse_period(period):
+    try:
+        year, month = (int(part) for part in str(period).split("-"))
+    except ValueError:
+        raise RapportError(f"Invalid period {period!r}, expected YYYY-MM")
+    if not 1 <= month <= 12:
+        raise RapportError(f"Invalid period {period!r}, month must be 01-12")
+    return year, month
+
+
+def iter_bordereaux_chunks(file_path, chunk_size=BORDEREAUX_CHUNK_SIZE):
+    # Lists of raw rows in BORDEREAUX_COLUMNS order; only those seven columns are decoded
+    sheet_name = BORDEREAUX_LAYOUT["sheet_name"]
+    with XlsxReader(file_path) as reader:
+        found = reader.find_row(sheet_name, BORDEREAUX_HEADER, HEADER_SAMPLE_ROWS)
+        if found is None:
+            raise RapportError(f"Header row '{BORDEREAUX_HEADER}' not found in the first {HEADER_SAMPLE_ROWS} rows")
+        header_row, header = found
+        header = [str(cell).strip() if cell is not None else "" for cell in header]
+
+        missing = [name for name in BORDEREAUX_COLUMNS if name not in header]
+        if missing:
+            raise RapportError(f"Missing bordereaux columns: {', '.join(missing)}")
+        positions = [header.index(name) for name in BORDEREAUX_COLUMNS]
+
+        chunk = []
+        for _, values in reader.iter_rows(sheet_name, usecols=positions, min_row=header_row + 1):
+            if all(value is None for value in values):
+                continue
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+# Lower-cased file name fragments, checked before looking inside the workbook
+FILE_NAME_HINTS = {"bordereau": "bordereaux", "productiv": "productivity", "chiffre": "chiffre"}
+
+
+def detect_file_type(file_path, sample_rows=40):
+    # Returns "chiffre", "productivity", "bordereaux" or None for unrelated workbooks
+    name = os.path.basename(file_path).lower()
+    for hint, file_type in FILE_NAME_HINTS.items():
+        if hint in name:
+            return file_type
+
+    # Otherwise the first rows tell: the bordereaux header, the "total moi" line of
+    # the chiffre sheet, or the two-column agent list of the productivity sheet
+    with XlsxReader(file_path) as reader:
+        if CHIFFRE_LAYOUT["sheet_name"] not in reader.sheet_names:
+            return None
+        widths = []
+        for _, row in reader.iter_rows(CHIFFRE_LAYOUT["sheet_name"], max_row=sample_rows):
+            first = str(row[0]).strip() if row and row[0] is not None else ""
+            if first == BORDEREAUX_HEADER:
+                return "bordereaux"
+            if first.lower() == "total moi":
+                return "chiffre"
+            widths.append(sum(cell is not None for cell in row))
+    if widths and max(widths) <= len(PRODUCTIVITY_LAYOUT["usecols"]):
+        return "productivity"
+    return None
+
+
+def normalize_series(series):
+    return series.where(series.notna(), "").astype(str).str.strip().str.normalize("NFKC")
+
+
+def to_category_series(values):
+    import pandas as pd
+
+    # Each distinct value is normalized once; missing values become ""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    # Values that normalize alike share one category; code -1 (missing) picks the trailing ""
+    label_codes, categories = pd.factorize(pd.Series([*map(normalize_text, uniques), ""], dtype=object))
+    return pd.Categorical.from_codes(label_codes[codes], categories=categories)
+
+
+def normalize_bordereaux_chunk(rows):
+    import pandas as pd
+
+    # Typed columns straight from the raw rows, without an intermediate object frame
+    columns = dict(zip(BORDEREAUX_COLUMNS.values(), zip(*rows)))
+    frame = {}
+    for name, values in columns.items():
+        if name == "bordereau_no":
+            # int64 like to_int_series: bordereau numbers are not bounded by int32
+            frame[name] = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").fillna(0).astype("int64")
+        elif name in BORDEREAUX_CATEGORIES:
+            frame[name] = to_category_series(values)
+        else:
+            frame[name] = normalize_series(pd.Series(values, dtype=object)).astype(object)
+    return pd.DataFrame(frame)
+
+
+def read_layout_sheet(file_path, layout):
+    import pandas as pd
+
+    # Only the header and the rows up to the last block are kept (and only "usecols"
+    # when given). Like pandas.read_excel, the header row names no columns, empty rows
+    # inside the range are kept and trailing empty rows are dropped. Empty columns are
+    # dropped over the whole sheet, as read_excel followed by dropna(axis=1) did, so a
+    # column filled only below the last block still shifts the positions after it.
+    header_row = layout["skiprows"] + 1
+    last_row = header_row + max(block["rows"][1] for block in layout["blocks"])
+    drop_empty_columns = layout.get("drop_empty_columns")
+    rows = {}
+    width = 0
+    filled_columns = set()
+    with XlsxReader(file_path) as reader:
+        for number, values in reader.iter_rows(
+            layout["sheet_name"], usecols=layout.get("usecols"), min_row=header_row,
+            max_row=None if drop_empty_columns else last_row
+        ):
+            width = max(width, len(values))
+            if number > header_row:
+                filled_columns.update(position for position, value in enumerate(values) if value is not None)
+            if number <= last_row:
+                rows[number] = values
+    filled = [number for number, values in rows.items() if number > header_row and any(v is not None for v in values)]
+    data = [
+        rows.get(number, []) + [None] * (width - len(rows.get(number, [])))
+        for number in range(header_row + 1, max(filled, default=header_row) + 1)
+    ]
+    df = pd.DataFrame(data, columns=range(width))
+    if drop_empty_columns:
+        df = df[sorted(filled_columns)]
+    return df
+
+
+def to_int_series(series):
+    import pandas as pd
+
+    return pd.to_numeric(series, errors="coerce").fillna(0).astype("int64")
+
+
+def to_percentage_series(series):
+    import pandas as pd
+
+    text = series.astype(str).str.replace("%", "", regex=False).str.strip()
+    return pd.to_numeric(text, errors="coerce").fillna(0.0).astype(float)
+
+
+BLOCK_CONVERTERS = {"text": normalize_series, "int": to_int_series, "percent": to_percentage_series}
+
+
+def parse_block(df, block):
+    import pandas as pd
+
+    start, stop = block["rows"]
+    part = df.iloc[start:stop]
+    frame = pd.DataFrame(index=part.index)
+    keep = pd.Series(True, index=part.index)
+    required = block.get("required", ())
+    for position, (column, dtype) in block["columns"].items():
+        if position >= part.shape[1]:
+            raise RapportError(f"Block {block['name']}: column {position} not found")
+        raw = part.iloc[:, position]
+        frame[column] = BLOCK_CONVERTERS[dtype](raw)
+        if column in required:
+            keep &= frame[column].ne("") if dtype == "text" else pd.to_numeric(raw, errors="coerce").notna()
+    frame = frame[keep]
+    for column, value in block.get("constants", {}).items():
+        frame[column] = value
+    return frame
+
+
+def insert_block(cursor, table, frame):
+    columns = ", ".join(frame.columns)
+    placeholders = ", ".join("?" * len(frame.columns))
+    cursor.executemany(
+        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+        frame.itertuples(index=False, name=None)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def toolchain_version():
+    versions = []
+    for command in (["latexmk", "-v"], ["xelatex", "--version"]):
+        try:
+            output = subprocess.run(command, capture_output=True, text=True, timeout=60).stdout
+        except (OSError, subprocess.SubprocessError):
+            output = ""
+        lines = [line.strip() for line in output.splitlines() if line.strip()]
+        versions.append(lines[0] if lines else f"{command[0]} missing")
+    return " | ".join(versions)
+
+
+@functools.lru_cache(maxsize=None)
+def tex_installation_stamp():
+    # The base xelatex format is regenerated whenever the TeX packages are updated
+    try:
+        base_format = subprocess.run(
+            ["kpsewhich", "-engine=xetex", "xelatex.fmt"], capture_output=True, text=True, timeout=60
+        ).stdout.strip()
+        base_mtime = os.path.getmtime(base_format) if base_format else 0
+    except (OSError, subprocess.SubprocessError):
+        base_format, base_mtime = "", 0
+    return f"{toolchain_version()} | {base_format}@{base_mtime}"
+
+
+def run_quietly(command, cwd):
+    subprocess.run(
+        command, cwd=cwd, stdin=subprocess.DEVNULL, capture_output=True, timeout=TEX_TIMEOUT, check=True
+    )
+
+
+def build_preamble_format(cache, run=run_quietly):
+    # Returns the path of the dumped format, or None when it cannot be built.
+    # run(command, cwd) raises OSError or SubprocessError when the build fails; other
+    # errors (a cancelled or timed out report build) propagate and nothing is cached.
+    key = hashlib.sha256(f"{tex_installation_stamp()}\0{LATEX_PREAMBLE}".encode("utf-8")).hexdigest()
+    fmt_file = f"{PREAMBLE_FORMAT_NAME}.fmt"
+    path = cache.lookup(key)
+    if path is not None and not os.path.isfile(os.path.join(path, fmt_file)):
+        # A failed build is remembered for a while, so it is not retried on every
+        # report, then tried again in case the failure was transient
+        try:
+            failed_at = os.path.getmtime(os.path.join(path, "failed"))
+        except OSError:
+            failed_at = 0
+        if time.time() - failed_at > FORMAT_RETRY_AFTER:
+            cache.discard(key)
+            path = None
+    if path is None:
+        with cache.store(key) as tmp_dir:
+            with open(os.path.join(tmp_dir, f"{PREAMBLE_FORMAT_NAME}.tex"), "w", encoding="utf-8") as f:
+                f.write(LATEX_PREAMBLE + "\\begin{document}\n\\end{document}\n")
+            try:
+                run(["xelatex", "-ini", "-interaction=nonstopmode", f"-jobname={PREAMBLE_FORMAT_NAME}",
+                     "&xelatex", "mylatexformat.ltx", f"{PREAMBLE_FORMAT_NAME}.tex"], tmp_dir)
+            except (OSError, subprocess.SubprocessError):
+                pass
+            if not os.path.isfile(os.path.join(tmp_dir, fmt_file)):
+                open(os.path.join(tmp_dir, "failed"), "w").close()
+        path = cache.lookup(key)
+    if path is None or not os.path.isfile(os.path.join(path, fmt_file)):
+        return None
+    return os.path.join(path, fmt_file)
+
+
+def kill_process(process):
+    # The whole process group, so latexmk's xelatex children go too
+    if process.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)], capture_output=True)
+    else:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def write_if_changed(path, text):
+    # Unchanged files keep their mtime; changed ones are replaced atomically
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return True
+
+
+class RapportGenerator:
+    def __init__(self, work_dir=".", period=DEFAULT_PERIOD, db_name="rapport_data.db", cache_dir=DEFAULT_CACHE_ROOT):
+        self.work_dir = work_dir
+        self.period = period
+        self.year, self.month = parse_period(period)
+        # Parsed workbooks are cached by content hash; cache_dir=None disables it
+        self.ingestion_cache = IngestionCache(os.path.join(cache_dir, "ingest")) if cache_dir else None
+        self.render_cache = RenderCache(os.path.join(cache_dir, "pdf")) if cache_dir else None
+        self.format_cache = DiskCache(os.path.join(cache_dir, "fmt"), max_age=None) if cache_dir else None
+        self.chart_cache = RenderCache(os.path.join(cache_dir, "charts"), max_bytes=64 * 1024 * 1024) if cache_dir else None
+
+        # Running TeX processes; charts compile several at a time
+        self.processes = set()
+        self.cancelled = False
+        # time.monotonic() by which the whole build must be done (set for pool jobs)
+        self.deadline = None
+        # Stage timings go to RAPPORT_TRACE_DIR when set
+        self.tracer = Tracer(period=period)
 
         # Initialize database
-        self.conn = sqlite3.connect("rapport_data.db")
+        self.storage = Storage(os.path.join(work_dir, db_name), self.tracer)
         self.create_tables()
 
-        # Sidebar
-        self.sidebar = tk.Frame(self.root, width=200, bg="lightgray")
-        self.sidebar.pack(side=tk.LEFT, fill=tk.Y)
-
-        # Rapport page button
-        tk.Button(self.sidebar, text="Rapport", command=self.show_rapport_page).pack(pady=10)
-
-        # Main content frame
-        self.content_frame = tk.Frame(self.root)
-        self.content_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
-
-        # Rapport frame
-        self.rapport_frame = tk.Frame(self.content_frame)
-        self.file_paths = {"chiffre": None, "productivity": None, "bordereaux": None}
-
-        # Rapport page widgets
-        tk.Label(self.rapport_frame, text="Upload Chiffre d'affaire Excel").pack(pady=5)
-        tk.Button(self.rapport_frame, text="Browse", command=lambda: self.upload_file("chiffre")).pack(pady=5)
-        self.chiffre_label = tk.Label(self.rapport_frame, text="No file selected")
-        self.chiffre_label.pack()
-
-        tk.Label(self.rapport_frame, text="Upload Productivity Excel").pack(pady=5)
-        tk.Button(self.rapport_frame, text="Browse", command=lambda: self.upload_file("productivity")).pack(pady=5)
-        self.productivity_label = tk.Label(self.rapport_frame, text="No file selected")
-        self.productivity_label.pack()
-
-        tk.Label(self.rapport_frame, text="Upload Bordereaux Excel").pack(pady=5)
-        tk.Button(self.rapport_frame, text="Browse", command=lambda: self.upload_file("bordereaux")).pack(pady=5)
-        self.bordereaux_label = tk.Label(self.rapport_frame, text="No file selected")
-        self.bordereaux_label.pack()
-
-        tk.Button(self.rapport_frame, text="Generate PDF", command=self.generate_pdf).pack(pady=20)
+    @property
+    def conn(self):
+        # Connections are per thread, so one generator can serve several threads
+        return self.storage.connection()
 
     def create_tables(self):
-        cursor = self.conn.cursor()
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        with self.storage.transaction() as cursor:
+            # Another process may have migrated while this one waited for the write lock
+            if cursor.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                self.create_schema(cursor)
+
+    def create_schema(self, cursor):
+        self.upgrade_legacy_tables(cursor)
+        self.intern_bordereaux_labels(cursor)
+        had_facts = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'monthly_facts'"
+        ).fetchone() is not None
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS revenues (
                 category TEXT,
                 jan INTEGER, feb INTEGER, mar INTEGER, apr INTEGER, may INTEGER,
                 jun INTEGER, jul INTEGER, aug INTEGER, sep INTEGER, oct INTEGER,
                 nov INTEGER, dec INTEGER, total_2024 INTEGER,
-                target_percentage FLOAT, achieved_value INTEGER, target_value INTEGER
+                target_percentage FLOAT, achieved_value INTEGER, target_value INTEGER,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
@@ -66,599 +512,813 @@ class RapportGeneratorApp:
                 category TEXT,
                 jan INTEGER, feb INTEGER, mar INTEGER, apr INTEGER, may INTEGER,
                 jun INTEGER, jul INTEGER, aug INTEGER, sep INTEGER, oct INTEGER,
-                nov INTEGER, dec INTEGER, total_2024 INTEGER
+                nov INTEGER, dec INTEGER, total_2024 INTEGER,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS dashboard_current_month (
-                category TEXT, revenue INTEGER, percentage FLOAT
+                category TEXT, revenue INTEGER, percentage FLOAT,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS dashboard_year_to_date (
-                category TEXT, revenue INTEGER, percentage FLOAT
+                category TEXT, revenue INTEGER, percentage FLOAT,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS operations_current_month (
-                category TEXT, files INTEGER, percentage FLOAT
+                category TEXT, files INTEGER, percentage FLOAT,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS operations_year_to_date (
-                category TEXT, files INTEGER, percentage FLOAT
+                category TEXT, files INTEGER, percentage FLOAT,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS agent_productivity (
-                agent_name TEXT, auth_conform_files INTEGER, tech_control_files INTEGER
+                agent_name TEXT, auth_conform_files INTEGER, tech_control_files INTEGER,
+                period TEXT NOT NULL
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS processing_times (
-                category TEXT, on_time FLOAT, before_time FLOAT, after_time FLOAT
+                category TEXT, on_time FLOAT, before_time FLOAT, after_time FLOAT,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS completion_stats (
-                category TEXT, complete FLOAT, incomplete FLOAT
+                category TEXT, complete FLOAT, incomplete FLOAT,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS intervention_reasons (
-                category TEXT, technical_docs FLOAT, device_operation FLOAT, other_reasons FLOAT
+                category TEXT, technical_docs FLOAT, device_operation FLOAT, other_reasons FLOAT,
+                period TEXT NOT NULL, category_key TEXT
             )
         """)
+        cursor.execute(LABELS_TABLE)
+        cursor.execute(BORDEREAUX_TABLE)
+        # Long monthly figures and their running totals (schema 3), see rapport_facts
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bordereaux (
-                bordereau_no INTEGER, dossier_no TEXT, dossier_type TEXT, result TEXT,
-                intervenant TEXT, cause_fi TEXT, delai_execution TEXT
+            CREATE TABLE IF NOT EXISTS monthly_facts (
+                measure TEXT NOT NULL, period TEXT NOT NULL, category_key TEXT NOT NULL, category TEXT,
+                value INTEGER NOT NULL, ytd INTEGER NOT NULL,
+                PRIMARY KEY (measure, period, category_key)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS monthly_totals (
+                measure TEXT NOT NULL, period TEXT NOT NULL, value INTEGER NOT NULL, ytd INTEGER NOT NULL,
+                PRIMARY KEY (measure, period)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_state (
+                file_type TEXT, period TEXT, content_key TEXT, ingested_at TEXT,
+                PRIMARY KEY (file_type, period)
             )
         """)
-        self.conn.commit()
-
-    def normalize_text(self, text):
-        if pd.isna(text):
-            return ""
-        text = str(text).strip()
-        text = unicodedata.normalize('NFKC', text)
-        return text
-
-    def escape_latex(self, text):
-        if not text:
-            return ""
-        text = str(text)
-        replacements = {
-            "&": "\\&", "%": "\\%", "$": "\\$", "#": "\\#", "_": "\\_",
-            "{": "\\{", "}": "\\}", "~": "\\textasciitilde{}", "^": "\\textasciicircum{}",
-            "\\": "\\textbackslash{}", ",": "{,}"
-        }
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        return text
-
-    def convert_to_percentage(self, value):
-        if pd.isna(value):
-            return 0.0
-        if isinstance(value, str):
-            try:
-                return float(value.replace('%', '').strip())
-            except ValueError:
-                return 0.0
-        elif isinstance(value, (int, float)):
-            return float(value)  # Assumes value is already a percentage (e.g., 33.0 for 33%)
-        else:
-            return 0.0
-
-    def upload_file(self, file_type):
-        file_path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
-        if file_path:
-            self.file_paths[file_type] = file_path
-            if file_type == "chiffre":
-                self.chiffre_label.config(text=os.path.basename(file_path))
-                self.process_chiffre_file(file_path)
-            elif file_type == "productivity":
-                self.productivity_label.config(text=os.path.basename(file_path))
-                self.process_productivity_file(file_path)
-            elif file_type == "bordereaux":
-                self.bordereaux_label.config(text=os.path.basename(file_path))
-                self.process_bordereaux_file(file_path)
-
-    def process_chiffre_file(self, file_path):
-        try:
-            df = pd.read_excel(file_path, sheet_name="Feuil1", skiprows=2)
-            df = df.dropna(axis=1, how='all')
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM revenues")
-            cursor.execute("DELETE FROM dossiers")
-            cursor.execute("DELETE FROM dashboard_current_month")
-            cursor.execute("DELETE FROM dashboard_year_to_date")
-            cursor.execute("DELETE FROM operations_current_month")
-            cursor.execute("DELETE FROM operations_year_to_date")
-
-            # Debug: Print DataFrame to verify structure
-            print("Chiffre d'affaire Excel DataFrame:")
-            print(df.head(30))
-
-            # Revenues: Rows 0:5
-            for i, row in df.iloc[0:5].iterrows():
-                category = self.normalize_text(row.iloc[0])
-                cursor.execute("""
-                    INSERT INTO revenues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    category,
-                    int(row.iloc[1]) if pd.notna(row.iloc[1]) else 0,
-                    int(row.iloc[2]) if pd.notna(row.iloc[2]) else 0,
-                    int(row.iloc[3]) if pd.notna(row.iloc[3]) else 0,
-                    int(row.iloc[4]) if pd.notna(row.iloc[4]) else 0,
-                    int(row.iloc[5]) if pd.notna(row.iloc[5]) else 0,
-                    0, 0, 0, 0, 0, 0, 0,
-                    int(row.iloc[13]) if pd.notna(row.iloc[13]) else 0,  # total_2024
-                    self.convert_to_percentage(row.iloc[14]),  # target_percentage
-                    int(row.iloc[16]) if pd.notna(row.iloc[16]) else 0  # target_value
-                ))
-
-            # Dossiers: Rows 7:12
-            for i, row in df.iloc[7:12].iterrows():
-                category = self.normalize_text(row.iloc[0])
-                if not category:
-                    continue
-                cursor.execute("""
-                    INSERT INTO dossiers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    category,
-                    int(row.iloc[1]) if pd.notna(row.iloc[1]) else 0,
-                    int(row.iloc[2]) if pd.notna(row.iloc[2]) else 0,
-                    int(row.iloc[3]) if pd.notna(row.iloc[3]) else 0,
-                    int(row.iloc[4]) if pd.notna(row.iloc[4]) else 0,
-                    int(row.iloc[5]) if pd.notna(row.iloc[5]) else 0,
-                    0, 0, 0, 0, 0, 0, 0,
-                    int(row.iloc[13]) if pd.notna(row.iloc[13]) else 0
-                ))
-
-            # Dashboard current month: Rows 14:19
-            print("Dashboard current month rows 14 to 19:")
-            print(df.iloc[14:19])
-            for i, row in df.iloc[14:19].iterrows():
-                category = self.normalize_text(row.iloc[0]) if pd.notna(row.iloc[0]) else ""
-                if not category:
-                    continue
-                revenue = int(row.iloc[1]) if pd.notna(row.iloc[1]) else 0
-                percentage = self.convert_to_percentage(row.iloc[2])
-                cursor.execute("""
-                    INSERT INTO dashboard_current_month VALUES (?, ?, ?)
-                """, (category, revenue, percentage))
-
-            # Dashboard year to date: Rows 21:26
-            print("Dashboard year to date rows 21 to 26:")
-            print(df.iloc[21:26])
-            for i, row in df.iloc[21:26].iterrows():
-                category = self.normalize_text(row.iloc[0]) if pd.notna(row.iloc[0]) else ""
-                if not category:
-                    continue
-                revenue = int(row.iloc[1]) if pd.notna(row.iloc[1]) else 0
-                percentage = self.convert_to_percentage(row.iloc[2])
-                cursor.execute("""
-                    INSERT INTO dashboard_year_to_date VALUES (?, ?, ?)
-                """, (category, revenue, percentage))
-
-            # Operations current month (aligned with Word document)
-            cursor.execute("INSERT INTO operations_current_month VALUES (?, ?, ?)", ("ملفات عمليات المصادقة", 206, 84.1))
-            cursor.execute("INSERT INTO operations_current_month VALUES (?, ?, ?)", ("المصادقة لفائدة الحرفاء الأجانب", 14, 5.7))
-            cursor.execute("INSERT INTO operations_current_month VALUES (?, ?, ?)", ("عمليات المطابقة", 25, 10.2))
-            cursor.execute("INSERT INTO operations_current_month VALUES (?, ?, ?)", ("المراقبة الفنية", 245, 98.8))
-            cursor.execute("INSERT INTO operations_current_month VALUES (?, ?, ?)", ("المراقبة الفنية تحت الديوانة", 3, 1.2))
-
-            # Operations year to date (aligned with Word document)
-            cursor.execute("INSERT INTO operations_year_to_date VALUES (?, ?, ?)", ("ملفات عمليات المصادقة", 845, 83.9))
-            cursor.execute("INSERT INTO operations_year_to_date VALUES (?, ?, ?)", ("المصادقة لفائدة الحرفاء الأجانب", 43, 4.3))
-            cursor.execute("INSERT INTO operations_year_to_date VALUES (?, ?, ?)", ("عمليات المطابقة", 119, 11.8))
-            cursor.execute("INSERT INTO operations_year_to_date VALUES (?, ?, ?)", ("المراقبة الفنية", 944, 96.2))
-            cursor.execute("INSERT INTO operations_year_to_date VALUES (?, ?, ?)", ("المراقبة الفنية تحت الديوانة", 37, 3.8))
-
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process Chiffre file: {str(e)}")
-            raise
+        for table in REPORT_COLUMNS:
+            key = "period, category_key" if table in CATEGORY_TABLES else "period"
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_period ON {table} ({key})")
+        # Covers every column the statistics aggregation reads (schema 2)
+        cursor.execute("DROP INDEX IF EXISTS idx_bordereaux_stats")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_bordereaux_statistics "
+            "ON bordereaux (period, dossier_type_id, result_id, delai_execution_id, cause_fi_id)"
+        )
+        if not had_facts:
+            self.backfill_facts(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def backfill_facts(self, cursor):
+        # Periods ingested before schema 3, oldest first so later uploads win
+        for table, measure in FACT_MEASURES.items():
+            periods = [row[0] for row in cursor.execute(f"SELECT DISTINCT period FROM {table} ORDER BY period")]
+            for period in periods:
+                year, month = parse_period(period)
+                rows = cursor.execute(
+                    f"SELECT {REPORT_COLUMNS[table]} FROM {table} WHERE period = ? ORDER BY rowid", (period,)
+                ).fetchall()
+                update_facts(cursor, measure, year, month, wide_categories(rows))
+
+    def intern_bordereaux_labels(self, cursor):
+        # Text bordereaux columns from before schema 4 -> label ids. The table is
+        # rebuilt; dropping the old one drops its indexes, recreated by create_schema.
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(bordereaux)")}
+        if not set(BORDEREAUX_CATEGORIES) <= columns:
+            return
+        cursor.execute(LABELS_TABLE)
+        for column in BORDEREAUX_CATEGORIES:
+            cursor.execute(
+                f"INSERT OR IGNORE INTO labels (label) SELECT DISTINCT {column} FROM bordereaux "
+                f"WHERE {column} IS NOT NULL AND {column} != ''"
+            )
+        cursor.execute("ALTER TABLE bordereaux RENAME TO bordereaux_text")
+        cursor.execute(BORDEREAUX_TABLE)
+        ids = ", ".join(id_column(column) for column in BORDEREAUX_CATEGORIES)
+        lookups = ", ".join(
+            f"(SELECT label_id FROM labels WHERE label = b.{column})" for column in BORDEREAUX_CATEGORIES
+        )
+        cursor.execute(
+            f"INSERT INTO bordereaux (bordereau_no, dossier_no, {ids}, period) "
+            f"SELECT bordereau_no, dossier_no, {lookups}, period FROM bordereaux_text b ORDER BY rowid"
+        )
+        cursor.execute("DROP TABLE bordereaux_text")
+
+    def upgrade_legacy_tables(self, cursor):
+        # Databases from before reporting periods: rows are kept and assigned to
+        # the period that was hard-coded in the report at the time
+        for table in REPORT_COLUMNS:
+            columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+            if not columns:
+                continue
+            if "period" not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN period TEXT NOT NULL DEFAULT '{DEFAULT_PERIOD}'")
+            if table in CATEGORY_TABLES and "category_key" not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN category_key TEXT")
+                cursor.execute(f"UPDATE {table} SET category_key = LOWER(TRIM(category))")
+            if table == "revenues" and "achieved_value" not in columns:
+                cursor.execute("ALTER TABLE revenues ADD COLUMN achieved_value INTEGER")
+            if table == "bordereaux" and "dossier_type" not in columns:
+                cursor.execute("ALTER TABLE bordereaux RENAME COLUMN type TO dossier_type")
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(ingestion_state)")}
+        if columns and "period" not in columns:
+            cursor.execute("DROP TABLE ingestion_state")
+
+    def cache_key(self, file_path, layout):
+        if self.ingestion_cache is None:
+            return None
+        with self.tracer.span("hash", bytes=os.path.getsize(file_path)):
+            return self.ingestion_cache.key(file_path, layout)
+
+    def is_ingested(self, file_type, key):
+        if key is None:
+            return False
+        row = self.conn.execute(
+            "SELECT content_key FROM ingestion_state WHERE file_type = ? AND period = ?", (file_type, self.period)
+        ).fetchone()
+        return row is not None and row[0] == key
+
+    def ingested_file_types(self):
+        rows = self.conn.execute("SELECT file_type FROM ingestion_state WHERE period = ?", (self.period,))
+        return {row[0] for row in rows}
+
+    def mark_ingested(self, cursor, file_type, key):
+        cursor.execute(
+            "INSERT OR REPLACE INTO ingestion_state VALUES (?, ?, ?, ?)",
+            (file_type, self.period, key, time.strftime("%Y-%m-%d %H:%M:%S"))
+        )
+
+    def clear_period(self, cursor, *tables):
+        # Re-ingesting a workbook replaces its period only; other months are kept
+        for table in tables:
+            cursor.execute(f"DELETE FROM {table} WHERE period = ?", (self.period,))
+
+    def insert_period_rows(self, cursor, table, frame):
+        frame = frame.assign(period=self.period)
+        if "category" in frame:
+            frame["category_key"] = frame["category"].str.strip().str.lower()
+        insert_block(cursor, table, frame)
+        return len(frame)
+
+    def check_workbook(self, file_type, file_path):
+        from rapport_validate import check_workbooks
+
+        with self.tracer.span("validate", file_type=file_type):
+            check_workbooks({file_type: file_path})
+
+    def read_blocks(self, file_path, layout, key, file_type, validate=True):
+        # Returns the parsed blocks and the sheet they came from (None on a cache hit).
+        # The workbook is only checked when it is going to be parsed.
+        if validate and not (key and self.ingestion_cache.lookup(key)):
+            self.check_workbook(file_type, file_path)
+        with self.tracer.span("read", file_type=file_type, bytes=os.path.getsize(file_path)) as span:
+            blocks = self.ingestion_cache.load_blocks(key) if key else None
+            span.fields["cache"] = "hit" if blocks is not None else "miss"
+            if blocks is None:
+                df = read_layout_sheet(file_path, layout)
+                span.add(rows=len(df))
+        if blocks is not None:
+            return blocks, None
+        with self.tracer.span("normalize", file_type=file_type) as span:
+            blocks = {block["name"]: parse_block(df, block) for block in layout["blocks"]}
+            span.add(rows=sum(len(frame) for frame in blocks.values()))
+        if key:
+            self.ingestion_cache.save_blocks(key, blocks)
+        return blocks, df
+
+    def read_bordereaux(self, file_path, chunk_size):
+        # Reading and normalizing alternate chunk by chunk, so each stage sums its share
+        read = self.tracer.timer("read", file_type="bordereaux", bytes=os.path.getsize(file_path), rows=0)
+        normalize = self.tracer.timer("normalize", file_type="bordereaux", rows=0)
+        chunks = iter_bordereaux_chunks(file_path, chunk_size)
+        while True:
+            with read.measure():
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            with normalize.measure():
+                chunk = normalize_bordereaux_chunk(chunk)
+            read.add(rows=len(chunk))
+            normalize.add(rows=len(chunk))
+            yield chunk
+        read.finish()
+        normalize.finish()
+
+    def process_chiffre_file(self, file_path, validate=True):
+        import pandas as pd
 
-    def process_productivity_file(self, file_path):
         try:
-            df = pd.read_excel(file_path, sheet_name="Feuil1", skiprows=1)
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM agent_productivity")
-            cursor.execute("DELETE FROM processing_times")
-            cursor.execute("DELETE FROM completion_stats")
-            cursor.execute("DELETE FROM intervention_reasons")
-
-            # Agent productivity
-            for _, row in df.iloc[0:11].iterrows():
-                if pd.notna(row.iloc[0]) and pd.notna(row.iloc[1]) and isinstance(row.iloc[1], (int, float)):
-                    cursor.execute("""
-                        INSERT INTO agent_productivity (agent_name, auth_conform_files, tech_control_files)
-                        VALUES (?, ?, ?)
-                    """, (
-                        self.normalize_text(row.iloc[0]),
-                        int(row.iloc[1]),
-                        0
-                    ))
-            for _, row in df.iloc[27:31].iterrows():
-                if pd.notna(row.iloc[0]) and pd.notna(row.iloc[1]) and isinstance(row.iloc[1], (int, float)):
-                    cursor.execute("""
-                        INSERT INTO agent_productivity (agent_name, auth_conform_files, tech_control_files)
-                        VALUES (?, ?, ?)
-                    """, (
-                        self.normalize_text(row.iloc[0]),
-                        0,
-                        int(row.iloc[1])
-                    ))
-
-            # Processing times (aligned with Word document)
-            cursor.execute("INSERT INTO processing_times VALUES (?, ?, ?, ?)", ("المصادقة", 30, 35, 35))
-            cursor.execute("INSERT INTO processing_times VALUES (?, ?, ?, ?)", ("المطابقة", 25, 15, 60))
-            cursor.execute("INSERT INTO processing_times VALUES (?, ?, ?, ?)", ("المراقبة الفنية", 14, 23, 63))
-            cursor.execute("INSERT INTO processing_times VALUES (?, ?, ?, ?)", ("المراقبة الفنية تحت الديوانة", 10, 0, 90))
-            cursor.execute("INSERT INTO processing_times VALUES (?, ?, ?, ?)", ("المراقبة الفنية لأجهزة الالتقاط الإذاعي لدى موردي السيارات", 0, 0, 100))
-
-            # Completion stats and intervention reasons (aligned with Word document)
-            cursor.execute("INSERT INTO completion_stats VALUES (?, ?, ?)", ("المصادقة", 57, 43))
-            cursor.execute("INSERT INTO completion_stats VALUES (?, ?, ?)", ("المطابقة", 52, 48))
-            cursor.execute("INSERT INTO intervention_reasons VALUES (?, ?, ?, ?)", ("المصادقة", 60, 30, 10))
-            cursor.execute("INSERT INTO intervention_reasons VALUES (?, ?, ?, ?)", ("المطابقة", 40, 52, 8))
-
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process Productivity file: {str(e)}")
+            key = self.cache_key(file_path, CHIFFRE_LAYOUT)
+            if self.is_ingested("chiffre", key):
+                return
+            blocks, df = self.read_blocks(file_path, CHIFFRE_LAYOUT, key, "chiffre", validate)
+
+            # Debug: Print DataFrame to verify structure (RAPPORT_DEBUG=1)
+            if df is not None and self.tracer.debug:
+                print("Chiffre d'affaire Excel DataFrame:")
+                print(df.head(30))
+                print("Dashboard current month rows 14 to 19:")
+                print(df.iloc[14:19])
+                print("Dashboard year to date rows 21 to 26:")
+                print(df.iloc[21:26])
+
+            with self.storage.transaction(file_type="chiffre") as cursor:
+                with self.tracer.span("insert", file_type="chiffre", rows=0) as span:
+                    self.clear_period(
+                        cursor, "revenues", "dossiers", "dashboard_current_month", "dashboard_year_to_date",
+                        "operations_current_month", "operations_year_to_date"
+                    )
+
+                    for block in CHIFFRE_LAYOUT["blocks"]:
+                        span.add(rows=self.insert_period_rows(cursor, block["table"], blocks[block["name"]]))
+
+                    # Operations current month (aligned with Word document)
+                    span.add(rows=self.insert_period_rows(cursor, "operations_current_month", pd.DataFrame([
+                        ("ملفات عمليات المصادقة", 206, 84.1),
+                        ("المصادقة لفائدة الحرفاء الأجانب", 14, 5.7),
+                        ("عمليات المطابقة", 25, 10.2),
+                        ("المراقبة الفنية", 245, 98.8),
+                        ("المراقبة الفنية تحت الديوانة", 3, 1.2),
+                    ], columns=["category", "files", "percentage"])))
+
+                    # Operations year to date (aligned with Word document)
+                    span.add(rows=self.insert_period_rows(cursor, "operations_year_to_date", pd.DataFrame([
+                        ("ملفات عمليات المصادقة", 845, 83.9),
+                        ("المصادقة لفائدة الحرفاء الأجانب", 43, 4.3),
+                        ("عمليات المطابقة", 119, 11.8),
+                        ("المراقبة الفنية", 944, 96.2),
+                        ("المراقبة الفنية تحت الديوانة", 37, 3.8),
+                    ], columns=["category", "files", "percentage"])))
+
+                with self.tracer.span("aggregate", file_type="chiffre", rows=0) as span:
+                    for table, measure in FACT_MEASURES.items():
+                        rows = blocks[table][["category", *MONTH_COLUMNS]].itertuples(index=False, name=None)
+                        span.add(rows=update_facts(cursor, measure, self.year, self.month, wide_categories(rows)))
+                self.mark_ingested(cursor, "chiffre", key)
+        except RapportValidationError:
             raise
+        except Exception as e:
+            raise RapportError(f"Failed to process Chiffre file: {str(e)}") from e
 
-    def process_bordereaux_file(self, file_path):
+    def process_productivity_file(self, file_path, validate=True):
         try:
-            df = pd.read_excel(file_path, sheet_name="Feuil1", header=None)
-            header_row = df[df.iloc[:, 0] == 'N° Bordereaux'].index[0]
-            df.columns = df.iloc[header_row]
-            df = df.iloc[header_row + 1:].reset_index(drop=True)
-            cursor = self.conn.cursor()
-            cursor.execute("DELETE FROM bordereaux")
-            for _, row in df.iterrows():
-                cursor.execute("""
-                    INSERT INTO bordereaux VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    int(row['N° Bordereaux']) if pd.notna(row['N° Bordereaux']) else 0,
-                    self.normalize_text(row['N° dossier']) if pd.notna(row['N° dossier']) else "",
-                    self.normalize_text(row['Type de dossier H/C']) if pd.notna(row['Type de dossier H/C']) else "",
-                    self.normalize_text(row['Resultat R/FI']) if pd.notna(row['Resultat R/FI']) else "",
-                    self.normalize_text(row['Intervenant']) if pd.notna(row['Intervenant']) else "",
-                    self.normalize_text(row['Cause FI']) if pd.notna(row['Cause FI']) else "",
-                    self.normalize_text(row["Délai d'exécution"]) if pd.notna(row["Délai d'exécution"]) else ""
-                ))
-            self.conn.commit()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process Bordereaux file: {str(e)}")
+            key = self.cache_key(file_path, PRODUCTIVITY_LAYOUT)
+            if self.is_ingested("productivity", key):
+                return
+            blocks, _ = self.read_blocks(file_path, PRODUCTIVITY_LAYOUT, key, "productivity", validate)
+            with self.storage.transaction(file_type="productivity") as cursor:
+                with self.tracer.span("insert", file_type="productivity", rows=0) as span:
+                    self.clear_period(cursor, "agent_productivity")
+                    for block in PRODUCTIVITY_LAYOUT["blocks"]:
+                        span.add(rows=self.insert_period_rows(cursor, block["table"], blocks[block["name"]]))
+                    self.mark_ingested(cursor, "productivity", key)
+        except RapportValidationError:
             raise
+        except Exception as e:
+            raise RapportError(f"Failed to process Productivity file: {str(e)}") from e
 
-    def show_rapport_page(self):
-        for widget in self.content_frame.winfo_children():
-            if widget != self.rapport_frame:
-                widget.pack_forget()
-        self.rapport_frame.pack(fill=tk.BOTH, expand=True)
-
-    def generate_pdf(self):
-        if not all(self.file_paths.values()):
-            messagebox.showerror("Error", "Please upload all three Excel files.")
-            return
-
+    def process_bordereaux_file(self, file_path, chunk_size=BORDEREAUX_CHUNK_SIZE, validate=True):
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("SELECT * FROM revenues WHERE TRIM(LOWER(category)) = 'total moi'")
-            total_revenue = cursor.fetchone()
-            cursor.execute("SELECT * FROM dossiers WHERE TRIM(LOWER(category)) = 'total moi'")
-            total_files = cursor.fetchone()
-            if not total_revenue or not total_files:
-                messagebox.showerror("Error", "Missing total revenue or files data.")
+            key = self.cache_key(file_path, BORDEREAUX_LAYOUT)
+            if self.is_ingested("bordereaux", key):
                 return
+            cached = key and self.ingestion_cache.lookup(key) is not None
+            if validate and not cached:
+                self.check_workbook("bordereaux", file_path)
+            # Parse into the cache first so the write lock is only held while loading
+            if key and not cached:
+                with self.ingestion_cache.block_writer(key) as save:
+                    for n, chunk in enumerate(self.read_bordereaux(file_path, chunk_size)):
+                        save(f"chunk-{n:06d}", chunk)
+            chunks = self.ingestion_cache.iter_blocks(key) if key else None
+            if chunks is None:
+                chunks = self.read_bordereaux(file_path, chunk_size)
+            try:
+                self.load_bordereaux(chunks, key)
+            except CacheEntryError:
+                # Rolled back and the entry removed; the workbook itself is read instead
+                self.load_bordereaux(self.read_bordereaux(file_path, chunk_size), key)
+        except RapportValidationError:
+            raise
+        except Exception as e:
+            raise RapportError(f"Failed to process Bordereaux file: {str(e)}") from e
+
+    def load_bordereaux(self, chunks, key):
+        # One transaction for the whole file, written in executemany batches
+        insert = self.tracer.timer("insert", file_type="bordereaux", rows=0)
+        with self.storage.transaction(file_type="bordereaux") as cursor:
+            labels = LabelIds(cursor)
+            with insert.measure():
+                self.clear_period(cursor, "bordereaux")
+            for chunk in chunks:
+                with insert.measure():
+                    chunk = labels.encode(chunk, BORDEREAUX_CATEGORIES)
+                    insert.add(rows=self.insert_period_rows(cursor, "bordereaux", chunk))
+            insert.finish()
+            with self.tracer.span("aggregate", file_type="bordereaux"):
+                self.update_statistics(cursor)
+            self.mark_ingested(cursor, "bordereaux", key)
+
+    def update_statistics(self, cursor):
+        # Processing times, completion and intervention reasons are derived from the bordereaux
+        statistics = bordereaux_statistics(cursor, self.period)
+        self.clear_period(cursor, *statistics)
+        for table, frame in statistics.items():
+            self.insert_period_rows(cursor, table, frame)
+
+    def process_file(self, file_type, file_path, validate=True):
+        # Workbooks are checked before anything is written, unless already ingested or
+        # cached (validate=False when the caller already did, as run_job does up front)
+        if file_type == "chiffre":
+            self.process_chiffre_file(file_path, validate)
+        elif file_type == "productivity":
+            self.process_productivity_file(file_path, validate)
+        elif file_type == "bordereaux":
+            self.process_bordereaux_file(file_path, validate=validate)
+        else:
+            raise RapportError(f"Unknown file type: {file_type}")
+
+    def fetch_rows(self, table, condition="", params=()):
+        return self.conn.execute(
+            f"SELECT {REPORT_COLUMNS[table]} FROM {table} WHERE period = ?{condition} ORDER BY rowid",
+            (self.period, *params)
+        ).fetchall()
+
+    def fetch_totals(self, measure):
+        row = self.conn.execute(
+            "SELECT value, ytd FROM monthly_totals WHERE measure = ? AND period = ?", (measure, self.period)
+        ).fetchone()
+        return Totals(*row) if row else None
+
+    def fetch_objectives(self):
+        # Targets come from the upload; the realized figure is the category's running total
+        return [
+            Objective(*row) for row in self.conn.execute(
+                "SELECT r.category, COALESCE(f.ytd, 0), r.target_percentage, r.target_value FROM revenues r "
+                "LEFT JOIN monthly_facts f ON f.measure = ? AND f.period = r.period AND f.category_key = r.category_key "
+                "WHERE r.period = ? AND r.category_key != ? ORDER BY r.rowid",
+                (FACT_MEASURES["revenues"], self.period, TOTAL_CATEGORY)
+            )
+        ]
+
+    def fetch_report_data(self):
+        # One read transaction, so an upload committing meanwhile is seen entirely or not at all
+        with self.storage.snapshot():
+            total_revenue = self.fetch_totals(FACT_MEASURES["revenues"])
+            total_files = self.fetch_totals(FACT_MEASURES["dossiers"])
+            target = self.conn.execute(
+                "SELECT target_percentage, target_value FROM revenues WHERE period = ? AND category_key = ?",
+                (self.period, TOTAL_CATEGORY)
+            ).fetchone()
+            if total_revenue is None or total_files is None or target is None:
+                raise RapportError("Missing total revenue or files data.")
+
+            return ReportData(
+                total_revenue=total_revenue,
+                total_files=total_files,
+                revenue_target=Objective(TOTAL_CATEGORY, total_revenue.year_to_date, *target),
+                dashboard_current=self.fetch_rows("dashboard_current_month"),
+                dashboard_year=self.fetch_rows("dashboard_year_to_date"),
+                operations_current=self.fetch_rows("operations_current_month"),
+                operations_year=self.fetch_rows("operations_year_to_date"),
+                processing_times=self.fetch_rows("processing_times"),
+                completion_stats=self.fetch_rows("completion_stats"),
+                intervention_reasons=self.fetch_rows("intervention_reasons"),
+                agent_productivity=self.fetch_rows("agent_productivity"),
+                revenue_rows=self.fetch_objectives(),
+            )
 
-            cursor.execute("SELECT * FROM dashboard_current_month")
-            dashboard_current = cursor.fetchall()
-            cursor.execute("SELECT * FROM dashboard_year_to_date")
-            dashboard_year = cursor.fetchall()
-            cursor.execute("SELECT * FROM operations_current_month")
-            operations_current = cursor.fetchall()
-            cursor.execute("SELECT * FROM operations_year_to_date")
-            operations_year = cursor.fetchall()
-            cursor.execute("SELECT * FROM processing_times")
-            processing_times = cursor.fetchall()
-            cursor.execute("SELECT * FROM completion_stats")
-            completion_stats = cursor.fetchall()
-            cursor.execute("SELECT * FROM intervention_reasons")
-            intervention_reasons = cursor.fetchall()
-            cursor.execute("SELECT * FROM agent_productivity")
-            agent_productivity = cursor.fetchall()  # Fixed syntax error
-
-            latex_content = self.generate_latex(
-                total_revenue, total_files, dashboard_current, dashboard_year,
-                operations_current, operations_year, processing_times,
-                completion_stats, intervention_reasons, agent_productivity
+    def compile_pdf(self, tex_name="rapport.tex", fmt_path=None):
+        command = ["latexmk", "-xelatex", "-f", "-interaction=nonstopmode", tex_name]
+        if fmt_path:
+            # xelatex finds the format in its working directory
+            local_fmt = os.path.join(self.work_dir, os.path.basename(fmt_path))
+            if os.path.exists(local_fmt):
+                os.remove(local_fmt)
+            try:
+                os.link(fmt_path, local_fmt)
+            except OSError:
+                shutil.copyfile(fmt_path, local_fmt)
+            fmt_name = os.path.splitext(os.path.basename(fmt_path))[0]
+            command.insert(2, f"-xelatex=xelatex -fmt={fmt_name} %O %S")
+        self.run_command(command)
+        return os.path.join(self.work_dir, os.path.splitext(tex_name)[0] + ".pdf")
+
+    def run_command(self, command, cwd=None, quiet=False):
+        if self.cancelled:
+            raise RapportCancelled("PDF generation cancelled.")
+        # Own process group so cancel() also stops the xelatex children of latexmk
+        if os.name == "nt":
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {"start_new_session": True}
+        timeout = self.command_timeout()
+        output = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL} if quiet else {}
+        process = subprocess.Popen(command, cwd=cwd or self.work_dir, stdin=subprocess.DEVNULL, **output, **group)
+        self.processes.add(process)
+        try:
+            if self.cancelled:
+                self.kill_processes()
+            try:
+                returncode = process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                kill_process(process)
+                process.wait()
+                if self.deadline is not None and time.monotonic() >= self.deadline:
+                    raise RapportTimeout(f"Report build timed out while running {command[0]}")
+                raise RapportTimeout(f"{command[0]} did not finish within {timeout:.0f}s")
+        finally:
+            self.processes.discard(process)
+        if self.cancelled:
+            raise RapportCancelled("PDF generation cancelled.")
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, command)
+
+    def command_timeout(self):
+        if self.deadline is None:
+            return TEX_TIMEOUT
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise RapportTimeout("Report build timed out")
+        return min(TEX_TIMEOUT, remaining)
+
+    def kill_processes(self):
+        for process in list(self.processes):
+            kill_process(process)
+
+    def cancel(self):
+        # Safe to call from another thread
+        self.cancelled = True
+        self.kill_processes()
+
+    def compile_chart(self, name, document, pdf_path):
+        # Standalone chart in a scratch directory, so parallel builds do not share aux files
+        build_dir = tempfile.mkdtemp(prefix=".build-", dir=os.path.dirname(pdf_path))
+        try:
+            with open(os.path.join(build_dir, f"{name}.tex"), "w", encoding="utf-8") as f:
+                f.write(document)
+            self.run_command(
+                ["xelatex", "-interaction=nonstopmode", "-halt-on-error", f"{name}.tex"], cwd=build_dir
+            )
+            os.replace(os.path.join(build_dir, f"{name}.pdf"), pdf_path)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+        if self.chart_cache:
+            self.chart_cache.save_pdf(self.chart_cache.key(document, toolchain_version()), pdf_path)
+
+    def render_charts(self, charts):
+        # Charts are named by content, so existing files are current; the rest come
+        # from the chart cache or are compiled in parallel
+        charts_dir = os.path.join(self.work_dir, CHARTS_DIR)
+        os.makedirs(charts_dir, exist_ok=True)
+        for entry in os.scandir(charts_dir):
+            if entry.name.endswith(".pdf") and entry.name[:-4] not in charts:
+                os.remove(entry.path)
+
+        missing = {}
+        for name, document in charts.items():
+            pdf_path = os.path.join(charts_dir, f"{name}.pdf")
+            if os.path.exists(pdf_path):
+                continue
+            if self.chart_cache and self.chart_cache.load_pdf(
+                self.chart_cache.key(document, toolchain_version()), pdf_path
+            ):
+                continue
+            missing[name] = (document, pdf_path)
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(len(missing), os.cpu_count() or 1)) as pool:
+                futures = [pool.submit(self.compile_chart, name, *args) for name, args in missing.items()]
+                for future in as_completed(futures):
+                    future.result()
+        return len(missing)
+
+    def preamble_format(self):
+        if self.format_cache is None:
+            return None
+        # Through run_command, so cancel() and the job deadline stop the format build too
+        try:
+            return build_preamble_format(self.format_cache, lambda command, cwd: self.run_command(command, cwd, True))
+        except RapportTimeout:
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                raise
+            # This run alone overran TEX_TIMEOUT: the report compiles without the format
+            return None
+
+    def build_pdf(self, progress=None):
+        progress = progress or (lambda stage: None)
+        progress("Reading report data")
+        with self.tracer.span("fetch"):
+            report_data = self.fetch_report_data()
+        progress("Rendering LaTeX")
+        with self.tracer.span("render") as span:
+            fingerprints, rendered = self.write_fragments(report_data)
+            main_document = render_main()
+            write_if_changed(os.path.join(self.work_dir, "rapport.tex"), main_document)
+            span.add(rows=len(rendered))
+            span.fields["sections"] = rendered
+
+        # The fragments follow from the report data, so the same data and period on
+        # the same toolchain always yield the same PDF
+        pdf_path = os.path.join(self.work_dir, "rapport.pdf")
+        with self.tracer.span("pdf_cache") as span:
+            source = main_document + json.dumps(
+                {"version": FRAGMENT_VERSION, "period": self.period, "tables": fingerprints}, sort_keys=True
+            )
+            key = self.render_cache.key(source, toolchain_version()) if self.render_cache else None
+            span.fields["hit"] = bool(key) and self.render_cache.load_pdf(key, pdf_path)
+        if span.fields["hit"]:
+            return pdf_path
+        progress("Rendering charts")
+        with self.tracer.span("charts") as span:
+            charts = report_charts(report_data)
+            span.add(rows=len(charts), compiled=self.render_charts(charts))
+        progress("Preparing preamble format")
+        with self.tracer.span("format"):
+            fmt_path = self.preamble_format()
+        progress("Compiling PDF")
+        with self.tracer.span("compile", preamble_format=bool(fmt_path)) as span:
+            try:
+                pdf_path = self.compile_pdf("rapport.tex", fmt_path)
+            except subprocess.CalledProcessError:
+                if not fmt_path:
+                    raise
+                # Fall back to loading the full preamble
+                span.fields["preamble_format"] = False
+                pdf_path = self.compile_pdf("rapport.tex")
+            span.add(bytes=os.path.getsize(pdf_path))
+        if key:
+            self.render_cache.save_pdf(key, pdf_path)
+        return pdf_path
+
+    def build_preview(self):
+        # HTML draft of the same sections, without TeX; the PDF stays the final output
+        from rapport_preview import render_preview
+
+        with self.tracer.span("preview") as span:
+            html = render_preview(
+                self.fetch_report_data(), self.year, self.month, generated=time.strftime("%Y-%m-%d %H:%M:%S")
+            )
+            preview_path = os.path.join(self.work_dir, "preview.html")
+            with open(preview_path, "w", encoding="utf-8") as f:
+                f.write(html)
+            span.add(bytes=len(html.encode("utf-8")))
+        return preview_path
+
+    def write_fragments(self, report_data):
+        # One file per section under SECTIONS_DIR. Only sections reading a table whose
+        # data changed since the last build are rendered again; the others keep their
+        # file and mtime, so latexmk sees them as up to date.
+        sections_dir = os.path.join(self.work_dir, SECTIONS_DIR)
+        os.makedirs(sections_dir, exist_ok=True)
+        manifest_path = os.path.join(sections_dir, "manifest.json")
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+
+        fingerprints = table_fingerprints(report_data)
+        if manifest.get("version") == FRAGMENT_VERSION and manifest.get("period") == self.period:
+            previous = manifest.get("tables", {})
+            stale = set(sections_for_tables(
+                table for table, digest in fingerprints.items() if previous.get(table) != digest
+            ))
+        else:
+            stale = {name for name, _ in SECTIONS}
+
+        rendered = []
+        for name, render in SECTIONS:
+            path = os.path.join(sections_dir, f"{name}.tex")
+            if name in stale or not os.path.exists(path):
+                write_if_changed(path, render(report_data, self.year, self.month))
+                rendered.append(name)
+        # Written last: after a crash the unfinished sections are still seen as stale
+        write_if_changed(manifest_path, json.dumps(
+            {"version": FRAGMENT_VERSION, "period": self.period, "tables": fingerprints}, sort_keys=True, indent=2
+        ))
+        return fingerprints, rendered
+
+    def generate_latex(self, report_data):
+        # The whole report as a single document
+        return render_report(report_data, self.year, self.month)
+
+    def close(self):
+        # TeX runs still going (the build was interrupted) are stopped with it
+        self.kill_processes()
+        self.tracer.close()
+        self.storage.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ingest_file(file_type, file_path, work_dir=".", period=DEFAULT_PERIOD):
+    with RapportGenerator(work_dir=work_dir, period=period) as generator:
+        generator.process_file(file_type, file_path)
+    return file_type
+
+
+def load_manifest(manifest_path):
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    jobs = manifest["jobs"] if isinstance(manifest, dict) else manifest
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    resolved = []
+    output_dirs = set()
+    for n, job in enumerate(jobs, 1):
+        missing = [key for key in (*FILE_TYPES, "output_dir") if not job.get(key)]
+        if missing:
+            raise RapportError(f"Job {n}: missing {', '.join(missing)}")
+        job = dict(job)
+        for key in (*FILE_TYPES, "output_dir"):
+            job[key] = os.path.join(base_dir, job[key])
+        job["period"] = job.get("period", DEFAULT_PERIOD)
+        parse_period(job["period"])
+        # Each job owns its working directory (tex, pdf and database)
+        output_dir = os.path.normcase(os.path.realpath(job["output_dir"]))
+        if output_dir in output_dirs:
+            raise RapportError(f"Job {n}: output_dir {job['output_dir']} is used by another job")
+        output_dirs.add(output_dir)
+        resolved.append(job)
+    return resolved
+
+
+def run_job(job, timeout=None):
+    start = time.perf_counter()
+    result = {"output_dir": job["output_dir"], "period": job["period"], "status": "ok"}
+    try:
+        from rapport_validate import check_workbooks
+
+        # All three workbooks, before the job's database is created
+        check_workbooks({file_type: job[file_type] for file_type in FILE_TYPES})
+        os.makedirs(job["output_dir"], exist_ok=True)
+        with RapportGenerator(work_dir=job["output_dir"], period=job["period"]) as generator:
+            if timeout:
+                generator.deadline = time.monotonic() + timeout
+            for file_type in FILE_TYPES:
+                generator.process_file(file_type, job[file_type], validate=False)
+            result["pdf"] = generator.build_pdf()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+        result["timed_out"] = isinstance(e, RapportTimeout)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_batch(jobs, workers=1, timeout=JOB_TIMEOUT, memory_limit=None):
+    from rapport_compile import CompilePool
+
+    results = []
+    with CompilePool(max(1, min(workers, len(jobs))), timeout, memory_limit) as pool:
+        futures = [pool.submit(job) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["status"] == "ok":
+                print(f"[ok] {result['period']} -> {result['pdf']} ({result['seconds']}s)")
+            else:
+                print(f"[error] {result['period']} -> {result['output_dir']}: {result['error']}", file=sys.stderr)
+        stats = pool.stats()
+    if results:
+        summary = (
+            f"{stats['completed']} built, {stats['failed']} failed ({stats['timeouts']} timed out), "
+            f"{stats['restarts']} worker restarts"
+        )
+        # No latencies when no worker could start
+        if stats["build_p50"] is not None:
+            summary += (
+                f"; queue wait p50 {stats['wait_p50']:.2f}s, "
+                f"build p50 {stats['build_p50']:.2f}s p95 {stats['build_p95']:.2f}s"
             )
+        print(summary)
+    return results
+
+
+def megabytes(text):
+    return int(text) * 1024 * 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rapport Generator")
+    subparsers = parser.add_subparsers(dest="command")
+    batch_parser = subparsers.add_parser("batch", help="Generate reports from a JSON manifest without the GUI")
+    batch_parser.add_argument("manifest", help="JSON list of {chiffre, productivity, bordereaux, period, output_dir} jobs")
+    batch_parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="Maximum parallel jobs")
+    batch_parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT, help="Seconds a report job may take")
+    batch_parser.add_argument("--memory-limit", type=megabytes,
+                              help="Address space limit of each build worker, in MB (not enforced on Windows)")
+    watch_parser = subparsers.add_parser("watch", help="Ingest workbooks dropped into a folder and rebuild their reports")
+    watch_parser.add_argument("watch_dir", help="Folder the monthly exports are dropped into")
+    watch_parser.add_argument("output_dir", help="Reports are written to <output_dir>/<period>/rapport.pdf")
+    watch_parser.add_argument("--period", default=DEFAULT_PERIOD,
+                              help="Period for files whose name or folder does not contain one (YYYY-MM)")
+    watch_parser.add_argument("--interval", type=float, default=1.0, help="Seconds between folder scans")
+    watch_parser.add_argument("--settle", type=float, default=2.0,
+                              help="Seconds a file must stay unchanged before it is ingested")
+    watch_parser.add_argument("-j", "--workers", type=int, default=len(FILE_TYPES), help="Parallel ingestions")
+    watch_parser.add_argument("--compile-workers", type=int, default=1, help="Parallel report builds")
+    watch_parser.add_argument("--max-pending", type=int, help="Files queued for ingestion before new drops wait")
+    serve_parser = subparsers.add_parser("serve", help="Serve uploads, report jobs and PDFs over local HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--state-dir", default="rapport_service",
+                              help="Where uploads and finished jobs are kept")
+    serve_parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="Parallel report builds")
+    serve_parser.add_argument("--max-queue", type=int, default=16,
+                              help="Jobs waiting for a worker before new submissions are refused")
+    serve_parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT, help="Seconds a report job may take")
+    serve_parser.add_argument("--memory-limit", type=megabytes,
+                              help="Address space limit of each build worker, in MB (not enforced on Windows)")
+    serve_parser.add_argument("--db", help="Report database answered on /query (not created if missing)")
+    export_parser = subparsers.add_parser("export", help="Export the stored tables to Parquet, partitioned by period")
+    export_parser.add_argument("output_dir", help="Written as <output_dir>/<table>/period=YYYY-MM/part-0.parquet")
+    export_parser.add_argument("--db", default="rapport_data.db")
+    export_parser.add_argument("--period", action="append",
+                               help="Only export this period (YYYY-MM); may be repeated")
+    query_parser = subparsers.add_parser("query", help="Print month-over-month aggregates as JSON")
+    query_parser.add_argument("query", help="revenue_by_category, files_by_category, revenue_totals, files_totals, "
+                                            "agent_productivity or fi_causes")
+    query_parser.add_argument("--db", default="rapport_data.db")
+    query_parser.add_argument("--from", dest="start", help="First period (YYYY-MM)")
+    query_parser.add_argument("--to", dest="end", help="Last period (YYYY-MM)")
+    validate_parser = subparsers.add_parser("validate", help="Check workbooks without ingesting them")
+    validate_parser.add_argument("files", nargs="+", help="Workbooks to check")
+    validate_parser.add_argument("--type", dest="file_type", choices=list(FILE_TYPES),
+                                 help="Check every file as this type instead of detecting it")
+    parser.add_argument("--trace-dir", help="Write per-stage timings of each run as JSON lines to this directory")
+    parser.add_argument("--debug", action="store_true", help="Print parsed workbook sheets while ingesting")
+    args = parser.parse_args(argv)
+    configure_tracing(args.trace_dir, args.debug)
+
+    if args.command == "batch":
+        try:
+            jobs = load_manifest(args.manifest)
+        except (OSError, ValueError, KeyError, RapportError) as e:
+            print(f"Invalid manifest: {e}", file=sys.stderr)
+            return 2
+        results = run_batch(jobs, max(1, args.workers), args.timeout, args.memory_limit)
+        return 0 if all(r["status"] == "ok" for r in results) else 1
+
+    if args.command == "watch":
+        from rapport_watch import run_watch
+        try:
+            return run_watch(args)
+        except RapportError as e:
+            print(str(e), file=sys.stderr)
+            return 2
 
-            with open("rapport.tex", "w", encoding="utf-8") as f:
-                f.write(latex_content)
-            subprocess.run(["latexmk", "-xelatex", "-f", "rapport.tex"], check=True)
-            messagebox.showinfo("Success", "PDF generated as rapport.pdf")
-        except Exception as e:
-            messagebox.showerror("Error", f"PDF generation failed: {str(e)}")
-            raise
+    if args.command == "serve":
+        from rapport_service import run_service
+        return run_service(args)
 
-    def generate_latex(self, total_revenue, total_files, dashboard_current, dashboard_year,
-                       operations_current, operations_year, processing_times,
-                       completion_stats, intervention_reasons, agent_productivity):
-        latex = r"""
-\documentclass[a4paper,12pt]{article}
-\usepackage{geometry}
-\geometry{a4paper, margin=1in}
-\usepackage{polyglossia}
-\setmainlanguage{arabic}
-\setotherlanguage{english}
-\newfontfamily\arabicfont[Script=Arabic]{Arial}
-\usepackage{booktabs}
-\usepackage{array}
-\usepackage{longtable}
-\usepackage{pgfplots}
-\pgfplotsset{compat=1.18}
-\usepackage{tikz}
-\usepackage{pgf-pie}
-\usepackage{enumitem}
-\usepackage{tocloft}
-\usepackage{xcolor}
-\usepackage{amsmath}
-\usepackage{bidi}
-
-% Define the \dinar command
-\newcommand{\dinar}[1]{\text{د.ت} #1}
-
-\begin{document}
-
-\begin{center}
-\textbf{من إدارة الموارد} \\
-\textbf{إدارة المصادقة والمواصفات} \\
-\textbf{التقرير الشهري} \\
-\textbf{إدارة المصادقة والمواصفات} \\
-\textbf{2025} \\
-\textbf{ماي} \\
-\textbf{شهر} \\
-\textbf{الإدارة العامة} \\
-\textbf{وحدة مراقبة التصرف إدارة التعاون والتسويق}
-\end{center}
-
-\tableofcontents
-\newpage
-
-\section*{I. الهيكل التنظيمي}
-\begin{center}
-\textenglish{[Organizational chart placeholder]}
-\end{center}
-
-\section*{II. مؤشرات الإنتاج}
-
-\subsection*{1. المداخيل الجملية لإدارة المصادقة والمواصفات للشهر الحالي}
-\begin{longtable}{p{7cm}p{5cm}}
-\toprule
-\textbf{قيمة المداخيل (د.ت خال من الأداء على القيمة المصافة)} & \textbf{نوعية المداخيل} \\
-\midrule
-""" + f"\\dinar{{{total_revenue[5]:,}}} & مداخيل عمليات المصادقة والمطابقة والمراقبة الفنية \\\\\n" + r"""
-\bottomrule
-\end{longtable}
-
-\subsection*{2. المداخيل الجملية لإدارة المصادقة والمواصفات منذ بداية السنة}
-\begin{longtable}{p{7cm}p{5cm}}
-\toprule
-\textbf{قيمة المداخيل (د.ت خال من الأداء على القيمة المصافة)} & \textbf{نوعية المداخيل} \\
-\midrule
-""" + f"\\dinar{{{total_revenue[13]:,}}} & مداخيل عمليات المصادقة والمطابقة والمراقبة الفنية \\\\\n" + r"""
-\bottomrule
-\end{longtable}
-
-\subsection*{3. العدد الجملي للملفات المنجزة من طرف إدارة المصادقة والمواصفات خلال الشهر الحالي}
-\begin{longtable}{p{5cm}p{7cm}}
-\toprule
-\textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
-\midrule
-""" + f"{total_files[5]:,} & ملفات عمليات المصادقة والمطابقة والمراقبة الفنية \\\\\n" + r"""
-\bottomrule
-\end{longtable}
-
-\subsection*{4. العدد الجملي للملفات المنجزة من طرف إدارة المصادقة والمواصفات منذ بداية السنة}
-\begin{longtable}{p{5cm}p{7cm}}
-\toprule
-\textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
-\midrule
-""" + f"{total_files[13]:,} & ملفات عمليات المصادقة والمطابقة والمراقبة الفنية \\\\\n" + r"""
-\bottomrule
-\end{longtable}
-
-\subsection*{5. معدل أجال دراسة الملفات}
-\begin{longtable}{p{3cm}p{3cm}p{3cm}p{5cm}}
-\toprule
-\textbf{بعد الأجال (\%)} & \textbf{قبل الأجال (\%)} & \textbf{في الأجال (\%)} & \textbf{النشاط} \\
-\midrule
-"""
-        for pt in processing_times:
-            latex += f"{pt[3]:.0f} & {pt[2]:.0f} & {pt[1]:.0f} & {self.escape_latex(pt[0])} \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-{\footnotesize * آجال التدخل مرتبط بالمواعيد التي يحددها الحريف بالتنسيق مع مصالح الديوانة التونسية \\
-** آجال التدخل مرتبط بالمواعيد التي يحددها الحريف حسب جاهزيته}
-
-\section*{III. الأهداف}
-
-\subsection*{1. على مستوى المداخيل}
-\begin{longtable}{p{3cm}p{4cm}p{4cm}p{4cm}}
-\toprule
-\textbf{النسبة المئوية} & \textbf{قيمة المداخيل المنجزة (د.ت)} & \textbf{قيمة المداخيل المتوقعة (د.ت)} & \textbf{الأهداف ومتابعتها} \\
-\midrule
-"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM revenues WHERE TRIM(LOWER(category)) != 'total moi'")
-        for row in cursor.fetchall():
-            latex += f"{row[14]:.1f}\\% & \\dinar{{{row[13]:,}}} & \\dinar{{{row[15]:,}}} & {self.escape_latex(row[0])} \\\\\n"
-        latex += f"{total_revenue[14]:.1f}\\% & \\dinar{{{total_revenue[13]:,}}} & \\dinar{{{total_revenue[15]:,}}} & المجموع \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\subsection*{2. مؤشرات الإنتاج}
-\begin{longtable}{p{5cm}p{7cm}}
-\toprule
-\textbf{الأجال} & \textbf{النشاط} \\
-\midrule
-5 أيام & المصادقة \\
-48 ساعة & المراقبة الفنية \\
-5 أيام & المطابقة \\
-\bottomrule
-\end{longtable}
-
-\section*{IV. لوحة قيادة لمداخيل الشهر الحالي}
-\begin{longtable}{p{3cm}p{4cm}p{5cm}}
-\toprule
-\textbf{\% من المداخيل الجملية} & \textbf{قيمة المداخيل (د.ت)} & \textbf{نوعية المداخيل} \\
-\midrule
-"""
-        for dc in dashboard_current:
-            latex += f"{dc[2]:.1f}\\% & \\dinar{{{dc[1]:,}}} & {self.escape_latex(dc[0])} \\\\\n"
-        latex += f"100.0\\% & \\dinar{{{total_revenue[5]:,}}} & المجموع \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\section*{V. لوحة قيادة للمداخيل منذ بداية السنة}
-\begin{longtable}{p{3cm}p{4cm}p{5cm}}
-\toprule
-\textbf{\% من المداخيل الجملية} & \textbf{قيمة المداخيل (د.ت)} & \textbf{نوعية المداخيل} \\
-\midrule
-"""
-        for dy in dashboard_year:
-            latex += f"{dy[2]:.1f}\\% & \\dinar{{{dy[1]:,}}} & {self.escape_latex(dy[0])} \\\\\n"
-        latex += f"100.0\\% & \\dinar{{{total_revenue[13]:,}}} & المجموع \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\section*{VI. لوحة قيادة لعدد العمليات المنجزة خلال الشهر الحالي}
-
-\subsection*{1. عمليات المصادقة والمطابقة}
-\begin{longtable}{p{3cm}p{3cm}p{6cm}}
-\toprule
-\textbf{النسبة المئوية} & \textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
-\midrule
-"""
-        auth_conform = [op for op in operations_current if op[0] in ["ملفات عمليات المصادقة", "المصادقة لفائدة الحرفاء الأجانب", "عمليات المطابقة"]]
-        total_auth_conform = sum(op[1] for op in auth_conform)
-        for op in auth_conform:
-            latex += f"{op[2]:.1f}\\% & {op[1]:,} & {self.escape_latex(op[0])} \\\\\n"
-        latex += f"100.0\\% & {total_auth_conform:,} & المجموع \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\subsection*{2. عمليات المراقبة الفنية}
-\begin{longtable}{p{3cm}p{3cm}p{6cm}}
-\toprule
-\textbf{النسبة المئوية} & \textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
-\midrule
-"""
-        tech_control = [op for op in operations_current if op[0] in ["المراقبة الفنية", "المراقبة الفنية تحت الديوانة"]]
-        total_tech_control = sum(op[1] for op in tech_control)
-        for op in tech_control:
-            latex += f"{op[2]:.1f}\\% & {op[1]:,} & {self.escape_latex(op[0])} \\\\\n"
-        latex += f"100.0\\% & {total_tech_control:,} & المجموع \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\section*{VII. لوحة قيادة لعدد العمليات المنجزة منذ بداية السنة}
-
-\subsection*{1. عمليات المصادقة والمطابقة}
-\begin{longtable}{p{3cm}p{3cm}p{6cm}}
-\toprule
-\textbf{النسبة المئوية} & \textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
-\midrule
-"""
-        auth_conform_year = [op for op in operations_year if op[0] in ["ملفات عمليات المصادقة", "المصادقة لفائدة الحرفاء الأجانب", "عمليات المطابقة"]]
-        total_auth_conform_year = sum(op[1] for op in auth_conform_year)
-        for op in auth_conform_year:
-            latex += f"{op[2]:.1f}\\% & {op[1]:,} & {self.escape_latex(op[0])} \\\\\n"
-        latex += f"100.0\\% & {total_auth_conform_year:,} & المجموع \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\subsection*{2. عمليات المراقبة الفنية}
-\begin{longtable}{p{3cm}p{3cm}p{6cm}}
-\toprule
-\textbf{النسبة المئوية} & \textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
-\midrule
-"""
-        tech_control_year = [op for op in operations_year if op[0] in ["المراقبة الفنية", "المراقبة الفنية تحت الديوانة"]]
-        total_tech_control_year = sum(op[1] for op in tech_control_year)
-        for op in tech_control_year:
-            latex += f"{op[2]:.1f}\\% & {op[1]:,} & {self.escape_latex(op[0])} \\\\\n"
-        latex += f"100.0\\% & {total_tech_control_year:,} & المجموع \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\section*{VIII. إحصائيات معالجة الملفات}
-
-\subsection*{1. إحصائيات معالجة ملفات المصادقة}
-43\% من الملفات استوجبت بطاقات تدخل (RI) ويوضح الرسم البياني مختلف النقائص التي حالت دون إتمام غلق الملف:
-\begin{tikzpicture}
-\begin{scope}
-\pie[radius=1.5, sum=100, text=legend]{60/\text{نقص وثائق خصائص فنية}, 30/\text{تشغيل الجهاز أو نقص لبعض المكملات}, 10/\text{أسباب مختلفة}}
-\end{scope}
-\end{tikzpicture}
-
-\subsection*{2. إحصائيات معالجة ملفات المطابقة}
-48\% من الملفات استوجبت بطاقات تدخل (RI) ويوضح الرسم البياني مختلف النقائص التي حالت دون إتمام غلق الملف:
-\begin{tikzpicture}
-\begin{scope}
-\pie[radius=1.5, sum=100, text=legend]{40/\text{نقص وثائق خصائص فنية}, 52/\text{تشغيل الجهاز أو نقص لبعض المكملات}, 8/\text{أسباب مختلفة}}
-\end{scope}
-\end{tikzpicture}
-
-\section*{IX. إنتاجية الأعوان}
-\begin{longtable}{p{5cm}p{4cm}p{4cm}}
-\toprule
-\textbf{اسم العون} & \textbf{ملفات المصادقة والمطابقة} & \textbf{ملفات المراقبة الفنية} \\
-\midrule
-"""
-        for agent in agent_productivity:
-            latex += f"{self.escape_latex(agent[0])} & {agent[1]:,} & {agent[2]:,} \\\\\n"
-        latex += r"""
-\bottomrule
-\end{longtable}
-
-\section*{X. الموارد البشرية}
-\begin{longtable}{p{5cm}p{7cm}}
-\toprule
-\textbf{عدد الأعوان} & \textbf{نوع النشاط} \\
-\midrule
-15 & المصادقة والمراقبة الفنية \\
-19 & المجموع باعتبار المسؤولين والكتابة \\
-\bottomrule
-\end{longtable}
-
-\section*{XI. الاجتماعات والأنشطة المختلفة}
-\begin{itemize}
-\item اجتماع داخلي يوم 30 ماي 2025
-\end{itemize}
-
-\end{document}
-"""
-        return latex
+    if args.command == "validate":
+        from rapport_validate import run_validate
+        return run_validate(args)
+
+    if args.command in ("export", "query"):
+        from rapport_analytics import run_analytics
+        return run_analytics(args)
+
+    # Tk is only loaded for the GUI
+    from rapport_gui import run_app
+    run_app()
+    return 0
 
-    def __del__(self):
-        self.conn.close()
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = RapportGeneratorApp(root)
-    root.mainloop()
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import tkinter as tk
+from tkinter import filedialog, messagebox, ttk
+import os
+import queue
+import pathlib
+import threading
+import traceback
+import webbrowser
+from concurrent.futures import ProcessPoolExecutor
+
+from rapport_generator import (
+    DEFAULT_PERIOD, FILE_TYPES, RapportCancelled, RapportError, RapportGenerator, ingest_file, parse_period
+)
+
+
+class RapportGeneratorApp:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Rapport Generator")
+        self.root.geometry("800x600")
+
+        # Work runs off the Tk thread; results come back through self.events
+        self.events = queue.Queue()
+        self.upload_pool = None
+        self.pending_uploads = set()
+        # compiling is set on the Tk thread; compiler is the worker's generator once it exists
+        self.compiling = False
+        self.compiler = None
+        self.cancel_requested = False
+        self.compile_stage = ""
+
+        # Sidebar
+        self.sidebar = tk.Frame(self.root, width=200, bg="lightgray")
+        self.sidebar.pack(side=tk.LEFT, fill=tk.Y)
+
+        # Rapport page button
+        tk.Button(self.sidebar, text="Rapport", command=self.show_rapport_page).pack(pady=10)
+
+        # Main content frame
+        self.content_frame = tk.Frame(self.root)
+        self.content_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+
+        # Rapport frame
+        self.rapport_frame = tk.Frame(self.content_frame)
+        self.file_paths = {"chiffre": None, "productivity": None, "bordereaux": None}
+
+        # Rapport page widgets
+        tk.Label(self.rapport_frame, text="Report period (YYYY-MM)").pack(pady=5)
+        self.period_var = tk.StringVar(value=DEFAULT_PERIOD)
+        tk.Entry(self.rapport_frame, textvariable=self.period_var, width=10, justify=tk.CENTER).pack()
+
+        tk.Label(self.rapport_frame, text="Upload Chiffre d'affaire Excel").pack(pady=5)
+        tk.Button(self.rapport_frame, text="Browse", command=lambda: self.upload_file("chiffre")).pack(pady=5)
+        self.chiffre_label = tk.Label(self.rapport_frame, text="No file selected")
+        self.chiffre_label.pack()
+
+        tk.Label(self.rapport_frame, text="Upload Productivity Excel").pack(pady=5)
+        tk.Button(self.rapport_frame, text="Browse", command=lambda: self.upload_file("productivity")).pack(pady=5)
+        self.productivity_label = tk.Label(self.rapport_frame, text="No file selected")
+        self.productivity_label.pack()
+
+        tk.Label(self.rapport_frame, text="Upload Bordereaux Excel").pack(pady=5)
+        tk.Button(self.rapport_frame, text="Browse", command=lambda: self.upload_file("bordereaux")).pack(pady=5)
+        self.bordereaux_label = tk.Label(self.rapport_frame, text="No file selected")
+        self.bordereaux_label.pack()
+
+        buttons = tk.Frame(self.rapport_frame)
+        buttons.pack(pady=20)
+        self.generate_button = tk.Button(buttons, text="Generate PDF", command=self.generate_pdf)
+        self.generate_button.pack(side=tk.LEFT, padx=5)
+        # Draft in the browser, without waiting for XeLaTeX
+        self.preview_button = tk.Button(buttons, text="Preview", command=self.preview_report)
+        self.preview_button.pack(side=tk.LEFT, padx=5)
+
+        # Progress of background work
+        self.stage_label = tk.Label(self.rapport_frame, text="")
+        self.stage_label.pack()
+        self.progress = ttk.Progressbar(self.rapport_frame, mode="indeterminate", length=300)
+        self.progress.pack(pady=5)
+        self.cancel_button = tk.Button(self.rapport_frame, text="Cancel", command=self.cancel_pdf, state=tk.DISABLED)
+        self.cancel_button.pack(pady=5)
+
+        self.root.after(100, self.poll_events)
+
+    def poll_events(self):
+        while True:
+            try:
+                callback, args = self.events.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        self.root.after(100, self.poll_events)
+
+    def update_busy_state(self):
+        stages = [f"Parsing {FILE_TYPES[file_type]} file" for file_type in sorted(self.pending_uploads)]
+        if self.compiling:
+            stages.append(self.compile_stage)
+        self.stage_label.config(text=" | ".join(stages))
+        if stages:
+            self.progress.start(15)
+        else:
+            self.progress.stop()
+        busy_compiling = self.compiling
+        self.generate_button.config(state=tk.DISABLED if self.pending_uploads or busy_compiling else tk.NORMAL)
+        self.preview_button.config(state=tk.DISABLED if self.pending_uploads else tk.NORMAL)
+        self.cancel_button.config(state=tk.NORMAL if busy_compiling else tk.DISABLED)
+
+    def selected_period(self):
+        period = self.period_var.get().strip()
+        try:
+            parse_period(period)
+        except RapportError as e:
+            messagebox.showerror("Error", str(e))
+            return None
+        return period
+
+    def upload_file(self, file_type):
+        if file_type in self.pending_uploads:
+            return
+        period = self.selected_period()
+        if period is None:
+            return
+        file_path = filedialog.askopenfilename(filetypes=[("Excel files", "*.xlsx")])
+        if file_path:
+            getattr(self, f"{file_type}_label").config(text=os.path.basename(file_path))
+            # Parsing is CPU bound, so the three uploads run in separate processes
+            if self.upload_pool is None:
+                self.upload_pool = ProcessPoolExecutor(max_workers=len(FILE_TYPES))
+            future = self.upload_pool.submit(ingest_file, file_type, file_path, period=period)
+            self.pending_uploads.add(file_type)
+            self.update_busy_state()
+            future.add_done_callback(
+                lambda f: self.events.put((self.upload_finished, (file_type, file_path, f)))
+            )
+
+    def upload_finished(self, file_type, file_path, future):
+        self.pending_uploads.discard(file_type)
+        self.update_busy_state()
+        try:
+            future.result()
+        except Exception as e:
+            self.file_paths[file_type] = None
+            traceback.print_exception(type(e), e, e.__traceback__)
+            messagebox.showerror("Error", str(e) if isinstance(e, RapportError) else f"Failed to process {FILE_TYPES[file_type]} file: {str(e)}")
+            return
+        self.file_paths[file_type] = file_path
+
+    def show_rapport_page(self):
+        for widget in self.content_frame.winfo_children():
+            if widget != self.rapport_frame:
+                widget.pack_forget()
+        self.rapport_frame.pack(fill=tk.BOTH, expand=True)
+
+    def generate_pdf(self):
+        if self.compiling or self.pending_uploads:
+            return
+        if not all(self.file_paths.values()):
+            messagebox.showerror("Error", "Please upload all three Excel files.")
+            return
+
+        period = self.selected_period()
+        if period is None:
+            return
+
+        # Opening (and possibly migrating) the database happens in the worker, so the
+        # window stays responsive while it waits for the write lock
+        self.compiling = True
+        self.cancel_requested = False
+        self.compile_stage = "Starting"
+        self.update_busy_state()
+        threading.Thread(target=self.compile_in_background, args=(period,), daemon=True).start()
+
+    def compile_in_background(self, period):
+        # The generator is created here because SQLite connections are bound to their thread
+        generator = None
+        error = None
+        try:
+            generator = RapportGenerator(period=period)
+            self.compiler = generator
+            # Cancel may have been pressed while the generator was being created
+            if self.cancel_requested:
+                raise RapportCancelled("PDF generation cancelled.")
+            generator.build_pdf(progress=lambda stage: self.events.put((self.compile_progress, (stage,))))
+        except Exception as e:
+            error = e
+        finally:
+            if generator is not None:
+                generator.close()
+        self.events.put((self.compile_finished, (error,)))
+
+    def compile_progress(self, stage):
+        self.compile_stage = stage
+        self.update_busy_state()
+
+    def compile_finished(self, error):
+        self.compiling = False
+        self.compiler = None
+        self.update_busy_state()
+        if error is None:
+            messagebox.showinfo("Success", "PDF generated as rapport.pdf")
+        elif isinstance(error, RapportCancelled):
+            self.stage_label.config(text=str(error))
+        elif isinstance(error, RapportError):
+            messagebox.showerror("Error", str(error))
+        else:
+            traceback.print_exception(type(error), error, error.__traceback__)
+            messagebox.showerror("Error", f"PDF generation failed: {str(error)}")
+
+    def preview_report(self):
+        if self.pending_uploads:
+            return
+        period = self.selected_period()
+        if period is None:
+            return
+        # Needs the Chiffre upload only; sections from the other workbooks stay empty until they are in
+        threading.Thread(target=self.preview_in_background, args=(period,), daemon=True).start()
+
+    def preview_in_background(self, period):
+        try:
+            with RapportGenerator(period=period) as generator:
+                preview_path = generator.build_preview()
+        except Exception as e:
+            self.events.put((self.preview_failed, (e,)))
+            return
+        webbrowser.open(pathlib.Path(preview_path).resolve().as_uri())
+
+    def preview_failed(self, error):
+        if not isinstance(error, RapportError):
+            traceback.print_exception(type(error), error, error.__traceback__)
+        messagebox.showerror("Error", f"Preview failed: {str(error)}")
+
+    def cancel_pdf(self):
+        if not self.compiling:
+            return
+        self.compile_stage = "Cancelling"
+        self.update_busy_state()
+        # Checked by the worker once its generator exists; cancels a running build directly
+        self.cancel_requested = True
+        compiler = self.compiler
+        if compiler is not None:
+            compiler.cancel()
+
+    def __del__(self):
+        if self.upload_pool is not None:
+            self.upload_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_app():
+    root = tk.Tk()
+    app = RapportGeneratorApp(root)
+    root.mainloop()
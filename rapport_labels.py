@@ -0,0 +1,55 @@
+import functools
+import unicodedata
+
+# Category-like text (dossier types, results, intervenants, causes, delays) repeats
+# the same few labels on every bordereaux row. Each distinct label is stored once in
+# the labels table and rows refer to it by id; normalizing a label is memoized, so
+# it happens once per process rather than once per cell.
+LABEL_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=LABEL_CACHE_SIZE, typed=True)
+def normalize_text(value):
+    # Same result as normalize_series for one cell; typed, so 1 and 1.0 stay "1" and "1.0"
+    if value is None:
+        return ""
+    return unicodedata.normalize("NFKC", str(value).strip())
+
+
+def id_column(column):
+    return f"{column}_id"
+
+
+class LabelIds:
+    # Label -> id for one transaction. Ids inserted here are rolled back with it,
+    # so instances are not kept across transactions.
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.ids = {}
+
+    def label_id(self, label):
+        # Missing cells ("") are stored as NULL
+        if not label:
+            return None
+        label_id = self.ids.get(label)
+        if label_id is None:
+            self.cursor.execute("INSERT OR IGNORE INTO labels (label) VALUES (?)", (label,))
+            label_id = self.cursor.execute("SELECT label_id FROM labels WHERE label = ?", (label,)).fetchone()[0]
+            self.ids[label] = label_id
+        return label_id
+
+    def encode(self, frame, columns):
+        import numpy as np
+        import pandas as pd
+
+        # Categorical text columns -> "<column>_id" columns in their place, one lookup per category
+        encoded = {}
+        for name, values in frame.items():
+            if name not in columns:
+                encoded[name] = values
+                continue
+            values = values.astype("category")
+            # Code -1 (missing) picks the trailing None
+            ids = np.array([*map(self.label_id, values.cat.categories), None], dtype=object)
+            encoded[id_column(name)] = pd.Series(ids[values.cat.codes.to_numpy()], index=frame.index, dtype=object)
+        return pd.DataFrame(encoded)
@@ -0,0 +1,240 @@
+import math
+from html import escape
+from string import Template
+
+from rapport_render import (
+    ARABIC_MONTHS, AUTH_CONFORM_CATEGORIES, INTERVENTION_LABELS, SECTIONS, TECH_CONTROL_CATEGORIES, meeting_date
+)
+
+# Draft of the report as a single HTML page: same sections, tables and charts as
+# render_report, laid out right to left by the browser instead of XeLaTeX. Tables
+# keep the LaTeX column order; under dir="rtl" the first column is the rightmost,
+# as bidi typesets it in the PDF.
+PAGE = Template("""<!DOCTYPE html>
+<html lang="ar" dir="rtl">
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+body { font-family: Arial, "Noto Naskh Arabic", sans-serif; max-width: 52em; margin: 2em auto; line-height: 1.5; }
+.draft { background: #fff3cd; border: 1px solid #e0c36c; padding: .4em .8em; font-size: .9em; }
+.cover { text-align: center; font-weight: bold; margin: 2em 0; }
+table { border-collapse: collapse; width: 100%; margin: .8em 0 1.4em; }
+th, td { border-top: 1px solid #999; border-bottom: 1px solid #999; padding: .3em .6em; text-align: right; }
+th { border-bottom: 2px solid #333; }
+.num { direction: ltr; unicode-bidi: isolate; }
+.note { font-size: .8em; }
+.chart { display: flex; align-items: center; gap: 1.5em; }
+.chart ul { list-style: none; padding: 0; }
+.chart li span { display: inline-block; width: .9em; height: .9em; margin-left: .4em; }
+</style>
+</head>
+<body>
+<p class="draft">مسودة للمعاينة فقط — $generated</p>
+$body
+</body>
+</html>
+""")
+CHART_COLORS = ["#4e79a7", "#f28e2b", "#59a14f", "#e15759", "#76b7b2"]
+NOTES = [
+    "* آجال التدخل مرتبط بالمواعيد التي يحددها الحريف بالتنسيق مع مصالح الديوانة التونسية",
+    "** آجال التدخل مرتبط بالمواعيد التي يحددها الحريف حسب جاهزيته",
+]
+
+
+def num(value):
+    return f'<span class="num">{escape(value)}</span>'
+
+
+def dinar(value):
+    return f"د.ت {num(f'{value:,}')}"
+
+
+def table(headers, rows):
+    # Cells are HTML already; plain text goes through escape() first
+    head = "".join(f"<th>{header}</th>" for header in headers)
+    body = "".join("<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>\n" for row in rows)
+    return f"<table>\n<thead><tr>{head}</tr></thead>\n<tbody>\n{body}</tbody>\n</table>\n"
+
+
+def section(title, *parts):
+    return f"<section>\n<h2>{escape(title)}</h2>\n" + "".join(parts) + "</section>\n"
+
+
+def subsection(title, *parts):
+    return f"<h3>{escape(title)}</h3>\n" + "".join(parts)
+
+
+def preview_cover(data, year, month):
+    lines = [
+        "من إدارة الموارد", "إدارة المصادقة والمواصفات", "التقرير الشهري", "إدارة المصادقة والمواصفات",
+        str(year), ARABIC_MONTHS[month - 1], "شهر", "الإدارة العامة", "وحدة مراقبة التصرف إدارة التعاون والتسويق",
+    ]
+    return '<div class="cover">\n' + "<br>\n".join(escape(line) for line in lines) + "\n</div>\n"
+
+
+def preview_organization(data, year, month):
+    return section("I. الهيكل التنظيمي", '<p dir="ltr">[Organizational chart placeholder]</p>\n')
+
+
+def preview_production(data, year, month):
+    revenue_headers = ["قيمة المداخيل (د.ت خال من الأداء على القيمة المصافة)", "نوعية المداخيل"]
+    revenue_kind = "مداخيل عمليات المصادقة والمطابقة والمراقبة الفنية"
+    files_headers = ["عدد الملفات", "نوعية الملفات"]
+    files_kind = "ملفات عمليات المصادقة والمطابقة والمراقبة الفنية"
+    times = [
+        (num(f"{pt[3]:.0f}"), num(f"{pt[2]:.0f}"), num(f"{pt[1]:.0f}"), escape(pt[0]))
+        for pt in data.processing_times
+    ]
+    return section(
+        "II. مؤشرات الإنتاج",
+        subsection("1. المداخيل الجملية لإدارة المصادقة والمواصفات للشهر الحالي",
+                   table(revenue_headers, [(dinar(data.total_revenue.month), revenue_kind)])),
+        subsection("2. المداخيل الجملية لإدارة المصادقة والمواصفات منذ بداية السنة",
+                   table(revenue_headers, [(dinar(data.total_revenue.year_to_date), revenue_kind)])),
+        subsection("3. العدد الجملي للملفات المنجزة من طرف إدارة المصادقة والمواصفات خلال الشهر الحالي",
+                   table(files_headers, [(num(f"{data.total_files.month:,}"), files_kind)])),
+        subsection("4. العدد الجملي للملفات المنجزة من طرف إدارة المصادقة والمواصفات منذ بداية السنة",
+                   table(files_headers, [(num(f"{data.total_files.year_to_date:,}"), files_kind)])),
+        subsection("5. معدل أجال دراسة الملفات",
+                   table(["بعد الأجال (%)", "قبل الأجال (%)", "في الأجال (%)", "النشاط"], times),
+                   '<p class="note">' + "<br>".join(escape(note) for note in NOTES) + "</p>\n"),
+    )
+
+
+def preview_objectives(data, year, month):
+    rows = [
+        (num(f"{row.target_percentage:.1f}%"), dinar(row.year_to_date), dinar(row.target_value), escape(row.category))
+        for row in data.revenue_rows
+    ]
+    total = data.revenue_target
+    rows.append((num(f"{total.target_percentage:.1f}%"), dinar(total.year_to_date), dinar(total.target_value), "المجموع"))
+    return section(
+        "III. الأهداف",
+        subsection("1. على مستوى المداخيل", table(
+            ["النسبة المئوية", "قيمة المداخيل المنجزة (د.ت)", "قيمة المداخيل المتوقعة (د.ت)", "الأهداف ومتابعتها"], rows
+        )),
+        subsection("2. مؤشرات الإنتاج", table(
+            ["الأجال", "النشاط"], [("5 أيام", "المصادقة"), ("48 ساعة", "المراقبة الفنية"), ("5 أيام", "المطابقة")]
+        )),
+    )
+
+
+def revenue_dashboard(title, dashboard, total):
+    rows = [(num(f"{d[2]:.1f}%"), dinar(d[1]), escape(d[0])) for d in dashboard]
+    rows.append((num("100.0%"), dinar(total), "المجموع"))
+    return section(title, table(["% من المداخيل الجملية", "قيمة المداخيل (د.ت)", "نوعية المداخيل"], rows))
+
+
+def preview_dashboard_current(data, year, month):
+    return revenue_dashboard("IV. لوحة قيادة لمداخيل الشهر الحالي", data.dashboard_current, data.total_revenue.month)
+
+
+def preview_dashboard_year(data, year, month):
+    return revenue_dashboard("V. لوحة قيادة للمداخيل منذ بداية السنة", data.dashboard_year, data.total_revenue.year_to_date)
+
+
+def operation_rows(operations, categories):
+    selected = [op for op in operations if op[0] in categories]
+    rows = [(num(f"{op[2]:.1f}%"), num(f"{op[1]:,}"), escape(op[0])) for op in selected]
+    rows.append((num("100.0%"), num(f"{sum(op[1] for op in selected):,}"), "المجموع"))
+    return rows
+
+
+def operations_dashboard(title, operations):
+    headers = ["النسبة المئوية", "عدد الملفات", "نوعية الملفات"]
+    return section(
+        title,
+        subsection("1. عمليات المصادقة والمطابقة", table(headers, operation_rows(operations, AUTH_CONFORM_CATEGORIES))),
+        subsection("2. عمليات المراقبة الفنية", table(headers, operation_rows(operations, TECH_CONTROL_CATEGORIES))),
+    )
+
+
+def preview_operations_current(data, year, month):
+    return operations_dashboard("VI. لوحة قيادة لعدد العمليات المنجزة خلال الشهر الحالي", data.operations_current)
+
+
+def preview_operations_year(data, year, month):
+    return operations_dashboard("VII. لوحة قيادة لعدد العمليات المنجزة منذ بداية السنة", data.operations_year)
+
+
+def pie_chart(slices, radius=70):
+    # slices: (share out of 100, label); an SVG pie with a legend, like pgf-pie's text=legend
+    paths = []
+    angle = -math.pi / 2
+    for n, (share, _) in enumerate(slices):
+        color = CHART_COLORS[n % len(CHART_COLORS)]
+        if share >= 100:
+            paths.append(f'<circle cx="0" cy="0" r="{radius}" fill="{color}"/>')
+            continue
+        end = angle + 2 * math.pi * share / 100
+        large = 1 if share > 50 else 0
+        x1, y1 = radius * math.cos(angle), radius * math.sin(angle)
+        x2, y2 = radius * math.cos(end), radius * math.sin(end)
+        paths.append(
+            f'<path d="M0,0 L{x1:.2f},{y1:.2f} A{radius},{radius} 0 {large} 1 {x2:.2f},{y2:.2f} Z" fill="{color}"/>'
+        )
+        angle = end
+    legend = "".join(
+        f'<li><span style="background:{CHART_COLORS[n % len(CHART_COLORS)]}"></span>'
+        f'{escape(label)} ({num(f"{share:.0f}%")})</li>'
+        for n, (share, label) in enumerate(slices)
+    )
+    size = 2 * radius + 4
+    return (
+        f'<div class="chart"><svg width="{size}" height="{size}" viewBox="{-size / 2} {-size / 2} {size} {size}">'
+        + "".join(paths) + f"</svg><ul>{legend}</ul></div>\n"
+    )
+
+
+def preview_statistics(data, year, month):
+    reasons = {row[0]: row[1:] for row in data.intervention_reasons}
+    parts = []
+    for number, (category, _, incomplete) in enumerate(data.completion_stats, 1):
+        slices = [(share, label) for share, label in zip(reasons.get(category, ()), INTERVENTION_LABELS) if share]
+        parts.append(subsection(
+            f"{number}. إحصائيات معالجة ملفات {category}",
+            f"<p>{num(f'{incomplete:.0f}%')} من الملفات استوجبت بطاقات تدخل (RI) "
+            "ويوضح الرسم البياني مختلف النقائص التي حالت دون إتمام غلق الملف:</p>\n",
+            pie_chart(slices) if slices else "",
+        ))
+    return section("VIII. إحصائيات معالجة الملفات", *parts)
+
+
+def preview_agents(data, year, month):
+    rows = [(escape(agent[0]), num(f"{agent[1]:,}"), num(f"{agent[2]:,}")) for agent in data.agent_productivity]
+    return section("IX. إنتاجية الأعوان", table(["اسم العون", "ملفات المصادقة والمطابقة", "ملفات المراقبة الفنية"], rows))
+
+
+def preview_resources(data, year, month):
+    rows = [(num("15"), "المصادقة والمراقبة الفنية"), (num("19"), "المجموع باعتبار المسؤولين والكتابة")]
+    return section("X. الموارد البشرية", table(["عدد الأعوان", "نوع النشاط"], rows))
+
+
+def preview_meetings(data, year, month):
+    return section(
+        "XI. الاجتماعات والأنشطة المختلفة", f"<ul><li>اجتماع داخلي يوم {escape(meeting_date(year, month))}</li></ul>\n"
+    )
+
+
+PREVIEW_SECTIONS = {
+    "cover": preview_cover,
+    "organization": preview_organization,
+    "production": preview_production,
+    "objectives": preview_objectives,
+    "dashboard_current": preview_dashboard_current,
+    "dashboard_year": preview_dashboard_year,
+    "operations_current": preview_operations_current,
+    "operations_year": preview_operations_year,
+    "statistics": preview_statistics,
+    "agents": preview_agents,
+    "resources": preview_resources,
+    "meetings": preview_meetings,
+}
+
+
+def render_preview(data, year, month, generated=""):
+    # In the order of the LaTeX SECTIONS, so both outputs list the same sections
+    body = "".join(PREVIEW_SECTIONS[name](data, year, month) for name, _ in SECTIONS)
+    title = f"التقرير الشهري {ARABIC_MONTHS[month - 1]} {year}"
+    return PAGE.substitute(title=escape(title), generated=escape(generated), body=body)
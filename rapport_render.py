@@ -0,0 +1,469 @@
+import calendar
+import hashlib
+import functools
+from collections import namedtuple
+from string import Template
+
+from rapport_labels import LABEL_CACHE_SIZE
+
+ARABIC_MONTHS = [
+    "جانفي", "فيفري", "مارس", "أفريل", "ماي", "جوان",
+    "جويلية", "أوت", "سبتمبر", "أكتوبر", "نوفمبر", "ديسمبر"
+]
+
+# Report preamble. Everything before \endofdump is precompiled into a XeLaTeX
+# format (mylatexformat); fonts, polyglossia and bidi cannot be dumped by XeTeX
+# and are loaded on every run. \csname keeps the file compilable without the format.
+LATEX_PREAMBLE_STATIC = r"""\documentclass[a4paper,12pt]{article}
+\usepackage{geometry}
+\geometry{a4paper, margin=1in}
+\usepackage{booktabs}
+\usepackage{array}
+\usepackage{longtable}
+\usepackage{graphicx}
+\usepackage{enumitem}
+\usepackage{tocloft}
+\usepackage{xcolor}
+\usepackage{amsmath}
+"""
+LATEX_PREAMBLE_RUNTIME = r"""\usepackage{polyglossia}
+\setmainlanguage{arabic}
+\setotherlanguage{english}
+\newfontfamily\arabicfont[Script=Arabic]{Arial}
+\usepackage{bidi}
+
+% Define the \dinar command
+\newcommand{\dinar}[1]{\text{د.ت} #1}
+"""
+LATEX_PREAMBLE = LATEX_PREAMBLE_STATIC + "\\csname endofdump\\endcsname\n" + LATEX_PREAMBLE_RUNTIME
+
+# Charts are typeset once as standalone PDFs, named by a hash of their source,
+# and the report only includes them from CHARTS_DIR
+CHARTS_DIR = "charts"
+CHART_PREAMBLE = r"""\documentclass[tikz, border=2pt]{standalone}
+\usepackage{pgf-pie}
+\usepackage{amsmath}
+""" + LATEX_PREAMBLE_RUNTIME
+CHART_INCLUDE = Template(r"""\includegraphics{$path}
+""")
+
+# Everything the report needs, fetched before rendering starts. Totals are the
+# report month and year to date; objectives pair the realized year to date with
+# the upload's targets (revenue_target is the all-categories row).
+Totals = namedtuple("Totals", ["month", "year_to_date"])
+Objective = namedtuple("Objective", ["category", "year_to_date", "target_percentage", "target_value"])
+ReportData = namedtuple("ReportData", [
+    "total_revenue", "total_files", "revenue_target", "dashboard_current", "dashboard_year",
+    "operations_current", "operations_year", "processing_times",
+    "completion_stats", "intervention_reasons", "agent_productivity", "revenue_rows",
+])
+
+AUTH_CONFORM_CATEGORIES = ["ملفات عمليات المصادقة", "المصادقة لفائدة الحرفاء الأجانب", "عمليات المطابقة"]
+TECH_CONTROL_CATEGORIES = ["المراقبة الفنية", "المراقبة الفنية تحت الديوانة"]
+
+LATEX_ESCAPES = str.maketrans({
+    "&": "\\&", "%": "\\%", "$": "\\$", "#": "\\#", "_": "\\_",
+    "{": "\\{", "}": "\\}", "~": "\\textasciitilde{}", "^": "\\textasciicircum{}",
+    "\\": "\\textbackslash{}", ",": "{,}"
+})
+
+
+# The same category and agent labels are escaped in every report
+@functools.lru_cache(maxsize=LABEL_CACHE_SIZE, typed=True)
+def escape_latex(text):
+    if not text:
+        return ""
+    # Single pass, so replacements are never escaped a second time
+    return str(text).translate(LATEX_ESCAPES)
+
+
+# Section templates. Sections are joined with a blank line; $rows placeholders
+# receive pre-rendered table rows (each ending in a newline).
+COVER = Template(r"""\begin{center}
+\textbf{من إدارة الموارد} \\
+\textbf{إدارة المصادقة والمواصفات} \\
+\textbf{التقرير الشهري} \\
+\textbf{إدارة المصادقة والمواصفات} \\
+\textbf{$year} \\
+\textbf{$month_name} \\
+\textbf{شهر} \\
+\textbf{الإدارة العامة} \\
+\textbf{وحدة مراقبة التصرف إدارة التعاون والتسويق}
+\end{center}
+
+\tableofcontents
+\newpage
+""")
+
+ORGANIZATION = Template(r"""\section*{I. الهيكل التنظيمي}
+\begin{center}
+\textenglish{[Organizational chart placeholder]}
+\end{center}
+""")
+
+PRODUCTION = Template(r"""\section*{II. مؤشرات الإنتاج}
+
+\subsection*{1. المداخيل الجملية لإدارة المصادقة والمواصفات للشهر الحالي}
+\begin{longtable}{p{7cm}p{5cm}}
+\toprule
+\textbf{قيمة المداخيل (د.ت خال من الأداء على القيمة المصافة)} & \textbf{نوعية المداخيل} \\
+\midrule
+\dinar{$month_revenue} & مداخيل عمليات المصادقة والمطابقة والمراقبة الفنية \\
+
+\bottomrule
+\end{longtable}
+
+\subsection*{2. المداخيل الجملية لإدارة المصادقة والمواصفات منذ بداية السنة}
+\begin{longtable}{p{7cm}p{5cm}}
+\toprule
+\textbf{قيمة المداخيل (د.ت خال من الأداء على القيمة المصافة)} & \textbf{نوعية المداخيل} \\
+\midrule
+\dinar{$year_revenue} & مداخيل عمليات المصادقة والمطابقة والمراقبة الفنية \\
+
+\bottomrule
+\end{longtable}
+
+\subsection*{3. العدد الجملي للملفات المنجزة من طرف إدارة المصادقة والمواصفات خلال الشهر الحالي}
+\begin{longtable}{p{5cm}p{7cm}}
+\toprule
+\textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
+\midrule
+$month_files & ملفات عمليات المصادقة والمطابقة والمراقبة الفنية \\
+
+\bottomrule
+\end{longtable}
+
+\subsection*{4. العدد الجملي للملفات المنجزة من طرف إدارة المصادقة والمواصفات منذ بداية السنة}
+\begin{longtable}{p{5cm}p{7cm}}
+\toprule
+\textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
+\midrule
+$year_files & ملفات عمليات المصادقة والمطابقة والمراقبة الفنية \\
+
+\bottomrule
+\end{longtable}
+
+\subsection*{5. معدل أجال دراسة الملفات}
+\begin{longtable}{p{3cm}p{3cm}p{3cm}p{5cm}}
+\toprule
+\textbf{بعد الأجال (\%)} & \textbf{قبل الأجال (\%)} & \textbf{في الأجال (\%)} & \textbf{النشاط} \\
+\midrule
+$rows
+\bottomrule
+\end{longtable}
+{\footnotesize * آجال التدخل مرتبط بالمواعيد التي يحددها الحريف بالتنسيق مع مصالح الديوانة التونسية \\
+** آجال التدخل مرتبط بالمواعيد التي يحددها الحريف حسب جاهزيته}
+""")
+
+OBJECTIVES = Template(r"""\section*{III. الأهداف}
+
+\subsection*{1. على مستوى المداخيل}
+\begin{longtable}{p{3cm}p{4cm}p{4cm}p{4cm}}
+\toprule
+\textbf{النسبة المئوية} & \textbf{قيمة المداخيل المنجزة (د.ت)} & \textbf{قيمة المداخيل المتوقعة (د.ت)} & \textbf{الأهداف ومتابعتها} \\
+\midrule
+$rows
+\bottomrule
+\end{longtable}
+
+\subsection*{2. مؤشرات الإنتاج}
+\begin{longtable}{p{5cm}p{7cm}}
+\toprule
+\textbf{الأجال} & \textbf{النشاط} \\
+\midrule
+5 أيام & المصادقة \\
+48 ساعة & المراقبة الفنية \\
+5 أيام & المطابقة \\
+\bottomrule
+\end{longtable}
+""")
+
+REVENUE_DASHBOARD = Template(r"""\section*{$title}
+\begin{longtable}{p{3cm}p{4cm}p{5cm}}
+\toprule
+\textbf{\% من المداخيل الجملية} & \textbf{قيمة المداخيل (د.ت)} & \textbf{نوعية المداخيل} \\
+\midrule
+$rows
+\bottomrule
+\end{longtable}
+""")
+
+OPERATIONS_DASHBOARD = Template(r"""\section*{$title}
+
+\subsection*{1. عمليات المصادقة والمطابقة}
+\begin{longtable}{p{3cm}p{3cm}p{6cm}}
+\toprule
+\textbf{النسبة المئوية} & \textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
+\midrule
+$auth_conform_rows
+\bottomrule
+\end{longtable}
+
+\subsection*{2. عمليات المراقبة الفنية}
+\begin{longtable}{p{3cm}p{3cm}p{6cm}}
+\toprule
+\textbf{النسبة المئوية} & \textbf{عدد الملفات} & \textbf{نوعية الملفات} \\
+\midrule
+$tech_control_rows
+\bottomrule
+\end{longtable}
+""")
+
+STATISTICS = r"""\section*{VIII. إحصائيات معالجة الملفات}
+"""
+
+STATISTICS_CATEGORY = Template(r"""\subsection*{$number. إحصائيات معالجة ملفات $category}
+$incomplete\% من الملفات استوجبت بطاقات تدخل (RI) ويوضح الرسم البياني مختلف النقائص التي حالت دون إتمام غلق الملف:
+$chart""")
+
+INTERVENTION_CHART = Template(r"""\begin{tikzpicture}
+\begin{scope}
+\pie[radius=1.5, sum=100, text=legend]{$slices}
+\end{scope}
+\end{tikzpicture}
+""")
+
+INTERVENTION_LABELS = [
+    "نقص وثائق خصائص فنية",
+    "تشغيل الجهاز أو نقص لبعض المكملات",
+    "أسباب مختلفة",
+]
+
+AGENTS = Template(r"""\section*{IX. إنتاجية الأعوان}
+\begin{longtable}{p{5cm}p{4cm}p{4cm}}
+\toprule
+\textbf{اسم العون} & \textbf{ملفات المصادقة والمطابقة} & \textbf{ملفات المراقبة الفنية} \\
+\midrule
+$rows
+\bottomrule
+\end{longtable}
+""")
+
+RESOURCES = Template(r"""\section*{X. الموارد البشرية}
+\begin{longtable}{p{5cm}p{7cm}}
+\toprule
+\textbf{عدد الأعوان} & \textbf{نوع النشاط} \\
+\midrule
+15 & المصادقة والمراقبة الفنية \\
+19 & المجموع باعتبار المسؤولين والكتابة \\
+\bottomrule
+\end{longtable}
+""")
+
+MEETINGS = Template(r"""\section*{XI. الاجتماعات والأنشطة المختلفة}
+\begin{itemize}
+\item اجتماع داخلي يوم $meeting_date
+\end{itemize}
+""")
+
+
+def render_cover(data, year, month):
+    return COVER.substitute(year=year, month_name=ARABIC_MONTHS[month - 1])
+
+
+def render_organization(data, year, month):
+    return ORGANIZATION.template
+
+
+def render_production(data, year, month):
+    rows = [
+        f"{pt[3]:.0f} & {pt[2]:.0f} & {pt[1]:.0f} & {escape_latex(pt[0])} \\\\\n"
+        for pt in data.processing_times
+    ]
+    return PRODUCTION.substitute(
+        month_revenue=f"{data.total_revenue.month:,}",
+        year_revenue=f"{data.total_revenue.year_to_date:,}",
+        month_files=f"{data.total_files.month:,}",
+        year_files=f"{data.total_files.year_to_date:,}",
+        rows="".join(rows),
+    )
+
+
+def render_objectives(data, year, month):
+    rows = [
+        f"{row.target_percentage:.1f}\\% & \\dinar{{{row.year_to_date:,}}} & \\dinar{{{row.target_value:,}}} & "
+        f"{escape_latex(row.category)} \\\\\n"
+        for row in data.revenue_rows
+    ]
+    total = data.revenue_target
+    rows.append(
+        f"{total.target_percentage:.1f}\\% & \\dinar{{{total.year_to_date:,}}} & \\dinar{{{total.target_value:,}}} & "
+        "المجموع \\\\\n"
+    )
+    return OBJECTIVES.substitute(rows="".join(rows))
+
+
+def revenue_dashboard(title, dashboard, total):
+    rows = [f"{d[2]:.1f}\\% & \\dinar{{{d[1]:,}}} & {escape_latex(d[0])} \\\\\n" for d in dashboard]
+    rows.append(f"100.0\\% & \\dinar{{{total:,}}} & المجموع \\\\\n")
+    return REVENUE_DASHBOARD.substitute(title=title, rows="".join(rows))
+
+
+def render_dashboard_current(data, year, month):
+    return revenue_dashboard("IV. لوحة قيادة لمداخيل الشهر الحالي", data.dashboard_current, data.total_revenue.month)
+
+
+def render_dashboard_year(data, year, month):
+    return revenue_dashboard("V. لوحة قيادة للمداخيل منذ بداية السنة", data.dashboard_year, data.total_revenue.year_to_date)
+
+
+def operation_rows(operations, categories):
+    selected = [op for op in operations if op[0] in categories]
+    rows = [f"{op[2]:.1f}\\% & {op[1]:,} & {escape_latex(op[0])} \\\\\n" for op in selected]
+    rows.append(f"100.0\\% & {sum(op[1] for op in selected):,} & المجموع \\\\\n")
+    return "".join(rows)
+
+
+def operations_dashboard(title, operations):
+    return OPERATIONS_DASHBOARD.substitute(
+        title=title,
+        auth_conform_rows=operation_rows(operations, AUTH_CONFORM_CATEGORIES),
+        tech_control_rows=operation_rows(operations, TECH_CONTROL_CATEGORIES),
+    )
+
+
+def render_operations_current(data, year, month):
+    return operations_dashboard("VI. لوحة قيادة لعدد العمليات المنجزة خلال الشهر الحالي", data.operations_current)
+
+
+def render_operations_year(data, year, month):
+    return operations_dashboard("VII. لوحة قيادة لعدد العمليات المنجزة منذ بداية السنة", data.operations_year)
+
+
+def chart_document(body):
+    return CHART_PREAMBLE + "\\begin{document}\n" + body + "\\end{document}\n"
+
+
+def chart_name(document):
+    return "chart-" + hashlib.sha256(document.encode("utf-8")).hexdigest()[:16]
+
+
+def intervention_charts(data):
+    # (category, incomplete share, chart document or None) for each completion row
+    reasons = {row[0]: row[1:] for row in data.intervention_reasons}
+    for category, _, incomplete in data.completion_stats:
+        slices = [
+            f"{share:.0f}/\\text{{{label}}}"
+            for share, label in zip(reasons.get(category, ()), INTERVENTION_LABELS)
+            if share
+        ]
+        document = chart_document(INTERVENTION_CHART.substitute(slices=", ".join(slices))) if slices else None
+        yield category, incomplete, document
+
+
+def report_charts(data):
+    # Chart documents the report includes, by file name (without .pdf)
+    return {chart_name(document): document for _, _, document in intervention_charts(data) if document}
+
+
+def render_statistics(data, year, month):
+    parts = [STATISTICS]
+    for number, (category, incomplete, document) in enumerate(intervention_charts(data), 1):
+        chart = CHART_INCLUDE.substitute(path=f"{CHARTS_DIR}/{chart_name(document)}") if document else ""
+        parts.append(STATISTICS_CATEGORY.substitute(
+            number=number, category=escape_latex(category), incomplete=f"{incomplete:.0f}", chart=chart
+        ))
+    return "\n".join(parts)
+
+
+def render_agents(data, year, month):
+    rows = [
+        f"{escape_latex(agent[0])} & {agent[1]:,} & {agent[2]:,} \\\\\n"
+        for agent in data.agent_productivity
+    ]
+    return AGENTS.substitute(rows="".join(rows))
+
+
+def render_resources(data, year, month):
+    return RESOURCES.template
+
+
+def meeting_date(year, month):
+    day = min(30, calendar.monthrange(year, month)[1])
+    return f"{day} {ARABIC_MONTHS[month - 1]} {year}"
+
+
+def render_meetings(data, year, month):
+    return MEETINGS.substitute(meeting_date=meeting_date(year, month))
+
+
+SECTIONS = [
+    ("cover", render_cover),
+    ("organization", render_organization),
+    ("production", render_production),
+    ("objectives", render_objectives),
+    ("dashboard_current", render_dashboard_current),
+    ("dashboard_year", render_dashboard_year),
+    ("operations_current", render_operations_current),
+    ("operations_year", render_operations_year),
+    ("statistics", render_statistics),
+    ("agents", render_agents),
+    ("resources", render_resources),
+    ("meetings", render_meetings),
+]
+# Table -> section dependency graph: the tables each section reads, through the
+# ReportData fields below. Sections without tables depend on the period only.
+SECTION_TABLES = {
+    "cover": (),
+    "organization": (),
+    "production": ("monthly_totals", "processing_times"),
+    "objectives": ("revenues", "monthly_facts", "monthly_totals"),
+    "dashboard_current": ("dashboard_current_month", "monthly_totals"),
+    "dashboard_year": ("dashboard_year_to_date", "monthly_totals"),
+    "operations_current": ("operations_current_month",),
+    "operations_year": ("operations_year_to_date",),
+    "statistics": ("completion_stats", "intervention_reasons"),
+    "agents": ("agent_productivity",),
+    "resources": (),
+    "meetings": (),
+}
+DATA_TABLES = {
+    "total_revenue": "monthly_totals",
+    "total_files": "monthly_totals",
+    "revenue_target": "revenues",
+    "dashboard_current": "dashboard_current_month",
+    "dashboard_year": "dashboard_year_to_date",
+    "operations_current": "operations_current_month",
+    "operations_year": "operations_year_to_date",
+    "processing_times": "processing_times",
+    "completion_stats": "completion_stats",
+    "intervention_reasons": "intervention_reasons",
+    "agent_productivity": "agent_productivity",
+    "revenue_rows": "monthly_facts",
+}
+# Bump when a section template or renderer changes, so existing fragments are redone
+FRAGMENT_VERSION = 2
+
+# Sections are written to SECTIONS_DIR and pulled into the main document with \input
+SECTIONS_DIR = "sections"
+SECTION_INPUT = Template(r"""\input{$path}
+""")
+DOCUMENT_HEAD = "\n" + LATEX_PREAMBLE + "\n\\begin{document}\n"
+DOCUMENT_TAIL = "\\end{document}\n"
+
+
+def sections_for_tables(tables):
+    tables = set(tables)
+    return [name for name, _ in SECTIONS if tables & set(SECTION_TABLES[name])]
+
+
+def table_fingerprints(data):
+    # Digest of the report data read from each table
+    values = {}
+    for field in ReportData._fields:
+        values.setdefault(DATA_TABLES[field], []).append((field, getattr(data, field)))
+    return {table: hashlib.sha256(repr(rows).encode("utf-8")).hexdigest() for table, rows in values.items()}
+
+
+def render_main():
+    parts = [DOCUMENT_HEAD]
+    parts.extend(SECTION_INPUT.substitute(path=f"{SECTIONS_DIR}/{name}") for name, _ in SECTIONS)
+    parts.append(DOCUMENT_TAIL)
+    return "\n".join(parts)
+
+
+def render_report(data, year, month):
+    parts = [DOCUMENT_HEAD]
+    parts.extend(render(data, year, month) for _, render in SECTIONS)
+    parts.append(DOCUMENT_TAIL)
+    return "\n".join(parts)
@@ -0,0 +1,401 @@
+import os
+import re
+import sys
+import json
+import time
+import signal
+import asyncio
+import hashlib
+import tempfile
+from urllib.parse import parse_qs, urlsplit
+
+from rapport_analytics import QUERIES, ReportAnalytics, open_database
+from rapport_compile import CompilePool
+from rapport_generator import FILE_TYPES, JOB_TIMEOUT, RapportError, RapportValidationError, parse_period
+from rapport_validate import check_workbooks
+
+# HTTP/1.1 over asyncio streams, one request per connection:
+#   PUT  /uploads           raw .xlsx body -> {"upload": sha256}
+#   POST /jobs              {"period", "chiffre", "productivity", "bordereaux"} (upload ids) -> job
+#   GET  /jobs/<id>         job status
+#   GET  /jobs/<id>/pdf     the report, once the job is done
+#   GET  /status            queue, worker and build latency figures
+#   GET  /query/<name>      month-over-month aggregates of the --db database (?from=YYYY-MM&to=YYYY-MM)
+MAX_UPLOAD_BYTES = 64 * 1024 * 1024
+MAX_JSON_BYTES = 64 * 1024
+MAX_HEADERS = 100
+CHUNK_SIZE = 64 * 1024
+RETRY_AFTER = 5
+UPLOAD_ID = re.compile(r"[0-9a-f]{64}")
+REASONS = {
+    200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 409: "Conflict", 411: "Length Required", 413: "Payload Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def log(message, error=False):
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}", file=sys.stderr if error else sys.stdout, flush=True)
+
+
+def job_key(period, uploads):
+    # Identical workbooks for the same period always map to the same job
+    raw = json.dumps({"period": period, **{file_type: uploads[file_type] for file_type in FILE_TYPES}}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed")
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    for _ in range(MAX_HEADERS):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HttpError(400, "Too many headers")
+    target = urlsplit(target)
+    return method.upper(), target.path, parse_qs(target.query), headers
+
+
+def content_length(headers, limit):
+    try:
+        length = int(headers["content-length"])
+    except KeyError:
+        raise HttpError(411, "Content-Length required")
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > limit:
+        raise HttpError(413, f"Body larger than {limit} bytes")
+    return length
+
+
+async def send_response(writer, status, body=b"", content_type="application/json", headers=None):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+             f"Content-Length: {len(body)}", "Connection: close"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def send_json(writer, status, payload, headers=None):
+    await send_response(writer, status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), headers=headers)
+
+
+class Job:
+    def __init__(self, key, period, paths, output_dir):
+        self.key = key
+        self.period = period
+        self.paths = paths
+        self.output_dir = output_dir
+        self.status = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.pdf = None
+
+    def spec(self):
+        return {**self.paths, "period": self.period, "output_dir": self.output_dir}
+
+    def describe(self):
+        info = {"job": self.key, "period": self.period, "status": self.status, "submitted": self.submitted}
+        if self.started:
+            info["started"] = self.started
+        if self.finished:
+            info["finished"] = self.finished
+            info["seconds"] = round(self.finished - self.submitted, 3)
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class ReportService:
+    # Uploads are stored by content hash; jobs are keyed by period and upload hashes, so
+    # resubmitting the same inputs returns the existing job instead of compiling again.
+    # At most `max_queue` jobs wait for one of `workers` build workers (see rapport_compile).
+    # With a database, /query answers from one ReportAnalytics, so repeated dashboard
+    # queries are served from its memoized results until the database changes.
+    def __init__(self, state_dir, workers=1, max_queue=16, timeout=JOB_TIMEOUT, memory_limit=None, db_path=None):
+        self.state_dir = os.path.abspath(state_dir)
+        self.uploads_dir = os.path.join(self.state_dir, "uploads")
+        self.jobs_dir = os.path.join(self.state_dir, "jobs")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.db_path = db_path
+        self.database = None
+        self.analytics = None
+        self.jobs = {}
+        self.running = 0
+        self.queue = None
+        self.pool = None
+        self.tasks = []
+
+    async def start(self, host, port):
+        if self.db_path:
+            self.database = open_database(self.db_path)
+            self.analytics = ReportAnalytics(self.database.storage)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.pool = CompilePool(self.workers, self.timeout, self.memory_limit)
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # Running builds finish; queued ones are dropped
+        await asyncio.get_running_loop().run_in_executor(None, lambda: self.pool.shutdown(cancel_pending=True))
+        if self.database is not None:
+            self.analytics.close()
+            self.database.close()
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            job.status = "running"
+            job.started = time.time()
+            self.running += 1
+            try:
+                result = await asyncio.wrap_future(self.pool.submit(job.spec()))
+            except Exception as e:
+                result = {"status": "error", "error": str(e)}
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+            job.finished = time.time()
+            if result["status"] == "ok":
+                job.status = "done"
+                job.pdf = result["pdf"]
+                with open(os.path.join(job.output_dir, "job.json"), "w", encoding="utf-8") as f:
+                    json.dump(job.describe(), f)
+                log(f"[ok] {job.key} {job.period} ({job.finished - job.started:.1f}s)")
+            else:
+                job.status = "error"
+                job.error = result["error"]
+                log(f"[error] {job.key} {job.period}: {job.error}", error=True)
+
+    def find_job(self, key):
+        job = self.jobs.get(key)
+        if job is not None:
+            return job
+        # Finished by an earlier run of the service
+        output_dir = os.path.join(self.jobs_dir, key)
+        try:
+            with open(os.path.join(output_dir, "job.json"), encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        job = Job(key, info["period"], {}, output_dir)
+        job.status = "done"
+        job.submitted, job.started, job.finished = info["submitted"], info.get("started"), info.get("finished")
+        job.pdf = os.path.join(output_dir, "rapport.pdf")
+        self.jobs[key] = job
+        return job
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, query, headers = await read_request(reader)
+            await self.route(method, path, query, headers, reader, writer)
+        except HttpError as e:
+            await send_json(writer, e.status, {"error": str(e)}, e.headers)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            log(f"[error] request failed: {e}", error=True)
+            try:
+                await send_json(writer, 500, {"error": "Internal error"})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, query, headers, reader, writer):
+        parts = [part for part in path.split("/") if part]
+        if parts == ["uploads"]:
+            if method not in ("PUT", "POST"):
+                raise HttpError(405, "Use PUT to upload a workbook")
+            await self.upload(headers, reader, writer)
+        elif parts == ["jobs"]:
+            if method != "POST":
+                raise HttpError(405, "Use POST to submit a job")
+            await self.submit(headers, reader, writer)
+        elif len(parts) in (2, 3) and parts[0] == "jobs" and parts[2:] in ([], ["pdf"]):
+            if method != "GET":
+                raise HttpError(405, "Use GET to read a job")
+            job = self.find_job(parts[1])
+            if job is None:
+                raise HttpError(404, f"Unknown job {parts[1]}")
+            if len(parts) == 2:
+                await send_json(writer, 200, job.describe())
+            else:
+                await self.send_pdf(job, writer)
+        elif parts == ["status"]:
+            if method != "GET":
+                raise HttpError(405, "Use GET to read the status")
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            status = {
+                "workers": self.workers, "running": self.running, "queued": self.queue.qsize(),
+                "max_queue": self.max_queue, "jobs": counts, "builds": self.pool.stats(),
+            }
+            if self.analytics is not None:
+                status["queries"] = {"hits": self.analytics.hits, "misses": self.analytics.misses}
+            await send_json(writer, 200, status)
+        elif len(parts) == 2 and parts[0] == "query":
+            if method != "GET":
+                raise HttpError(405, "Use GET to run a query")
+            await self.run_query(parts[1], query, writer)
+        else:
+            raise HttpError(404, f"No route for {path}")
+
+    async def upload(self, headers, reader, writer):
+        remaining = content_length(headers, MAX_UPLOAD_BYTES)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(prefix=".upload-", dir=self.uploads_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while remaining:
+                    chunk = await reader.readexactly(min(CHUNK_SIZE, remaining))
+                    digest.update(chunk)
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            key = digest.hexdigest()
+            os.replace(tmp_path, os.path.join(self.uploads_dir, f"{key}.xlsx"))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        await send_json(writer, 201, {"upload": key})
+
+    async def submit(self, headers, reader, writer):
+        body = await reader.readexactly(content_length(headers, MAX_JSON_BYTES))
+        try:
+            request = json.loads(body)
+            period = request["period"]
+            parse_period(period)
+            uploads = {file_type: request[file_type] for file_type in FILE_TYPES}
+        except (ValueError, KeyError, TypeError) as e:
+            raise HttpError(400, f"Expected period, chiffre, productivity and bordereaux: {e}")
+        except RapportError as e:
+            raise HttpError(400, str(e))
+        paths = {}
+        for file_type, upload in uploads.items():
+            path = os.path.join(self.uploads_dir, f"{upload}.xlsx")
+            if not isinstance(upload, str) or not UPLOAD_ID.fullmatch(upload) or not os.path.exists(path):
+                raise HttpError(400, f"Unknown upload for {file_type}: {upload}")
+            paths[file_type] = path
+
+        key = job_key(period, uploads)
+        job = self.find_job(key)
+        if job is not None and job.status != "error":
+            await send_json(writer, 200, {**job.describe(), "deduplicated": True})
+            return
+        # Registered before validation is awaited, so identical submissions arriving
+        # meanwhile are deduplicated against it instead of queueing a second build
+        job = Job(key, period, paths, os.path.join(self.jobs_dir, key))
+        job.status = "validating"
+        self.jobs[key] = job
+        # Malformed workbooks are refused here rather than failing the job once it runs
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, check_workbooks, paths)
+        except RapportValidationError as e:
+            job.status = "error"
+            job.error = str(e)
+            raise HttpError(400, str(e))
+        except BaseException:
+            # Unexpected failure or the client went away: a resubmission validates again
+            job.status = "error"
+            job.error = "Validation did not complete"
+            raise
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            job.status = "error"
+            job.error = "Job queue is full"
+            raise HttpError(503, "Job queue is full", {"Retry-After": RETRY_AFTER})
+        job.status = "queued"
+        await send_json(writer, 202, job.describe())
+
+    async def run_query(self, name, query, writer):
+        if self.analytics is None:
+            raise HttpError(404, "No report database is served (start with --db)")
+        if name not in QUERIES:
+            raise HttpError(404, f"Unknown query {name}, expected one of: {', '.join(QUERIES)}")
+        start, end = (query.get(bound, [None])[-1] for bound in ("from", "to"))
+        # SQLite reads block, so they run on the executor's threads (one connection each)
+        try:
+            rows = await asyncio.get_running_loop().run_in_executor(None, self.analytics.query, name, start, end)
+        except RapportError as e:
+            raise HttpError(400, str(e))
+        await send_json(writer, 200, {"query": name, "rows": [row._asdict() for row in rows]})
+
+    async def send_pdf(self, job, writer):
+        if job.status != "done":
+            raise HttpError(409, f"Job is {job.status}")
+        try:
+            f = open(job.pdf, "rb")
+        except OSError:
+            raise HttpError(404, "Report file is missing")
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            writer.write((
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/pdf\r\nContent-Length: {size}\r\n"
+                f"Content-Disposition: attachment; filename=\"rapport-{job.period}.pdf\"\r\nConnection: close\r\n\r\n"
+            ).encode("latin-1"))
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                writer.write(chunk)
+                await writer.drain()
+
+
+async def serve(state_dir, host, port, workers, max_queue, timeout=JOB_TIMEOUT, memory_limit=None, db_path=None):
+    service = ReportService(state_dir, workers, max_queue, timeout, memory_limit, db_path)
+    server = await service.start(host, port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C raises KeyboardInterrupt instead
+            pass
+    address = server.sockets[0].getsockname()
+    log(f"Serving reports on http://{address[0]}:{address[1]} (state in {service.state_dir})")
+    async with server:
+        await stop.wait()
+    log("Stopping; waiting for running jobs")
+    await service.close()
+
+
+def run_service(args):
+    try:
+        asyncio.run(serve(
+            args.state_dir, args.host, args.port, max(1, args.workers), max(1, args.max_queue),
+            args.timeout, args.memory_limit, args.db
+        ))
+    except KeyboardInterrupt:
+        pass
+    except RapportError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    return 0
@@ -0,0 +1,96 @@
+# Bordereaux dossier types, in report order
+DOSSIER_TYPE_CATEGORIES = {"H": "المصادقة", "C": "المطابقة"}
+# Intervention card causes; combined causes such as "DOC+MS" count towards each
+CAUSE_COLUMNS = {"DOC": "technical_docs", "MS": "device_operation"}
+OTHER_CAUSE_COLUMN = "other_reasons"
+# Technical control files are not listed in the bordereaux workbook (aligned with Word document)
+TECH_CONTROL_PROCESSING_TIMES = [
+    ("المراقبة الفنية", 14, 23, 63),
+    ("المراقبة الفنية تحت الديوانة", 10, 0, 90),
+    ("المراقبة الفنية لأجهزة الالتقاط الإذاعي لدى موردي السيارات", 0, 0, 100),
+]
+
+# Grouped on label ids from the covering bordereaux statistics index in a single
+# ordered pass; only the few resulting groups are joined to their labels
+STATISTICS_QUERY = """
+    SELECT t.label, r.label, d.label, c.label, g.count FROM (
+        SELECT dossier_type_id, result_id, delai_execution_id, cause_fi_id, COUNT(*) AS count
+        FROM bordereaux WHERE period = ?
+        GROUP BY dossier_type_id, result_id, delai_execution_id, cause_fi_id
+    ) g
+    LEFT JOIN labels t ON t.label_id = g.dossier_type_id
+    LEFT JOIN labels r ON r.label_id = g.result_id
+    LEFT JOIN labels d ON d.label_id = g.delai_execution_id
+    LEFT JOIN labels c ON c.label_id = g.cause_fi_id
+"""
+
+
+def percentages(counts):
+    # Whole percentages that add up to exactly 100 (largest remainder), for pie charts
+    total = sum(counts)
+    if not total:
+        return [0] * len(counts)
+    shares = [count * 100 / total for count in counts]
+    rounded = [int(share) for share in shares]
+    by_remainder = sorted(range(len(counts)), key=lambda i: rounded[i] - shares[i])
+    for i in by_remainder[:100 - sum(rounded)]:
+        rounded[i] += 1
+    return rounded
+
+
+def is_incomplete(result):
+    # Files closed with an intervention card (FI)
+    return (result or "").strip().upper() == "FI"
+
+
+def cause_columns(cause_fi):
+    # intervention_reasons column each cause of a card counts towards
+    causes = (cause_fi or "").upper().replace(" ", "").split("+")
+    return [CAUSE_COLUMNS.get(cause, OTHER_CAUSE_COLUMN) for cause in causes]
+
+
+def bordereaux_statistics(conn, period):
+    import pandas as pd
+
+    # Fold the few distinct (type, result, delay, cause) groups into per-type tallies;
+    # delays are "< 5", "5" or "> 5" days
+    processing = {}
+    causes = {}
+    for dossier_type, result, delay, cause_fi, count in conn.execute(STATISTICS_QUERY, (period,)):
+        dossier_type = (dossier_type or "").strip().upper()
+        tally = processing.setdefault(dossier_type, [0, 0, 0, 0])
+        tally[0] += count
+        delay = (delay or "").strip()
+        if delay.startswith("<"):
+            tally[2] += count
+        elif delay.startswith(">"):
+            tally[3] += count
+        if not is_incomplete(result):
+            continue
+        tally[1] += count
+        reasons = causes.setdefault(dossier_type, dict.fromkeys([*CAUSE_COLUMNS.values(), OTHER_CAUSE_COLUMN], 0))
+        for column in cause_columns(cause_fi):
+            reasons[column] += count
+
+    processing_times, completion_stats, intervention_reasons = [], [], []
+    for dossier_type, category in DOSSIER_TYPE_CATEGORIES.items():
+        if dossier_type not in processing:
+            continue
+        total, incomplete, before, after = processing[dossier_type]
+        before_time, after_time, on_time = percentages([before, after, total - before - after])
+        processing_times.append((category, on_time, before_time, after_time))
+        completion_stats.append((category, *percentages([total - incomplete, incomplete])))
+        reasons = causes.get(dossier_type)
+        if reasons:
+            intervention_reasons.append((category, *percentages(list(reasons.values()))))
+    processing_times.extend(TECH_CONTROL_PROCESSING_TIMES)
+
+    return {
+        "processing_times": pd.DataFrame(
+            processing_times, columns=["category", "on_time", "before_time", "after_time"]
+        ),
+        "completion_stats": pd.DataFrame(completion_stats, columns=["category", "complete", "incomplete"]),
+        "intervention_reasons": pd.DataFrame(
+            intervention_reasons, columns=["category", "technical_docs", "device_operation", "other_reasons"]
+        ),
+    }
@@ -0,0 +1,89 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from rapport_trace import Tracer
+
+# Applied to every new connection. WAL lets report builds read while an upload
+# writes; NORMAL sync is durable across application crashes in WAL mode.
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -32768",
+    "PRAGMA mmap_size = 268435456",
+]
+# Uploads may be ingested by several processes at once, so wait for the write lock
+BUSY_TIMEOUT = 60
+# Prepared statements are reused by SQL text; ingestion issues a few dozen distinct ones
+CACHED_STATEMENTS = 256
+
+
+def connect(db_path):
+    # Autocommit mode: transactions are opened explicitly by Storage
+    conn = sqlite3.connect(
+        db_path, timeout=BUSY_TIMEOUT, isolation_level=None,
+        check_same_thread=False, cached_statements=CACHED_STATEMENTS
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class Storage:
+    # One connection per thread and process; connections inherited through fork are never reused
+    def __init__(self, db_path, tracer=None):
+        self.db_path = db_path
+        self.tracer = tracer or Tracer(trace_dir="")
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.local = threading.local()
+        self.connections = []
+
+    def connection(self):
+        if self.pid != os.getpid():
+            self.reset()
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path)
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self, **trace_fields):
+        # IMMEDIATE takes the write lock up front, so concurrent writers queue on
+        # busy_timeout instead of failing when a read transaction upgrades
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+        except BaseException:
+            conn.rollback()
+            raise
+        with self.tracer.span("commit", **trace_fields):
+            conn.commit()
+
+    @contextmanager
+    def snapshot(self):
+        # Consistent reads across several queries while writers keep going
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+    def close(self):
+        if self.pid != os.getpid():
+            return
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import itertools
+from contextlib import contextmanager
+
+# Set through the environment so upload and batch worker processes inherit them
+TRACE_DIR_ENV = "RAPPORT_TRACE_DIR"
+DEBUG_ENV = "RAPPORT_DEBUG"
+_run_numbers = itertools.count(1)
+
+
+def configure(trace_dir=None, debug=False):
+    if trace_dir:
+        os.environ[TRACE_DIR_ENV] = os.path.abspath(trace_dir)
+    if debug:
+        os.environ[DEBUG_ENV] = "1"
+
+
+class Span:
+    # Time and counters of one pipeline stage; measure() may be entered repeatedly
+    # for stages that interleave with others, e.g. chunk by chunk
+    def __init__(self, tracer, stage, fields):
+        self.tracer = tracer
+        self.stage = stage
+        self.fields = fields
+        self.started = time.time()
+        self.seconds = 0.0
+
+    def add(self, **counts):
+        for name, value in counts.items():
+            self.fields[name] = self.fields.get(name, 0) + value
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def finish(self, error=None):
+        self.tracer.emit(self.stage, self.seconds, started=self.started, error=error, **self.fields)
+
+
+class Tracer:
+    # One JSON line per finished span, written to <trace_dir>/<run>.jsonl; a no-op when tracing is off
+    def __init__(self, trace_dir=None, debug=None, **context):
+        self.trace_dir = trace_dir if trace_dir is not None else os.environ.get(TRACE_DIR_ENV)
+        self.debug = debug if debug is not None else os.environ.get(DEBUG_ENV, "0") not in ("", "0")
+        self.run = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_run_numbers)}"
+        self.context = context
+        self.file = None
+
+    def emit(self, stage, seconds, **fields):
+        if not self.trace_dir:
+            return
+        if self.file is None:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            self.file = open(os.path.join(self.trace_dir, f"{self.run}.jsonl"), "a", encoding="utf-8")
+        record = {"run": self.run, "stage": stage, "seconds": round(seconds, 6), **self.context}
+        record.update((name, value) for name, value in fields.items() if value is not None)
+        self.file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        self.file.flush()
+
+    def timer(self, stage, **fields):
+        return Span(self, stage, fields)
+
+    @contextmanager
+    def span(self, stage, **fields):
+        span = Span(self, stage, fields)
+        try:
+            with span.measure():
+                yield span
+        except BaseException as e:
+            span.finish(error=type(e).__name__)
+            raise
+        span.finish()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
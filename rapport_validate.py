@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+from collections import namedtuple
+from xml.etree.ElementTree import ParseError
+
+from rapport_generator import (
+    BORDEREAUX_COLUMNS, BORDEREAUX_HEADER, BORDEREAUX_LAYOUT, CHIFFRE_LAYOUT, FILE_TYPES, HEADER_SAMPLE_ROWS,
+    PRODUCTIVITY_LAYOUT, RapportValidationError, detect_file_type, normalize_series, read_layout_sheet
+)
+from rapport_stats import DOSSIER_TYPE_CATEGORIES
+from rapport_xlsx import XlsxError, XlsxReader, column_letter
+
+# Pre-flight checks of uploaded workbooks. Only the sheet list and the rows the
+# layouts read (or the first rows of a bordereaux export) are decoded, and each
+# column is checked at once, so a malformed upload is rejected in milliseconds
+# with the cells at fault, before anything is written or compiled.
+
+LAYOUTS = {"chiffre": CHIFFRE_LAYOUT, "productivity": PRODUCTIVITY_LAYOUT, "bordereaux": BORDEREAUX_LAYOUT}
+# Bordereaux data rows checked after the header
+SAMPLE_ROWS = 200
+# Values the bordereaux columns may hold, as their headers say ("H/C", "R/FI")
+BORDEREAUX_VALUES = {"dossier_type": set(DOSSIER_TYPE_CATEGORIES), "result": {"R", "FI"}}
+# XeLaTeX stops on these ("Text line contains an invalid character"); tabs and line breaks are fine
+CONTROL_CHARACTERS = r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]"
+INT64_LIMIT = 2 ** 63
+
+
+class ValidationIssue(namedtuple("ValidationIssue", ["file_type", "file_name", "cell", "message"])):
+    def __str__(self):
+        where = f"{FILE_TYPES[self.file_type]} workbook {self.file_name}"
+        return f"{where}, {self.cell}: {self.message}" if self.cell else f"{where}: {self.message}"
+
+
+def is_present(raw):
+    return raw.notna() & raw.astype(str).str.strip().ne("")
+
+
+def is_number(raw, dtype):
+    # Same parsing as the ingestion converters, which turn anything else into 0
+    import pandas as pd
+
+    if dtype == "percent":
+        raw = raw.astype(str).str.replace("%", "", regex=False).str.strip()
+    numbers = pd.to_numeric(raw, errors="coerce")
+    if dtype == "int":
+        # Integers are stored as int64 (SQLite INTEGER); larger values would wrap around
+        return numbers.notna() & numbers.abs().lt(INT64_LIMIT)
+    return numbers.notna()
+
+
+def layout_issues(file_type, file_name, df, layout):
+    import pandas as pd
+
+    sheet = layout["sheet_name"]
+    usecols = layout.get("usecols")
+    # read_layout_sheet starts at the row after the header and labels columns with
+    # their position in the sheet (or in usecols)
+    first_row = layout["skiprows"] + 2
+    # (row, column, issue), sorted into sheet order at the end
+    issues = []
+
+    def issue(message, index, position=None):
+        cell = sheet
+        column = -1
+        if position is not None:
+            column = df.columns[position]
+            column = usecols[column] if usecols else column
+            cell = f"{sheet}!{column_letter(column)}{first_row + index}"
+        issues.append((index, column, ValidationIssue(file_type, file_name, cell, message)))
+
+    for block in layout["blocks"]:
+        start, stop = block["rows"]
+        rows = f"{block['name']} (rows {first_row + start}-{first_row + stop - 1})"
+        part = df.iloc[start:stop]
+        needed = max(block["columns"]) + 1
+        if part.shape[1] < needed:
+            issue(f"{rows}: expected {needed} filled columns, found {part.shape[1]}", start)
+            continue
+
+        # Only the rows parse_block keeps are checked
+        keep = pd.Series(True, index=part.index)
+        for position, (column, dtype) in block["columns"].items():
+            if column in block.get("required", ()):
+                raw = part.iloc[:, position]
+                keep &= is_present(raw) if dtype == "text" else is_number(raw, dtype)
+        if not keep.any():
+            issue(f"{rows}: no rows found, the sheet does not have the expected layout", start)
+            continue
+        for position, (column, dtype) in block["columns"].items():
+            raw = part.iloc[:, position][keep]
+            if dtype == "text":
+                bad = raw.notna() & raw.astype(str).str.contains(CONTROL_CHARACTERS)
+                message = "contains control characters that XeLaTeX cannot typeset"
+            else:
+                bad = is_present(raw) & ~is_number(raw, dtype)
+                message = "expected a percentage" if dtype == "percent" else "expected a number"
+            for index, value in raw[bad].items():
+                issue(f"{column}: {message}, found {value!r}", index, position)
+
+        total = block.get("total")
+        if total and not normalize_series(part.iloc[:, 0]).str.lower().eq(total).any():
+            issue(f"{rows}: no '{total}' row, which holds the report's targets", start)
+    return [issue for _, _, issue in sorted(issues, key=lambda item: item[:2])]
+
+
+def bordereaux_issues(file_type, file_name, reader, sample_rows):
+    import pandas as pd
+
+    sheet = BORDEREAUX_LAYOUT["sheet_name"]
+    found = reader.find_row(sheet, BORDEREAUX_HEADER, HEADER_SAMPLE_ROWS)
+    if found is None:
+        message = f"header '{BORDEREAUX_HEADER}' not found in column A of rows 1-{HEADER_SAMPLE_ROWS}"
+        return [ValidationIssue(file_type, file_name, sheet, message)]
+    header_row, header = found
+    header = [str(cell).strip() if cell is not None else "" for cell in header]
+    missing = [name for name in BORDEREAUX_COLUMNS if name not in header]
+    if missing:
+        message = f"missing columns: {', '.join(missing)}"
+        return [ValidationIssue(file_type, file_name, f"{sheet}!{header_row}:{header_row}", message)]
+
+    positions = [header.index(name) for name in BORDEREAUX_COLUMNS]
+    rows = [
+        (number, values) for number, values in reader.iter_rows(
+            sheet, usecols=positions, min_row=header_row + 1, max_row=header_row + sample_rows
+        ) if any(value is not None for value in values)
+    ]
+    frame = pd.DataFrame(
+        [values for _, values in rows], index=[number for number, _ in rows],
+        columns=list(BORDEREAUX_COLUMNS.values()), dtype=object
+    )
+    present = {column: is_present(frame[column]) for column in frame}
+    checks = {"bordereau_no": (present["bordereau_no"] & ~is_number(frame["bordereau_no"], "int"), "expected a number")}
+    for column, allowed in BORDEREAUX_VALUES.items():
+        values = frame[column].astype(str).str.strip().str.upper()
+        checks[column] = (present[column] & ~values.isin(allowed), f"expected {' or '.join(sorted(allowed))}")
+
+    issues = []
+    letters = dict(zip(BORDEREAUX_COLUMNS.values(), map(column_letter, positions)))
+    for order, (column, (bad, expected)) in enumerate(checks.items()):
+        for number, value in frame[column][bad].items():
+            cell = f"{sheet}!{letters[column]}{number}"
+            message = f"{column}: {expected}, found {value!r}"
+            issues.append((number, order, ValidationIssue(file_type, file_name, cell, message)))
+    # In sheet order
+    return [issue for _, _, issue in sorted(issues, key=lambda item: item[:2])]
+
+
+def unreadable(error):
+    # XlsxReader wraps the zip or file error it ran into
+    return f"not a readable .xlsx workbook ({error.__cause__ or error})"
+
+
+def validate_workbook(file_type, file_path, sample_rows=SAMPLE_ROWS):
+    # Returns the list of ValidationIssue found; empty when the workbook can be ingested
+    file_name = os.path.basename(file_path)
+    layout = LAYOUTS[file_type]
+    try:
+        with XlsxReader(file_path) as reader:
+            if layout["sheet_name"] not in reader.sheet_names:
+                message = f"no worksheet '{layout['sheet_name']}' (found: {', '.join(reader.sheet_names)})"
+                return [ValidationIssue(file_type, file_name, None, message)]
+            if file_type == "bordereaux":
+                return bordereaux_issues(file_type, file_name, reader, sample_rows)
+        return layout_issues(file_type, file_name, read_layout_sheet(file_path, layout), layout)
+    except (OSError, KeyError, ParseError, XlsxError) as e:
+        return [ValidationIssue(file_type, file_name, None, unreadable(e))]
+
+
+def check_workbooks(paths):
+    # paths: {file_type: path}. Raises RapportValidationError with the issues of all of them.
+    issues = [issue for file_type, path in paths.items() for issue in validate_workbook(file_type, path)]
+    if issues:
+        raise RapportValidationError(issues)
+
+
+def run_validate(args):
+    failed = False
+    for path in args.files:
+        file_type = args.file_type
+        if file_type is None:
+            try:
+                file_type = detect_file_type(path)
+            except (OSError, KeyError, ParseError, XlsxError) as e:
+                print(f"{path}: {unreadable(e)}", file=sys.stderr)
+                failed = True
+                continue
+        if file_type is None:
+            print(f"{path}: not a chiffre, productivity or bordereaux workbook (use --type)", file=sys.stderr)
+            failed = True
+            continue
+        start = time.perf_counter()
+        issues = validate_workbook(file_type, path)
+        milliseconds = (time.perf_counter() - start) * 1000
+        for issue in issues:
+            print(issue, file=sys.stderr)
+        if issues:
+            failed = True
+        else:
+            print(f"{path}: {FILE_TYPES[file_type]} workbook ok ({milliseconds:.0f} ms)")
+    return 1 if failed else 0
@@ -0,0 +1,195 @@
+import os
+import re
+import sys
+import time
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from rapport_generator import DEFAULT_PERIOD, FILE_TYPES, RapportGenerator, detect_file_type, parse_period
+
+DB_NAME = "rapport_data.db"
+# A period in the file name or folder, e.g. "2025-06/bordereaux.xlsx" or "chiffre_2025_06.xlsx"
+PERIOD_PATTERN = re.compile(r"(?<!\d)(20\d\d)[-_.]?(0[1-9]|1[0-2])(?!\d)")
+
+
+def period_from_path(relative_path, default_period):
+    matches = PERIOD_PATTERN.findall(relative_path)
+    if not matches:
+        return default_period
+    year, month = matches[-1]
+    return f"{year}-{month}"
+
+
+def is_workbook(name):
+    # Office lock files (~$name.xlsx) and hidden partial copies are never complete workbooks
+    return name.lower().endswith(".xlsx") and not name.startswith(("~$", "."))
+
+
+def ingest_drop(file_path, state_dir, period):
+    # Runs in a worker process; returns the detected type, or None for unrelated workbooks
+    file_type = detect_file_type(file_path)
+    if file_type is None:
+        return None
+    with RapportGenerator(work_dir=state_dir, period=period, db_name=DB_NAME) as generator:
+        generator.process_file(file_type, file_path)
+    return file_type
+
+
+def build_report(state_dir, output_dir, period):
+    work_dir = os.path.join(output_dir, period)
+    os.makedirs(work_dir, exist_ok=True)
+    with RapportGenerator(work_dir=work_dir, period=period, db_name=os.path.join(state_dir, DB_NAME)) as generator:
+        if generator.ingested_file_types() != set(FILE_TYPES):
+            return None
+        return generator.build_pdf()
+
+
+def log(message, error=False):
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}", file=sys.stderr if error else sys.stdout, flush=True)
+
+
+class FolderWatcher:
+    # Polls a drop folder. A workbook is handed over once its size and mtime have been
+    # stable for `settle` seconds, and again only after it changes.
+    def __init__(self, watch_dir, settle=2.0):
+        self.watch_dir = watch_dir
+        self.settle = settle
+        self.done = {}
+        self.candidates = {}
+
+    def scan(self):
+        now = time.monotonic()
+        ready = []
+        present = set()
+        for dir_path, dir_names, file_names in os.walk(self.watch_dir):
+            dir_names[:] = [name for name in dir_names if not name.startswith(".")]
+            for name in file_names:
+                if not is_workbook(name):
+                    continue
+                path = os.path.join(dir_path, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                present.add(path)
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if not stat.st_size or self.done.get(path) == signature:
+                    continue
+                seen = self.candidates.get(path)
+                if seen is None or seen[0] != signature:
+                    self.candidates[path] = (signature, now)
+                elif now - seen[1] >= self.settle:
+                    ready.append((path, signature))
+        for path in set(self.candidates) - present:
+            del self.candidates[path]
+        return ready
+
+    def finished(self, path, signature):
+        self.done[path] = signature
+        self.candidates.pop(path, None)
+
+
+class WatchDaemon:
+    # Ingestion runs in worker processes, at most `max_pending` files at a time; extra drops
+    # wait in the folder. Each period has at most one build running and one queued, so a
+    # burst of drops for a month ends in a single rebuild.
+    def __init__(self, watch_dir, output_dir, period=DEFAULT_PERIOD, interval=1.0, settle=2.0,
+                 ingest_workers=len(FILE_TYPES), compile_workers=1, max_pending=None):
+        # Absolute, since report builds run in per-period directories
+        watch_dir = os.path.abspath(watch_dir)
+        output_dir = os.path.abspath(output_dir)
+        self.watcher = FolderWatcher(watch_dir, settle)
+        self.watch_dir = watch_dir
+        self.output_dir = output_dir
+        self.state_dir = os.path.join(output_dir, ".state")
+        self.period = period
+        self.interval = interval
+        self.ingest_workers = ingest_workers
+        self.compile_workers = compile_workers
+        self.max_pending = max_pending or 2 * ingest_workers
+        self.ingesting = {}
+        self.building = {}
+        self.dirty_periods = set()
+        self.stopping = False
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        # Creates or migrates the shared database once, before the workers start
+        RapportGenerator(work_dir=self.state_dir, period=self.period, db_name=DB_NAME).close()
+        log(f"Watching {self.watch_dir} (reports in {self.output_dir})")
+        with ProcessPoolExecutor(max_workers=self.ingest_workers) as ingest_pool, \
+                ThreadPoolExecutor(max_workers=self.compile_workers) as compile_pool:
+            while not self.stopping:
+                self.collect_ingested()
+                self.collect_built()
+                self.submit_drops(ingest_pool)
+                self.submit_builds(compile_pool)
+                time.sleep(self.interval)
+            log("Stopping; waiting for running jobs")
+
+    def submit_drops(self, pool):
+        for path, signature in self.watcher.scan():
+            if len(self.ingesting) >= self.max_pending:
+                # Backpressure: the file is picked up again on a later scan
+                break
+            if path in (pending[0] for pending in self.ingesting.values()):
+                continue
+            period = period_from_path(os.path.relpath(path, self.watch_dir), self.period)
+            future = pool.submit(ingest_drop, path, self.state_dir, period)
+            self.ingesting[future] = (path, signature, period)
+
+    def collect_ingested(self):
+        for future in [future for future in self.ingesting if future.done()]:
+            path, signature, period = self.ingesting.pop(future)
+            # Failed files are not retried until they change
+            self.watcher.finished(path, signature)
+            try:
+                file_type = future.result()
+            except Exception as e:
+                log(f"[error] {path}: {e}", error=True)
+                continue
+            if file_type is None:
+                log(f"[skip] {path}: not a Chiffre, Productivity or Bordereaux workbook")
+                continue
+            log(f"[ingested] {period} {FILE_TYPES[file_type]} <- {path}")
+            self.dirty_periods.add(period)
+
+    def submit_builds(self, pool):
+        # Wait until the drops of a burst are in before rebuilding
+        pending_periods = {period for _, _, period in self.ingesting.values()}
+        pending_periods.update(
+            period_from_path(os.path.relpath(path, self.watch_dir), self.period) for path in self.watcher.candidates
+        )
+        for period in sorted(self.dirty_periods - pending_periods - set(self.building.values())):
+            self.dirty_periods.discard(period)
+            future = pool.submit(build_report, self.state_dir, self.output_dir, period)
+            self.building[future] = period
+
+    def collect_built(self):
+        for future in [future for future in self.building if future.done()]:
+            period = self.building.pop(future)
+            try:
+                pdf_path = future.result()
+            except Exception as e:
+                log(f"[error] {period} report: {e}", error=True)
+                continue
+            if pdf_path is None:
+                log(f"[pending] {period} report: waiting for all three workbooks")
+            else:
+                log(f"[ok] {period} -> {pdf_path}")
+
+
+def run_watch(args):
+    parse_period(args.period)
+    daemon = WatchDaemon(
+        args.watch_dir, args.output_dir, period=args.period, interval=args.interval, settle=args.settle,
+        ingest_workers=max(1, args.workers), compile_workers=max(1, args.compile_workers),
+        max_pending=args.max_pending
+    )
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.run()
+    return 0
@@ -0,0 +1,189 @@
+import re
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+
+# Minimal streaming reader for the .xlsx uploads. The sheet XML is parsed row by row
+# and only the requested columns are decoded, so large bordereaux exports never
+# become a full sheet in memory. Values come back as str, int, float or bool;
+# dates stay as their serial numbers (no report column holds dates).
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+ROW = MAIN_NS + "row"
+CELL = MAIN_NS + "c"
+VALUE = MAIN_NS + "v"
+TEXT = MAIN_NS + "t"
+RUN = MAIN_NS + "r"
+SHEET_DATA = MAIN_NS + "sheetData"
+CELL_REF = re.compile(r"([A-Z]+)(\d*)")
+
+
+class XlsxError(Exception):
+    pass
+
+
+def column_index(letters):
+    # "A" -> 0, "AB" -> 27
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def column_letter(index):
+    # 0 -> "A", 27 -> "AB"
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def string_item_text(item):
+    # Plain <t> or rich text runs; phonetic hints (<rPh>) are not part of the value
+    text = item.find(TEXT)
+    if text is not None:
+        return text.text or ""
+    return "".join(run.findtext(TEXT, "") for run in item.iter(RUN))
+
+
+def number(text):
+    try:
+        return int(text)
+    except ValueError:
+        value = float(text)
+    # As with pandas.read_excel, whole numbers stored as floats read as ints
+    return int(value) if value.is_integer() else value
+
+
+class XlsxReader:
+    def __init__(self, file_path):
+        try:
+            self.zip = zipfile.ZipFile(file_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            raise XlsxError(f"{file_path} is not an .xlsx workbook: {e}") from e
+        self.sheets = self.read_sheet_paths()
+        self.strings = []
+        self.string_items = None
+
+    def close(self):
+        if self.string_items is not None:
+            self.string_items.close()
+        self.zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def sheet_names(self):
+        return list(self.sheets)
+
+    def read_sheet_paths(self):
+        # Sheet name -> zip member, through the workbook relationships
+        with self.zip.open("xl/_rels/workbook.xml.rels") as f:
+            relationships = ET.parse(f).getroot().iter(PACKAGE_REL_NS + "Relationship")
+            targets = {rel.get("Id"): rel.get("Target") for rel in relationships}
+        with self.zip.open("xl/workbook.xml") as f:
+            sheets = ET.parse(f).getroot().iter(MAIN_NS + "sheet")
+            paths = {}
+            for sheet in sheets:
+                target = targets.get(sheet.get(REL_NS + "id"), "")
+                if target.startswith("/"):
+                    paths[sheet.get("name")] = target.lstrip("/")
+                else:
+                    paths[sheet.get("name")] = posixpath.normpath(posixpath.join("xl", target))
+        return paths
+
+    def iter_string_items(self):
+        try:
+            f = self.zip.open("xl/sharedStrings.xml")
+        except KeyError:
+            return
+        with f:
+            for _, item in ET.iterparse(f):
+                if item.tag == MAIN_NS + "si":
+                    yield string_item_text(item)
+                    item.clear()
+
+    def shared_string(self, index):
+        # The string table is parsed only as far as the cells read so far need: Excel
+        # numbers strings in order of first use, so reading the first rows of a large
+        # export does not decode the strings of the rest of the sheet
+        if self.string_items is None:
+            self.string_items = self.iter_string_items()
+        while index >= len(self.strings):
+            item = next(self.string_items, None)
+            if item is None:
+                raise XlsxError(f"Shared string {index} not found")
+            self.strings.append(item)
+        return self.strings[index]
+
+    def cell_value(self, cell):
+        kind = cell.get("t", "n")
+        if kind == "inlineStr":
+            return "".join(cell.itertext())
+        text = cell.findtext(VALUE)
+        if text is None:
+            return None
+        if kind == "s":
+            return self.shared_string(int(text))
+        if kind == "n":
+            return number(text)
+        if kind == "b":
+            return text == "1"
+        if kind == "e":
+            return None
+        # "str" (formula result) and "d" (ISO date) stay text
+        return text
+
+    def iter_rows(self, sheet_name, usecols=None, min_row=1, max_row=None):
+        # Yields (row number, values). Without usecols, values is the whole row up to
+        # its last cell; with usecols (0-based positions), one value per position.
+        # Rows missing from the XML (empty in Excel) are not yielded.
+        if sheet_name not in self.sheets:
+            raise XlsxError(f"Worksheet {sheet_name!r} not found")
+        wanted = {position: n for n, position in enumerate(usecols)} if usecols is not None else None
+        with self.zip.open(self.sheets[sheet_name]) as f:
+            sheet_data = None
+            row_number = 0
+            for event, element in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if element.tag == SHEET_DATA:
+                        sheet_data = element
+                    continue
+                if element.tag != ROW:
+                    continue
+                row_number = int(element.get("r") or row_number + 1)
+                if max_row is not None and row_number > max_row:
+                    break
+                if row_number >= min_row:
+                    yield row_number, self.row_values(element, wanted)
+                # Rows are dropped as soon as they are read
+                sheet_data.clear()
+
+    def row_values(self, row, wanted):
+        values = [None] * len(wanted) if wanted is not None else []
+        position = -1
+        for cell in row:
+            if cell.tag != CELL:
+                continue
+            ref = cell.get("r")
+            position = column_index(CELL_REF.match(ref).group(1)) if ref else position + 1
+            if wanted is None:
+                values.extend([None] * (position - len(values)))
+                values.append(self.cell_value(cell))
+            elif position in wanted:
+                values[wanted[position]] = self.cell_value(cell)
+        return values
+
+    def find_row(self, sheet_name, first_cell, max_row):
+        # First row among the first max_row whose column A reads first_cell
+        for row_number, values in self.iter_rows(sheet_name, max_row=max_row):
+            if values and isinstance(values[0], str) and values[0].strip() == first_cell:
+                return row_number, values
+        return None
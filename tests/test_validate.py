@@ -0,0 +1,18 @@
+import os
+import sys
+import pickle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rapport_generator import RapportValidationError
+from rapport_validate import ValidationIssue
+
+
+def test_validation_error_survives_pickling():
+    # Upload and watch workers send the error back to the parent process
+    issue = ValidationIssue("chiffre", "chiffre.xlsx", "Feuil1!B4", "jan: expected a number, found 'abc'")
+    error = pickle.loads(pickle.dumps(RapportValidationError([issue])))
+    assert isinstance(error, RapportValidationError)
+    assert error.issues == [issue]
+    assert str(error) == str(RapportValidationError([issue]))
+    assert str(error).startswith("1 problem found")